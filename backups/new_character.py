@@ -1,13 +1,20 @@
 import os
+import sys
 
-def create_character_files(character_name, role, race_age, description, personality, backstory, skills, relationships):
-    """Create the 3 memory files for a new character"""
+# The character registry lives with the other scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+import character_registry
+
+def create_character_files(character_name, role, race_age, description, personality, backstory, skills, relationships,
+                           aliases="", folder=character_registry.CHARACTER_FOLDER):
+    """Create the 3 memory files for a new character and add them to the character pack"""
     
     char_lower = character_name.lower().replace(" ", "_")
+    alias_line = f"ALIASES: {aliases}\n" if aliases.strip() else ""
     
     # Background file
     background_content = f"""CHARACTER: {character_name}
-ROLE: {role}
+{alias_line}ROLE: {role}
 RACE/AGE: {race_age}
 
 PHYSICAL DESCRIPTION:
@@ -41,19 +48,23 @@ LONG-TERM MEMORY (Consolidated summaries):
 """
     
     # Write files
-    with open(f"character_{char_lower}_background.txt", 'w', encoding='utf-8') as f:
+    with open(os.path.join(folder, f"character_{char_lower}_background.txt"), 'w', encoding='utf-8') as f:
         f.write(background_content)
     
-    with open(f"character_{char_lower}_shortterm.txt", 'w', encoding='utf-8') as f:
+    with open(os.path.join(folder, f"character_{char_lower}_shortterm.txt"), 'w', encoding='utf-8') as f:
         f.write(shortterm_content)
     
-    with open(f"character_{char_lower}_longterm.txt", 'w', encoding='utf-8') as f:
+    with open(os.path.join(folder, f"character_{char_lower}_longterm.txt"), 'w', encoding='utf-8') as f:
         f.write(longterm_content)
     
-    print(f"\n✓ Created 3 files for {character_name}")
+    # Pack them now so the next scene loads the new character in the same read as everyone else
+    character_registry.load_cast(folder, [character_name])
+    
+    print(f"\n✓ Created 3 files for {character_name} in {folder}")
     print(f"  - character_{char_lower}_background.txt")
     print(f"  - character_{char_lower}_shortterm.txt")
     print(f"  - character_{char_lower}_longterm.txt")
+    print(f"  (registered in {character_registry.PACK_NAME})")
 
 def main():
     print("=== CREATE NEW CHARACTER ===\n")
@@ -61,6 +72,7 @@ def main():
     name = input("Character name: ")
     role = input("Role/title: ")
     race_age = input("Race/age: ")
+    aliases = input("Aliases, comma-separated (optional): ")
     
     print("\nPhysical description (press Enter twice when done):")
     desc_lines = []
@@ -101,7 +113,7 @@ def main():
         rel_lines.append(line)
     relationships = "\n".join(rel_lines[:-1])
     
-    create_character_files(name, role, race_age, description, personality, backstory, skills, relationships)
+    create_character_files(name, role, race_age, description, personality, backstory, skills, relationships, aliases)
     
     another = input("\nCreate another character? (y/n): ").lower()
     if another == 'y':
@@ -1,8 +1,46 @@
 import os
-import shutil
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+import contextlib
 from datetime import datetime
 
+try:
+    import zstandard
+except ImportError:  # gzip is always there; zstd is just faster and smaller
+    zstandard = None
+
 BACKUP_FOLDER = "backups"
+OBJECTS_FOLDER = "objects"
+MANIFEST_NAME = "manifest.jsonl"
+LOCK_NAME = "manifest.lock"
+LOCK_TIMEOUT = 30        # seconds to wait for another process's backup to finish
+LOCK_STALE = 120         # a lock file this old was left behind by a crashed process
+
+# Retention: always keep the newest KEEP_LAST versions of a file, plus the newest
+# version in each of the last KEEP_HOURLY hours and KEEP_DAILY days that had saves
+KEEP_LAST = 10
+KEEP_HOURLY = 24
+KEEP_DAILY = 30
+
+# Append-aware mode: when a file only grew since its last backup, store just the
+# appended bytes. Each version records the hashes of its first and last CHECK_BYTES;
+# a delta is taken when the file got bigger and those two windows of the old content
+# still hash the same, so a backup costs the appended bytes plus two small reads
+# however big the file is. Anything else gets a full snapshot (which reads the whole
+# file). An edit that keeps the file's length and stays clear of both windows isn't
+# noticed, and its versions are rebuilt with the old bytes in that spot; every
+# MAX_DELTA_CHAIN deltas a full snapshot reads the whole file again.
+APPEND_AWARE = True
+CHECK_BYTES = 32 * 1024  # bytes at each end of the old content re-read before a delta
+MAX_DELTA_CHAIN = 50     # take a full snapshot after this many deltas in a row
+
+_lock = threading.RLock()
+_lock_depth = 0
+_manifest = {'stamp': None, 'versions': []}
 
 def ensure_backup_folder():
     """Create backup folder if it doesn't exist"""
@@ -10,30 +48,235 @@ def ensure_backup_folder():
         os.makedirs(BACKUP_FOLDER)
         print(f"Created backup folder: {BACKUP_FOLDER}/")
 
+def manifest_path():
+    return os.path.join(BACKUP_FOLDER, MANIFEST_NAME)
+
+@contextlib.contextmanager
+def manifest_lock():
+    """
+    Held while the manifest is appended to or rewritten, against other threads and
+    other processes (the daemon, a batch script). Re-entrant within a thread.
+    """
+    global _lock_depth
+    path = os.path.join(BACKUP_FOLDER, LOCK_NAME)
+    with _lock:
+        if _lock_depth == 0:
+            ensure_backup_folder()
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while True:
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                    os.write(fd, str(os.getpid()).encode("ascii"))
+                    os.close(fd)
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(path) > LOCK_STALE:
+                            os.remove(path)
+                            continue
+                    except OSError:
+                        continue   # released while we looked
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{path} is held by another process "
+                                           f"(delete it if no backup is running)")
+                    time.sleep(0.05)
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0:
+                os.remove(path)
+
+def blob_path(digest, codec):
+    return os.path.join(BACKUP_FOLDER, OBJECTS_FOLDER, digest[:2], f"{digest}.{codec}")
+
+def compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), "zst"
+    return gzip.compress(data, compresslevel=6), "gz"
+
+def decompress(data, codec):
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("this backup is zstd-compressed; install the zstandard package to restore it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def find_blob(digest):
+    """Existing (path, codec) for a content hash, or None"""
+    for codec in ("zst", "gz"):
+        path = blob_path(digest, codec)
+        if os.path.exists(path):
+            return path, codec
+    return None
+
+def store_blob(data, digest):
+    """Write content once under its hash; returns (path, codec, bytes written)"""
+    existing = find_blob(digest)
+    if existing:
+        return existing[0], existing[1], 0
+    packed, codec = compress(data)
+    path = blob_path(digest, codec)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(packed)
+    os.replace(tmp, path)
+    return path, codec, len(packed)
+
+def manifest_stamp():
+    try:
+        st = os.stat(manifest_path())
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def read_manifest():
+    """Every recorded version, oldest first (parsed once per process while unchanged)"""
+    stamp = manifest_stamp()
+    if stamp is None:
+        return []
+    if stamp == _manifest['stamp']:
+        return list(_manifest['versions'])
+    versions = []
+    with open(manifest_path(), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    versions.append(json.loads(line))
+                except ValueError:
+                    continue  # half-written line from a crash
+    _manifest['stamp'], _manifest['versions'] = stamp, versions
+    return list(versions)
+
+def append_manifest(version):
+    """Add one version (call with manifest_lock() held)"""
+    cached = _manifest['stamp'] is not None and _manifest['stamp'] == manifest_stamp()
+    with open(manifest_path(), "a", encoding="utf-8") as f:
+        f.write(json.dumps(version) + "\n")
+    if cached:
+        _manifest['versions'].append(version)
+        _manifest['stamp'] = manifest_stamp()
+
+def write_manifest(versions):
+    """Replace the manifest atomically (call with manifest_lock() held)"""
+    tmp = manifest_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for version in versions:
+            f.write(json.dumps(version) + "\n")
+    os.replace(tmp, manifest_path())
+    _manifest['stamp'], _manifest['versions'] = manifest_stamp(), list(versions)
+
+def file_key(filepath):
+    """How a file is identified in the manifest"""
+    return os.path.abspath(filepath)
+
+def file_versions(filepath, versions=None):
+    """Recorded versions of one file, oldest first"""
+    key = file_key(filepath)
+    return [v for v in (versions if versions is not None else read_manifest()) if v["file"] == key]
+
+def delta_chain_length(history):
+    n = 0
+    for version in reversed(history):
+        if version.get("kind", "full") == "full":
+            break
+        n += 1
+    return n
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def chain_hash(parent_content, delta_hash):
+    """Content hash of a delta version, from its parent's and the appended bytes' hashes"""
+    return sha256(f"{parent_content}+{delta_hash}".encode("ascii"))
+
+def read_appended(f, last, size):
+    """
+    The bytes added after the last version, or None if its first or last CHECK_BYTES
+    changed. Returns (appended, head hash, tail hash) for the new version.
+    """
+    base = last["size"]
+    f.seek(0)
+    head = f.read(min(CHECK_BYTES, base))
+    tail_start = max(0, base - CHECK_BYTES)
+    f.seek(tail_start)
+    rest = f.read(size - tail_start)          # old tail + appended bytes
+    if sha256(head) != last["head"] or sha256(rest[:base - tail_start]) != last["tail"]:
+        return None
+    appended = rest[base - tail_start:]
+    new_head = last["head"] if base >= CHECK_BYTES else sha256(rest[:CHECK_BYTES])
+    return appended, new_head, sha256(rest[-CHECK_BYTES:])
+
 def backup_file(filepath):
     """
-    Create timestamped backup of a file before modification.
-    Returns path to backup file, or None if file doesn't exist.
+    Record the current contents of a file before modification.
+    Content is stored once per distinct hash (compressed); the manifest gets a
+    timestamped version entry. If the file only grew since its last backup, just
+    the appended bytes are stored. Returns path to the stored blob, or None if file doesn't exist.
     """
     if not os.path.exists(filepath):
         return None
-    
+
     ensure_backup_folder()
-    
-    # Get filename without path
     filename = os.path.basename(filepath)
-    name_without_ext = os.path.splitext(filename)[0]
-    
-    # Create readable, sortable timestamp
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
-    backup_filename = f"{name_without_ext}_backup_{timestamp}.txt"
-    backup_path = os.path.join(BACKUP_FOLDER, backup_filename)
-    
-    # Copy file to backup
-    shutil.copy2(filepath, backup_path)
-    print(f"✓ Backed up: {filename} -> {backup_filename}")
-    
-    return backup_path
+
+    with manifest_lock():
+        versions = read_manifest()
+        history = file_versions(filepath, versions)
+        last = history[-1] if history else None
+
+        with open(filepath, "rb") as f:
+            st = os.fstat(f.fileno())
+            if last and (last["size"], last.get("mtime_ns")) == (st.st_size, st.st_mtime_ns):
+                print(f"✓ Backup current: {filename} (unchanged since {last['time']})")
+                found = find_blob(last["hash"])
+                return found[0] if found else None
+
+            version = {
+                "file": file_key(filepath),
+                "name": filename,
+                "time": datetime.now().isoformat(timespec="microseconds"),
+                "mtime_ns": st.st_mtime_ns,
+            }
+            delta = None
+            if (APPEND_AWARE and last and last.get("head") and st.st_size > last["size"]
+                    and delta_chain_length(history) < MAX_DELTA_CHAIN):
+                delta = read_appended(f, last, st.st_size)
+            if delta:
+                data, head, tail = delta
+                digest = sha256(data)
+                version.update(size=last["size"] + len(data), kind="delta", parent=last["time"],
+                               base_size=last["size"], content=chain_hash(last["content"], digest))
+            else:
+                f.seek(0)
+                data = f.read()
+                digest = sha256(data)
+                head, tail = sha256(data[:CHECK_BYTES]), sha256(data[-CHECK_BYTES:])
+                version.update(size=len(data), kind="full", content=digest)
+            version.update(head=head, tail=tail)
+
+        if last and last.get("kind", "full") == "full" and last["hash"] == digest and not delta:
+            print(f"✓ Backup current: {filename} (unchanged since {last['time']})")
+            found = find_blob(digest)
+            return found[0] if found else None
+
+        path, codec, written = store_blob(data, digest)
+        version.update(hash=digest, codec=codec)
+        append_manifest(version)
+
+        stored = f"{written / 1024:.1f} KB stored" if written else "content already stored"
+        what = f"+{len(data)} bytes appended" if delta else "full snapshot"
+        print(f"✓ Backed up: {filename} ({what}, {stored})")
+
+        # Versions only become droppable once a new full snapshot ends the delta chain
+        # they belong to, so retention runs then instead of after every backup
+        if not delta and len(history) + 1 > KEEP_LAST + KEEP_HOURLY + KEEP_DAILY:
+            apply_retention(versions + [version])
+
+    return path
 
 def backup_multiple(filepaths):
     """
@@ -45,4 +288,174 @@ def backup_multiple(filepaths):
         backup_path = backup_file(filepath)
         if backup_path:
             backups.append(backup_path)
-    return backups
\ No newline at end of file
+    return backups
+
+def versions_to_keep(history):
+    """Apply the keep-last / hourly / daily policy to one file's versions (oldest first)"""
+    keep = set()
+    newest_first = list(reversed(history))
+    for i, version in enumerate(newest_first):
+        if i < KEEP_LAST:
+            keep.add(id(version))
+    for length, limit in ((13, KEEP_HOURLY), (10, KEEP_DAILY)):  # "YYYY-MM-DDTHH" / "YYYY-MM-DD"
+        seen = []
+        for version in newest_first:
+            bucket = version["time"][:length]
+            if bucket in seen:
+                continue
+            if len(seen) >= limit:
+                break
+            seen.append(bucket)
+            keep.add(id(version))
+
+    # A kept delta is useless without everything back to its full snapshot
+    by_time = {v["time"]: v for v in history}
+    for version in list(history):
+        if id(version) not in keep:
+            continue
+        while version.get("kind") == "delta":
+            version = by_time.get(version["parent"])
+            if version is None:
+                break
+            keep.add(id(version))
+    return keep
+
+def referenced_hashes(versions):
+    return {v["hash"] for v in versions}
+
+def apply_retention(versions=None):
+    """Drop versions outside the retention policy and delete the blobs only they used.
+    Returns the number of versions dropped."""
+    with manifest_lock():
+        versions = versions if versions is not None else read_manifest()
+        by_file = {}
+        for version in versions:
+            by_file.setdefault(version["file"], []).append(version)
+
+        keep = set()
+        for history in by_file.values():
+            keep |= versions_to_keep(history)
+        kept = [v for v in versions if id(v) in keep]
+        if len(kept) == len(versions):
+            return 0
+
+        write_manifest(kept)
+        live = referenced_hashes(kept)
+        for digest in {v["hash"] for v in versions if id(v) not in keep} - live:
+            found = find_blob(digest)
+            if found:
+                os.remove(found[0])
+        return len(versions) - len(kept)
+
+def collect_garbage(live_hashes):
+    """Remove stored blobs no version points at; returns how many were removed"""
+    removed = 0
+    objects = os.path.join(BACKUP_FOLDER, OBJECTS_FOLDER)
+    if not os.path.isdir(objects):
+        return 0
+    for sub in os.listdir(objects):
+        folder = os.path.join(objects, sub)
+        for name in os.listdir(folder):
+            digest = name.split(".")[0]
+            if digest not in live_hashes:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+        if not os.listdir(folder):
+            os.rmdir(folder)
+    return removed
+
+def read_blob(digest):
+    found = find_blob(digest)
+    if not found:
+        raise FileNotFoundError(f"backup content {digest[:12]} is missing")
+    with open(found[0], "rb") as f:
+        return decompress(f.read(), found[1])
+
+def version_chain(version, history):
+    """The full snapshot a version is built on, followed by its deltas, oldest first"""
+    by_time = {v["time"]: v for v in history}
+    chain = [version]
+    while chain[-1].get("kind") == "delta":
+        parent = by_time.get(chain[-1]["parent"])
+        if parent is None:
+            raise FileNotFoundError(f"backup of {version['name']} from {chain[-1]['parent']} is missing")
+        chain.append(parent)
+    return list(reversed(chain))
+
+def rebuild_version(version, history):
+    """The bytes of one recorded version"""
+    pieces, content = [], None
+    for step in version_chain(version, history):
+        piece = read_blob(step["hash"])
+        if sha256(piece) != step["hash"]:
+            raise ValueError(f"stored content {step['hash'][:12]} of {version['name']} is damaged")
+        pieces.append(piece)
+        content = step["hash"] if step.get("kind", "full") == "full" else chain_hash(content, step["hash"])
+    data = b"".join(pieces)
+    if len(data) != version["size"]:
+        raise ValueError(f"rebuilt {version['name']} is {len(data)} bytes, expected {version['size']}")
+    if version.get("content", content) != content:
+        raise ValueError(f"rebuilt {version['name']} from {version['time']} doesn't match its recorded content hash")
+    return data
+
+def restore_version(version, dest, history=None):
+    """Write one recorded version out to dest"""
+    if history is None:
+        history = [v for v in read_manifest() if v["file"] == version["file"]]
+    data = rebuild_version(version, history)
+    tmp = dest + ".restore-tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dest)
+    return dest
+
+def list_versions(filepath=None):
+    """Print recorded versions (all files, or one)"""
+    versions = read_manifest()
+    if filepath:
+        versions = file_versions(filepath, versions)
+    if not versions:
+        print("No backups recorded.")
+        return
+    counters = {}
+    for version in versions:
+        n = counters[version["file"]] = counters.get(version["file"], 0) + 1
+        kind = version.get("kind", "full")
+        print(f"{version['name']:<40} #{n:<4} {version['time']}  {version['size']:>10} bytes  {kind:<5}  {version['hash'][:12]}")
+
+def main():
+    usage = ("Usage:\n"
+             "  python backup_utils.py list [file]\n"
+             "  python backup_utils.py restore <file> [version number, default latest] [destination]\n"
+             "  python backup_utils.py prune")
+    if len(sys.argv) < 2:
+        print(usage)
+        return
+    command = sys.argv[1]
+    if command == "list":
+        list_versions(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "restore" and len(sys.argv) > 2:
+        filepath = sys.argv[2]
+        history = file_versions(filepath)
+        if not history:
+            print(f"No backups recorded for {filepath}")
+            return
+        number = int(sys.argv[3]) if len(sys.argv) > 3 else len(history)
+        if not 1 <= number <= len(history):
+            print(f"Version must be between 1 and {len(history)}")
+            return
+        dest = sys.argv[4] if len(sys.argv) > 4 else filepath
+        if dest == filepath and os.path.exists(filepath):
+            backup_file(filepath)  # so the restore itself can be undone
+        restore_version(history[number - 1], dest, history)
+        print(f"✓ Restored {os.path.basename(filepath)} version #{number} -> {dest}")
+    elif command == "prune":
+        with manifest_lock():
+            removed = apply_retention()
+            strays = collect_garbage(referenced_hashes(read_manifest()))
+        print(f"✓ Retention applied ({removed} old versions dropped, {strays} unused blobs removed)")
+    else:
+        print(usage)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Consolidate every character whose short-term memory has grown too large.
+
+Scans the character folder, picks the characters over the entry or token
+threshold, sends their consolidation prompts concurrently (at most
+MAX_IN_FLIGHT at a time) and saves each summary as it arrives - the same
+way consolidate_memories.py does for one character, without the questions.
+
+    python batch_consolidate_memories.py [--folder characters] [--entries 10] [--tokens 1500] [--workers 4] [--dry-run]
+"""
+import os
+import time
+import argparse
+import memory_store
+import file_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from context_builder import count_tokens
+from consolidate_memories import (call_oobabooga, memory_files, load_shortterm,
+                                  build_prompt, save_consolidation)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")   # character_*.txt files and memories.db
+ENTRY_THRESHOLD = 10     # consolidate once a character has this many short-term entries...
+TOKEN_THRESHOLD = 1500   # ...or once their short-term memories cost this many prompt tokens
+MIN_ENTRIES = 3          # never consolidate fewer than this
+MAX_IN_FLIGHT = 4        # consolidation requests sent to the backend at once
+
+def find_due(folder, entry_threshold=ENTRY_THRESHOLD, token_threshold=TOKEN_THRESHOLD):
+    """Characters over a threshold: [(display name, background, rows, shortterm text, tokens)]"""
+    due = []
+    for key in memory_store.character_keys(folder):
+        background_file, shortterm_file, longterm_file = memory_files(folder, key)
+        background = file_cache.load_file(background_file)
+        if not background:
+            continue
+        if memory_store.count_entries(folder, key) < MIN_ENTRIES:
+            continue
+        rows, shortterm = load_shortterm(folder, key)
+        tokens = count_tokens(shortterm)
+        if len(rows) >= entry_threshold or tokens >= token_threshold:
+            due.append((memory_store.display_name(key), background, rows, shortterm, tokens))
+    return due
+
+def timed_summary(prompt):
+    """Call the API and return (summary, seconds taken)"""
+    start = time.perf_counter()
+    summary = call_oobabooga(prompt, max_tokens=400)
+    return summary, time.perf_counter() - start
+
+def consolidate_all(folder, due, max_in_flight=MAX_IN_FLIGHT, log=print):
+    """
+    Run every due consolidation, at most max_in_flight requests at a time.
+    Summaries are saved as they arrive; progress goes to log. Returns {display_name: report row}.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = {}
+        for display_name, background, rows, shortterm, tokens in due:
+            prompt = build_prompt(display_name, background, shortterm, len(rows))
+            futures[pool.submit(timed_summary, prompt)] = (display_name, rows, tokens)
+        for future in as_completed(futures):
+            display_name, rows, tokens = futures[future]
+            summary, elapsed = future.result()
+            row = {'entries': len(rows), 'tokens_before': tokens, 'seconds': elapsed}
+            if summary:
+                save_consolidation(folder, display_name, rows, summary)
+                row['tokens_after'] = count_tokens(summary)
+                row['status'] = "saved"
+            else:
+                row['status'] = "FAILED"
+            results[display_name] = row
+            log(f"  {display_name}: {row['status']} ({elapsed:.1f}s)")
+    return results
+
+def print_report(results, wall_time, max_in_flight):
+    """Per-character outcome, prompt tokens retired and total wall-clock time"""
+    print("\n=== CONSOLIDATION REPORT ===")
+    retired = 0
+    for display_name, row in sorted(results.items()):
+        if row['status'] == "saved":
+            retired += row['tokens_before']
+            change = f"~{row['tokens_before']} -> ~{row['tokens_after']} tokens"
+        else:
+            change = "unchanged"
+        print(f"  {display_name:<20} {row['entries']:>3} entries  {change:<28} {row['seconds']:6.1f}s  {row['status']}")
+    saved = sum(1 for row in results.values() if row['status'] == "saved")
+    print(f"{saved}/{len(results)} characters consolidated in {wall_time:.1f}s ({max_in_flight} in flight)")
+    print(f"~{retired} tokens of short-term memory moved out of scene prompts")
+    print("============================")
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate every character over the short-term memory threshold")
+    parser.add_argument("--folder", default=CHARACTER_FOLDER)
+    parser.add_argument("--entries", type=int, default=ENTRY_THRESHOLD, help="entry-count threshold")
+    parser.add_argument("--tokens", type=int, default=TOKEN_THRESHOLD, help="short-term token threshold")
+    parser.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="requests in flight at once")
+    parser.add_argument("--dry-run", action="store_true", help="only list the characters that are due")
+    args = parser.parse_args()
+
+    print("BATCH MEMORY CONSOLIDATION\n")
+    due = find_due(args.folder, args.entries, args.tokens)
+    if not due:
+        print("No characters are over the consolidation threshold.")
+        return
+
+    for display_name, background, rows, shortterm, tokens in due:
+        print(f"  {display_name:<20} {len(rows):>3} entries  ~{tokens} tokens")
+    if args.dry_run:
+        return
+
+    print(f"\nConsolidating {len(due)} characters ({args.workers} at a time)...")
+    start = time.perf_counter()
+    results = consolidate_all(args.folder, due, args.workers)
+    print_report(results, time.perf_counter() - start, args.workers)
+
+if __name__ == "__main__":
+    main()
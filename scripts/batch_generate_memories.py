@@ -1,129 +1,149 @@
 import os
-import glob
-import requests
-from datetime import datetime
+import time
+import llm_client
+import file_cache
+import story_log
+import memory_store
+import memory_dedup
+import character_registry
+import prompt_templates
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from backup_utils import backup_file
 
-# Config - change API_URL if your oobabooga uses a different port/path
-API_URL = "http://127.0.0.1:5000/v1/completions"
-STORY_FILE = "story_recent.txt"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config - the API address lives in llm_client.py
+STORY_FILE = os.path.join(PROJECT_ROOT, "story", "story_recent.txt")
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")  # character_*.txt files and memories.db
+# How many of the latest scenes each memory is written from
+MEMORY_SCENES = 1
 SHORTTERM_TEMPLATE = "character_{}_shortterm.txt"
 BACKGROUND_TEMPLATE = "character_{}_background.txt"
-
-# Prompt template (keeps same rules as generate_memory.py)
-PROMPT_TEMPLATE = """You are summarizing a scene from {character}'s perspective.
-
-CHARACTER BACKGROUND:
-{background}
-
-RECENT SCENE:
-{story}
-
-Task: Write a brief memory summary (2-4 sentences) from {character}'s first-person perspective about what they observed, experienced, or learned in this scene. Focus on:
-- What they saw others do or say
-- Their own actions
-- Important information they learned
-- Emotions they felt (without announcing internal thoughts to others)
-
-Do NOT include what others were thinking. Only what {character} could observe.
-
-Memory summary:"""
+# How many memory requests are sent to the backend at once (1 = one after another)
+MAX_IN_FLIGHT = 4
 
 def load_file(path):
-    if not os.path.exists(path):
-        return None
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+    return file_cache.load_file(path)
 
 def call_oobabooga(prompt, max_tokens=200):
-    payload = {
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "stop": ["---END---"]
-    }
-    try:
-        r = requests.post(API_URL, json=payload, timeout=60)
-        r.raise_for_status()
-        data = r.json()
-        # match generate_memory.py behavior: choices[0]['text']
-        return data['choices'][0].get('text', '').strip()
-    except Exception as e:
-        print(f"API error: {e}")
-        return None
-
-def count_entries(shortterm_path):
-    content = load_file(shortterm_path)
-    if not content:
-        return 0
-    entries = [e.strip() for e in content.split("---") if e.strip()]
-    return len(entries)
-
-def append_memory(shortterm_path, memory):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+    return llm_client.complete(prompt, max_tokens=max_tokens, meta={"operation": "memory"})
+
+def count_entries(char_name):
+    # One indexed query against memories.db instead of reparsing the file
+    return memory_store.count_entries(CHARACTER_FOLDER, char_name)
+
+def append_memory(char_name, memory):
+    """Save to memories.db and the shortterm file; returns the new entry count"""
+    shortterm_path = os.path.join(CHARACTER_FOLDER, SHORTTERM_TEMPLATE.format(char_name))
     backup_file(shortterm_path)
-    with open(shortterm_path, "a", encoding="utf-8") as f:
-        f.write(f"\n[{timestamp}]\n{memory}\n---\n")
+    entries = memory_store.add_entry(CHARACTER_FOLDER, char_name, memory)
     print(f"Saved memory to {shortterm_path}")
+    return entries
+
+def find_characters():
+    """Collect (char_name, display_name, background, shortterm_path) for every character"""
+    characters = []
+    # One read of the character pack instead of globbing and opening every background file
+    for record in character_registry.characters(CHARACTER_FOLDER):
+        char_name, display_name, background = record['key'], record['name'], record['background']
+        shortterm_path = os.path.join(CHARACTER_FOLDER, SHORTTERM_TEMPLATE.format(char_name))
+        if not background:
+            if os.path.exists(os.path.join(CHARACTER_FOLDER, BACKGROUND_TEMPLATE.format(char_name))):
+                print(f"Skipping {display_name}: background file empty.")
+            continue
+        if not os.path.exists(shortterm_path):
+            # create an initial shortterm file if missing
+            memory_store.write_file(CHARACTER_FOLDER, char_name, memory_store.SHORTTERM)
+            print(f"Created missing shortterm file: {shortterm_path}")
+        characters.append((char_name, display_name, background, shortterm_path))
+    return characters
+
+def timed_memory(prompt):
+    """Call the API and return (memory, seconds taken)"""
+    start = time.perf_counter()
+    memory = call_oobabooga(prompt, max_tokens=200)
+    return memory, time.perf_counter() - start
+
+def generate_all(characters, story, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Send every character's memory prompt at once, at most max_in_flight at a time.
+    Returns {display_name: (memory or None, seconds)}.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = {}
+        for char_name, display_name, background, shortterm_path in characters:
+            prompt = prompt_templates.render("memory_summary", character=display_name,
+                                             background=background, story=story)
+            futures[pool.submit(timed_memory, prompt)] = display_name
+        for future in as_completed(futures):
+            display_name = futures[future]
+            memory, elapsed = future.result()
+            results[display_name] = (memory, elapsed)
+            status = "done" if memory else "FAILED"
+            print(f"  {display_name}: {status} ({elapsed:.1f}s)")
+    return results
+
+def print_timing_report(results, wall_time, max_in_flight):
+    """Per-character latency and total wall-clock time"""
+    print("\n=== TIMING ===")
+    for display_name, (memory, elapsed) in sorted(results.items(), key=lambda r: -r[1][1]):
+        print(f"  {display_name:<20} {elapsed:6.1f}s{'' if memory else '  (failed)'}")
+    serial_time = sum(elapsed for _, elapsed in results.values())
+    print(f"Total wall-clock: {wall_time:.1f}s for {len(results)} characters ({max_in_flight} in flight)")
+    if wall_time > 0:
+        print(f"Sum of request times: {serial_time:.1f}s (speedup x{serial_time / wall_time:.1f})")
+    print("==============")
 
 def main():
     print("BATCH MEMORY GENERATOR\n")
-    story = load_file(STORY_FILE)
+    story = story_log.recent_text(STORY_FILE, MEMORY_SCENES)
     if not story:
         print(f"Error: {STORY_FILE} not found or empty. Run a scene first.")
         return
 
-    # Find all background files: character_*_background.txt
-    bg_files = glob.glob("character_*_background.txt")
-    if not bg_files:
+    characters = find_characters()
+    if not characters:
         print("No characters found (no character_*_background.txt files).")
         return
 
     # Ask whether to auto-save all (y) or prompt per character (n)
     auto = input("Auto-save all generated memories? (y/N): ").strip().lower() == "y"
 
-    for bg_path in bg_files:
-        # Extract name, e.g., character_marcus_background.txt -> marcus
-        basename = os.path.basename(bg_path)
-        parts = basename.split("_")
-        if len(parts) < 3:
-            continue
-        char_name = "_".join(parts[1:-1])  # supports multi-word names like 'van_der'
-        display_name = char_name.replace("_", " ").title()
+    print(f"\nGenerating memories for {len(characters)} characters ({MAX_IN_FLIGHT} at a time)...")
+    start = time.perf_counter()
+    results = generate_all(characters, story)
+    print_timing_report(results, time.perf_counter() - start, MAX_IN_FLIGHT)
 
-        background = load_file(bg_path)
-        shortterm_path = SHORTTERM_TEMPLATE.format(char_name)
-        if not background:
-            print(f"Skipping {display_name}: background file empty.")
-            continue
-        if not os.path.exists(shortterm_path):
-            # create an initial shortterm file if missing
-            with open(shortterm_path, "w", encoding="utf-8") as f:
-                f.write(f"CHARACTER: {display_name}\nSHORT-TERM MEMORY (Recent detailed memories - last 10 scenes):\n\n")
-            print(f"Created missing shortterm file: {shortterm_path}")
-
-        prompt = PROMPT_TEMPLATE.format(character=display_name, background=background, story=story)
-        print(f"\nGenerating memory for {display_name}...")
-        memory = call_oobabooga(prompt, max_tokens=200)
+    # Review happens only after every request has finished
+    for char_name, display_name, background, shortterm_path in characters:
+        memory, elapsed = results[display_name]
         if not memory:
-            print(f"Failed to generate memory for {display_name}.")
+            print(f"\nFailed to generate memory for {display_name}.")
             continue
 
-        print("\n--- GENERATED MEMORY ---")
+        print(f"\n--- GENERATED MEMORY: {display_name} ---")
         print(memory)
         print("------------------------")
 
+        # Re-running on the same scene gives the same memory again - don't stack it up
+        duplicates = memory_dedup.find_duplicates(CHARACTER_FOLDER, char_name, memory)
+        if duplicates:
+            print(f"⚠️  Near-duplicate: {memory_dedup.describe(duplicates[0])}")
+            if auto:
+                print(f"Not saved - {display_name} already has this memory.")
+                continue
+
         save = auto
         if not auto:
             answer = input(f"Save memory for {display_name}? (y/N): ").strip().lower()
             save = answer == "y"
 
         if save:
-            append_memory(shortterm_path, memory)
-            entries = count_entries(shortterm_path)
+            entries = append_memory(char_name, memory)
             if entries >= 10:
-                print(f"⚠️  {display_name} has {entries} short-term memories. Consider running consolidate_memories.py.")
+                print(f"⚠️  {display_name} has {entries} short-term memories. Consider running batch_consolidate_memories.py.")
         else:
             print(f"Skipped saving memory for {display_name}.")
 
@@ -0,0 +1,291 @@
+"""
+Headless scene runner.
+
+Runs scripted scenes through the same prompt pipeline as interactive_scene,
+without anyone at the keyboard. Specs come from a directory of *.json files
+(one scene each, named after the file) or a .jsonl file (one scene per line):
+
+    {"id": "tavern-01",                        # optional
+     "npcs": ["Marcus", "Sera"],               # or "Marcus, Sera"
+     "passages": [
+        "Liara pushes the door open...",
+        {"text": "She sets the letter down.",
+         "regenerate": ["fresh", {"kind": "major", "text": "Sera refuses to read it"}]}
+     ]}
+
+Each passage gets a reply; "regenerate" asks again the way the regenerate menu
+would ("fresh", or major/minor/detail with an instruction) and the last good
+reply is the one kept. Paragraphs of a scene run in order, scenes run
+MAX_IN_FLIGHT at a time. For every scene the output folder gets <id>.txt (the
+scene) and <id>.json (every reply and the metrics of every call). progress.jsonl
+records each finished scene, so an interrupted run picks up where it stopped;
+a scene whose spec has changed since is run again. Nothing is committed to the
+story or to any memory file.
+
+    python batch_scenes.py <specs dir | specs.jsonl> [--out DIR] [--workers 4] [--force] [--no-cache]
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import llm_client
+import file_cache
+import story_log
+import story_summary
+import context_builder
+import response_cache
+import interactive_scene
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+OUTPUT_FOLDER = os.path.join(PROJECT_ROOT, "batch_output")
+PROGRESS_FILE = "progress.jsonl"
+MAX_IN_FLIGHT = 4        # scenes generated at once
+MAX_TOKENS = 800
+TEMPERATURE = 0.5        # same as interactive_scene
+
+REGEN_KINDS = ("fresh", "major", "minor", "detail")
+
+_progress_lock = threading.Lock()
+
+def parse_regeneration(raw):
+    """'fresh' or {"kind", "text"} -> (kind, text)"""
+    if isinstance(raw, str):
+        raw = {"kind": raw}
+    kind = raw.get("kind", "fresh")
+    text = raw.get("text", "").strip()
+    if kind not in REGEN_KINDS:
+        raise ValueError(f"unknown regeneration kind {kind!r}")
+    if kind != "fresh" and not text:
+        raise ValueError(f"{kind} regeneration needs a text")
+    return kind, text
+
+def parse_spec(raw, default_id):
+    """Normalize one scene spec: {id, npcs, passages: [(text, [(kind, text)])]}"""
+    if not isinstance(raw, dict):
+        raise ValueError("a scene spec must be a JSON object")
+    npcs = raw.get("npcs", [])
+    if isinstance(npcs, str):
+        npcs = npcs.split(",")
+    npcs = [npc.strip() for npc in npcs if npc.strip()]
+    passages = raw.get("passages")
+    if passages is None and "passage" in raw:
+        passages = [raw["passage"]]
+    if not npcs or not passages:
+        raise ValueError("a scene spec needs npcs and passages")
+
+    parsed = []
+    for passage in passages:
+        if isinstance(passage, str):
+            passage = {"text": passage}
+        text = passage.get("text", "").strip()
+        if not text:
+            raise ValueError("empty passage")
+        parsed.append((text, [parse_regeneration(r) for r in passage.get("regenerate", [])]))
+    return {"id": str(raw.get("id") or default_id), "npcs": npcs, "passages": parsed}
+
+def spec_hash(raw):
+    return hashlib.sha1(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def load_specs(path):
+    """[(raw spec, scene id)] from a directory of .json files or a .jsonl file, in order"""
+    specs = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                    specs.append((json.load(f), name[:-len(".json")]))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    specs.append((json.loads(line), f"scene_{number:03d}"))
+    return specs
+
+def load_progress(out_dir):
+    """{scene id: latest progress record}"""
+    progress = {}
+    path = os.path.join(out_dir, PROGRESS_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                progress[record["id"]] = record
+    return progress
+
+def save_progress(out_dir, record):
+    with _progress_lock:
+        with open(os.path.join(out_dir, PROGRESS_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+def shared_context():
+    """Style guide, world state and story context - the same for every scene in the batch"""
+    style_guide = interactive_scene.load_file(os.path.join(PROJECT_ROOT, "prompts", "style_guide.txt"))
+    world_state = interactive_scene.load_file(os.path.join(interactive_scene.WORLD_FOLDER, "world_state.txt"))
+    story_so_far, story_recent = story_summary.story_context(
+        interactive_scene.STORY_FILE, interactive_scene.RECENT_SCENES, interactive_scene.STORY_SUMMARY_TOKENS)
+    return {
+        'style_guide': style_guide,
+        'world_state': world_state,
+        'story_so_far': story_so_far,
+        'story_recent': story_recent,
+        'last_scene': story_log.recent_text(interactive_scene.STORY_FILE, 1),
+    }
+
+def call_backend(prompt, operation, scene_id):
+    """One non-streamed reply plus its metrics (fresh regenerations skip the response cache)"""
+    start = time.perf_counter()
+    text = llm_client.chat(prompt, max_tokens=MAX_TOKENS, temperature=TEMPERATURE,
+                           meta={"operation": operation, "scene": scene_id}, cache=operation != "regen:fresh")
+    return text, {
+        "operation": operation,
+        "prompt_tokens": context_builder.count_tokens(prompt),
+        "completion_tokens": context_builder.count_tokens(text) if text else 0,
+        "latency": round(time.perf_counter() - start, 3),
+        "ok": bool(text),
+    }
+
+def run_scene(spec, shared):
+    """Generate every paragraph of one scene; returns (scene text or None, details)"""
+    npc_data = interactive_scene.load_npc_data(spec['npcs'])
+    if not npc_data:
+        return None, {"error": "no files found for any of the npcs", "paragraphs": []}
+
+    scene_draft = []
+    paragraphs = []
+    scene_context = None
+    scene_lore_hits = []
+    for number, (passage, regenerations) in enumerate(spec['passages'], 1):
+        current_draft = "\n\n".join(scene_draft)
+        if scene_context is None:
+            scene_query = f"{passage}\n{shared['last_scene']}"
+            lore, scene_lore_hits = interactive_scene.select_lore(npc_data, scene_query,
+                                                                  interactive_scene.SCENE_LORE_ENTRIES)
+            scene_npcs = interactive_scene.select_npc_memories(npc_data, scene_query)
+            scene_context = interactive_scene.prepare_scene_context(
+                shared['style_guide'], lore, shared['world_state'], scene_npcs,
+                shared['story_recent'], shared['story_so_far'])
+            extra_lore = ""
+        else:
+            extra_lore, _ = interactive_scene.select_lore(npc_data, f"{passage}\n{current_draft[-2000:]}",
+                                                          interactive_scene.TURN_LORE_ENTRIES,
+                                                          exclude=scene_lore_hits)
+
+        replies = []
+        kept = None
+        for kind, text in [("paragraph", "")] + regenerations:
+            instruction = interactive_scene.regen_instruction(kind, text) if kind in ("major", "minor", "detail") else ""
+            prompt, _ = interactive_scene.build_prompt(scene_context, current_draft, passage, instruction, extra_lore)
+            operation = "paragraph" if kind == "paragraph" else f"regen:{kind}"
+            reply, call = call_backend(prompt, operation, spec['id'])
+            replies.append(dict(call, instruction=instruction, reply=reply))
+            kept = reply or kept
+        paragraphs.append({"passage": passage, "replies": replies})
+        if not kept:
+            return None, {"error": f"paragraph {number}: every call failed", "paragraphs": paragraphs}
+        scene_draft += [passage, kept]
+
+    return "\n\n".join(scene_draft), {"paragraphs": paragraphs}
+
+def process(raw, default_id, shared, out_dir):
+    """Run one spec and write its outputs; returns its progress record"""
+    start = time.perf_counter()
+    record = {"id": default_id, "hash": spec_hash(raw)}
+    try:
+        spec = parse_spec(raw, default_id)
+        record["id"] = spec['id']
+        scene, details = run_scene(spec, shared)
+    except ValueError as e:
+        scene, details = None, {"error": str(e), "paragraphs": []}
+
+    calls = [reply for paragraph in details['paragraphs'] for reply in paragraph['replies']]
+    record.update({
+        "status": "done" if scene else "failed",
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - start, 3),
+        "calls": len(calls),
+        "failed_calls": sum(1 for call in calls if not call['ok']),
+        "prompt_tokens": sum(call['prompt_tokens'] for call in calls),
+        "completion_tokens": sum(call['completion_tokens'] for call in calls),
+    })
+    if details.get("error"):
+        record["error"] = details['error']
+    if scene:
+        file_cache.write_text(os.path.join(out_dir, f"{record['id']}.txt"), scene + "\n")
+    file_cache.write_text(os.path.join(out_dir, f"{record['id']}.json"),
+                          json.dumps(dict(details, spec=raw, summary=record), indent=2))
+    save_progress(out_dir, record)
+    return record
+
+def run_batch(specs, out_dir, max_in_flight=MAX_IN_FLIGHT, force=False):
+    """Run every spec not already done; returns (records, skipped count)"""
+    os.makedirs(out_dir, exist_ok=True)
+    progress = {} if force else load_progress(out_dir)
+    todo = []
+    skipped = 0
+    for raw, default_id in specs:
+        scene_id = str(raw.get("id") or default_id) if isinstance(raw, dict) else default_id
+        done = progress.get(scene_id)
+        if done and done.get("status") == "done" and done.get("hash") == spec_hash(raw):
+            skipped += 1
+        else:
+            todo.append((raw, default_id))
+
+    shared = shared_context()
+    records = []
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = [pool.submit(process, raw, default_id, shared, out_dir) for raw, default_id in todo]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            status = "done" if record['status'] == "done" else f"FAILED ({record.get('error', '')})"
+            print(f"  {record['id']:<24} {record['calls']:>3} calls {record['seconds']:7.1f}s  {status}")
+    return records, skipped
+
+def print_report(records, skipped, wall_time, max_in_flight):
+    print("\n=== BATCH REPORT ===")
+    done = sum(1 for r in records if r['status'] == "done")
+    calls = sum(r['calls'] for r in records)
+    tokens = sum(r['completion_tokens'] for r in records)
+    scene_time = sum(r['seconds'] for r in records)
+    print(f"{done}/{len(records)} scenes written, {skipped} already done, {len(records) - done} failed")
+    print(f"{calls} calls, {sum(r['failed_calls'] for r in records)} failed, "
+          f"{sum(r['prompt_tokens'] for r in records)} prompt / {tokens} reply tokens")
+    print(f"Wall-clock {wall_time:.1f}s ({max_in_flight} scenes in flight)", end="")
+    if wall_time > 0 and records:
+        print(f", {tokens / wall_time:.1f} reply tok/s, speedup x{scene_time / wall_time:.1f}")
+    else:
+        print()
+    print("====================")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scripted scenes without the interactive prompts")
+    parser.add_argument("specs", help="directory of .json scene specs or a .jsonl file")
+    parser.add_argument("--out", help=f"output folder (default {OUTPUT_FOLDER}/<specs name>)")
+    parser.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="scenes generated at once")
+    parser.add_argument("--force", action="store_true", help="rerun scenes that are already done")
+    parser.add_argument("--no-cache", action="store_true", help="ask the backend even for prompts it has answered")
+    args = parser.parse_args()
+    if args.no_cache:
+        response_cache.ENABLED = False
+
+    name = os.path.splitext(os.path.basename(os.path.normpath(args.specs)))[0]
+    out_dir = args.out or os.path.join(OUTPUT_FOLDER, name)
+    specs = load_specs(args.specs)
+    print(f"BATCH SCENES: {len(specs)} specs from {args.specs} -> {out_dir}\n")
+
+    start = time.perf_counter()
+    records, skipped = run_batch(specs, out_dir, args.workers, args.force)
+    print_report(records, skipped, time.perf_counter() - start, args.workers)
+
+if __name__ == "__main__":
+    main()
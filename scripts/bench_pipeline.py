@@ -0,0 +1,373 @@
+"""
+End-to-end benchmark of the story scripts against a local mock backend.
+
+Builds a synthetic project (cast, world files, a story of --scenes scenes) in a
+temporary folder, starts mock_server with the requested latency, generation
+speed and failure rate, then drives generate_scene, interactive_scene,
+batch_generate_memories and consolidate_memories with scripted answers in
+place of input(). For each stage it reports wall-clock time, requests, prompt
+size, and how the time split between waiting on the network and file I/O.
+
+    python bench_pipeline.py [--npcs 4] [--scenes 40] [--turns 3] [--regens 1]
+                             [--latency 0.05] [--decode-tps 200] [--fail-rate 0.05]
+                             [--no-stream] [--json results.json] [--verbose]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import builtins
+import tempfile
+import threading
+import contextlib
+import llm_client
+import file_cache
+import metrics_log
+import response_cache
+import story_log
+import story_summary
+import mock_server
+import generate_scene
+import interactive_scene
+import batch_generate_memories
+import consolidate_memories
+
+WORDS = ("ash bell cold dusk ember frost gate hollow iron jade keep lantern mist north oath pale "
+         "quiet river salt thorn umber vale wind yew").split()
+
+def filler(seed, n_words):
+    """Deterministic pseudo-prose so runs are comparable"""
+    return " ".join(WORDS[(seed * 7 + i * 3) % len(WORDS)] for i in range(n_words))
+
+class Meter:
+    """Time spent waiting on the backend and on file reads/writes during a stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.network = 0.0
+        self.file_io = 0.0
+        self.calls = 0
+        self.prompt_bytes = 0
+
+    def add(self, field, seconds):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + seconds)
+
+meter = Meter()
+
+class TimedFile:
+    """File object wrapper that charges reads and writes to meter.file_io"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def _timed(self, name, *args):
+        start = time.perf_counter()
+        try:
+            return getattr(self._f, name)(*args)
+        finally:
+            meter.add("file_io", time.perf_counter() - start)
+
+    def read(self, *args):
+        return self._timed("read", *args)
+
+    def readline(self, *args):
+        return self._timed("readline", *args)
+
+    def readlines(self, *args):
+        return self._timed("readlines", *args)
+
+    def write(self, *args):
+        return self._timed("write", *args)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._timed("__next__")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._timed("close")
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+@contextlib.contextmanager
+def instrumented():
+    """Count backend calls and time file I/O while the stages run"""
+    real_open = builtins.open
+    real_post = llm_client.post_json
+    real_stream = llm_client.stream_post
+
+    def timed_open(*args, **kwargs):
+        start = time.perf_counter()
+        f = real_open(*args, **kwargs)
+        meter.add("file_io", time.perf_counter() - start)
+        return TimedFile(f)
+
+    def prompt_size(payload):
+        text = payload.get("prompt") or "".join(m.get("content", "") for m in payload.get("messages", []))
+        return len(text.encode("utf-8"))
+
+    def timed_post(path, payload, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return real_post(path, payload, *args, **kwargs)
+        finally:
+            meter.add("network", time.perf_counter() - start)
+            meter.add("calls", 1)
+            meter.add("prompt_bytes", prompt_size(payload))
+
+    def timed_stream(path, payload, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return real_stream(path, payload, *args, **kwargs)
+        finally:
+            meter.add("network", time.perf_counter() - start)
+            meter.add("calls", 1)
+            meter.add("prompt_bytes", prompt_size(payload))
+
+    builtins.open = timed_open
+    llm_client.post_json = timed_post
+    llm_client.stream_post = timed_stream
+    try:
+        yield
+    finally:
+        builtins.open = real_open
+        llm_client.post_json = real_post
+        llm_client.stream_post = real_stream
+
+@contextlib.contextmanager
+def scripted_input(answers, verbose=False):
+    """Feed answers to input() in order; running out means the script asked something unexpected"""
+    queue = list(answers)
+    real_input = builtins.input
+
+    def fake_input(prompt=""):
+        if not queue:
+            raise RuntimeError(f"benchmark script ran out of answers at prompt {prompt!r}")
+        answer = queue.pop(0)
+        if verbose:
+            print(f"{prompt}{answer}")
+        return answer
+
+    builtins.input = fake_input
+    try:
+        yield
+    finally:
+        builtins.input = real_input
+
+def make_project(root, n_npcs, n_scenes):
+    """Synthetic world, cast and story laid out the way each script expects"""
+    for folder in ("characters", "world", "prompts", "story"):
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def write(relpath, text):
+        with open(os.path.join(root, relpath), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    write("prompts/style_guide.txt", "STYLE GUIDE\n" + filler(1, 300))
+    write("world/style_guide.txt", "STYLE GUIDE\n" + filler(1, 300))
+    write("world/world_state.txt", "WORLD STATE\n" + filler(2, 120))
+    write("world/world_encyclopedic.txt", "\n\n".join(f"# Entry {i}\n{filler(10 + i, 80)}" for i in range(60)))
+
+    names = [f"npc_{i}" for i in range(n_npcs)]
+    for i, name in enumerate(names):
+        display = name.replace("_", " ").title()
+        write(f"characters/character_{name}_background.txt", f"CHARACTER: {display}\n{filler(100 + i, 200)}")
+        entries = "".join(f"\n[2025-01-{j + 1:02d} 12:00]\n{filler(200 + i * 10 + j, 50)}\n---\n" for j in range(8))
+        write(f"characters/character_{name}_shortterm.txt",
+              f"CHARACTER: {display}\nSHORT-TERM MEMORY (Recent detailed memories - last 10 scenes):\n\n{entries}")
+        write(f"characters/character_{name}_longterm.txt",
+              f"CHARACTER: {display}\nLONG-TERM MEMORY (Consolidated summaries):\n\n[2025-01-01 12:00]\n{filler(300 + i, 120)}\n---\n")
+
+    for i in range(n_scenes):
+        story_log.append_scene(os.path.join(root, "story", "story_recent.txt"), f"Scene {i}. {filler(400 + i, 250)}")
+    return [name.replace("_", " ").title() for name in names]
+
+def point_scripts_at(root):
+    """Aim every script's path constants at the synthetic project"""
+    interactive_scene.PROJECT_ROOT = root
+    interactive_scene.CHARACTER_FOLDER = os.path.join(root, "characters")
+    interactive_scene.WORLD_FOLDER = os.path.join(root, "world")
+    interactive_scene.STORY_FOLDER = os.path.join(root, "story")
+    interactive_scene.STORY_FILE = os.path.join(root, "story", "story_recent.txt")
+    interactive_scene.ENCYCLOPEDIA_FILE = os.path.join(root, "world", "world_encyclopedic.txt")
+    batch_generate_memories.STORY_FILE = os.path.join(root, "story", "story_recent.txt")
+    batch_generate_memories.CHARACTER_FOLDER = os.path.join(root, "characters")
+    generate_scene.CHARACTER_FOLDER = os.path.join(root, "characters")
+    generate_scene.WORLD_FOLDER = os.path.join(root, "world")
+    generate_scene.STORY_FILE = os.path.join(root, "story", "story_recent.txt")
+    consolidate_memories.STORY_FOLDER = os.path.join(root, "characters")
+
+def wait_for_background_work():
+    """Let the post-commit story summary threads finish inside the stage that started them"""
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and not thread.daemon:
+            thread.join()
+
+def passage(seed):
+    return [f"Protagonist action {seed}. {filler(500 + seed, 60)}", ""]
+
+def stage_answers(cast, args):
+    """Scripted input() answers for each stage"""
+    scene = [", ".join(cast[:2])] + passage(0) + ["y"]
+
+    interactive = [", ".join(cast[:3])]
+    for turn in range(args.turns):
+        interactive += passage(turn + 1)
+        interactive += ["2", "a"] * args.regens
+        if turn < args.turns - 1:
+            interactive += ["1", "y"]
+        else:
+            interactive += ["4", "y"]
+
+    batch = ["y"]
+    consolidate = [cast[0], "y", "y"]
+    return {
+        'generate_scene': scene,
+        'interactive_scene': interactive,
+        'batch_generate_memories': batch,
+        'consolidate_memories': consolidate,
+    }
+
+def run_stage(name, func, answers, folder, server, verbose):
+    """Run one script function with scripted input; returns its measurements"""
+    before = dict(server.stats)
+    meter.reset()
+    cwd = os.getcwd()
+    out = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    error = None
+    metrics_log.SCRIPT = name
+    try:
+        os.chdir(folder)
+        with scripted_input(answers, verbose), contextlib.redirect_stdout(out):
+            func()
+            wait_for_background_work()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        os.chdir(cwd)
+        metrics_log.SCRIPT = None
+    wall = time.perf_counter() - start
+    after = server.stats
+    return {
+        'stage': name,
+        'wall': wall,
+        'calls': meter.calls,
+        'requests': after['requests'] - before['requests'],
+        'failures': after['failures'] - before['failures'],
+        'prompt_bytes': meter.prompt_bytes,
+        'prompt_tokens': after['prompt_tokens'] - before['prompt_tokens'],
+        'cached_tokens': after['cached_tokens'] - before['cached_tokens'],
+        'network': meter.network,
+        'file_io': meter.file_io,
+        'error': error,
+    }
+
+def print_results(results):
+    print(f"\n{'stage':<26} {'wall s':>7} {'calls':>5} {'reqs':>5} {'fail':>4} {'prompt KB':>9} "
+          f"{'prompt tok':>10} {'cached':>7} {'net s':>7} {'file s':>7} {'other s':>7}")
+    totals = {}
+    for row in results:
+        other = max(0.0, row['wall'] - row['network'] - row['file_io'])
+        print(f"{row['stage']:<26} {row['wall']:7.2f} {row['calls']:5d} {row['requests']:5d} {row['failures']:4d} "
+              f"{row['prompt_bytes'] / 1024:9.1f} {row['prompt_tokens']:10d} {row['cached_tokens']:7d} "
+              f"{row['network']:7.2f} {row['file_io']:7.3f} {other:7.2f}")
+        if row['error']:
+            print(f"  !! {row['error']}")
+        for key in ('wall', 'calls', 'requests', 'failures', 'prompt_bytes', 'prompt_tokens',
+                    'cached_tokens', 'network', 'file_io'):
+            totals[key] = totals.get(key, 0) + row[key]
+    other = max(0.0, totals['wall'] - totals['network'] - totals['file_io'])
+    print(f"{'TOTAL':<26} {totals['wall']:7.2f} {totals['calls']:5d} {totals['requests']:5d} {totals['failures']:4d} "
+          f"{totals['prompt_bytes'] / 1024:9.1f} {totals['prompt_tokens']:10d} {totals['cached_tokens']:7d} "
+          f"{totals['network']:7.2f} {totals['file_io']:7.3f} {other:7.2f}")
+    print("\n(net s and file s add up time across threads, so with parallel requests they can exceed wall s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the story scripts against a mock backend")
+    parser.add_argument("--npcs", type=int, default=4)
+    parser.add_argument("--scenes", type=int, default=40, help="scenes already in the story")
+    parser.add_argument("--turns", type=int, default=3, help="paragraphs in the interactive scene")
+    parser.add_argument("--regens", type=int, default=1, help="fresh regenerations per paragraph")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock seconds before each response")
+    parser.add_argument("--decode-tps", type=float, default=400.0, help="mock generation speed (0 = instant)")
+    parser.add_argument("--prefill-tps", type=float, default=20000.0, help="mock prompt processing speed")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests the mock fails")
+    parser.add_argument("--fail-mode", choices=("503", "drop"), default="503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backoff", type=float, default=0.05, help="llm_client retry backoff base (seconds)")
+    parser.add_argument("--no-stream", action="store_true", help="use plain requests instead of streaming")
+    parser.add_argument("--cache", action="store_true",
+                        help="turn the response cache on (off by default so every call reaches the mock)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic project folder")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own output")
+    parser.add_argument("--stats", action="store_true", help="also print metrics_log stats for the run")
+    args = parser.parse_args()
+
+    server = mock_server.start_server(prefill_tps=args.prefill_tps, reply_tokens=args.reply_tokens,
+                                      latency=args.latency, decode_tps=args.decode_tps,
+                                      fail_rate=args.fail_rate, fail_mode=args.fail_mode, seed=args.seed)
+    llm_client.API_BASE = mock_server.server_url(server)
+    llm_client.BACKOFF_BASE = args.backoff
+    response_cache.ENABLED = args.cache
+    generate_scene.STREAM_OUTPUT = interactive_scene.STREAM_OUTPUT = not args.no_stream
+
+    root = tempfile.mkdtemp(prefix="story_bench_")
+    try:
+        cast = make_project(root, args.npcs, args.scenes)
+        point_scripts_at(root)
+        metrics_log.METRICS_FILE = os.path.join(root, "metrics.jsonl")
+        response_cache.CACHE_FILE = os.path.join(root, "responses.db")
+        # An existing campaign already has its summary tree; building it isn't part of the run
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+            story_summary.update(os.path.join(root, "story", "story_recent.txt"))
+        if os.path.exists(metrics_log.METRICS_FILE):
+            os.remove(metrics_log.METRICS_FILE)
+        file_cache.clear()
+        answers = stage_answers(cast, args)
+        characters = os.path.join(root, "characters")
+        stages = [
+            ("generate_scene", generate_scene.generate_scene, root),
+            ("interactive_scene", interactive_scene.interactive_scene, root),
+            ("batch_generate_memories", batch_generate_memories.main, characters),
+            ("consolidate_memories", consolidate_memories.main, root),
+        ]
+        print(f"Benchmark: {args.npcs} NPCs, {args.scenes}-scene story, {args.turns} turns x "
+              f"{args.regens + 1} generations, latency {args.latency}s, {args.decode_tps or 'instant'} tok/s, "
+              f"fail rate {args.fail_rate}, {'plain' if args.no_stream else 'streaming'}")
+        results = []
+        with instrumented():
+            for name, func, folder in stages:
+                results.append(run_stage(name, func, answers[name], folder, server, args.verbose))
+        print_results(results)
+        if args.stats:
+            print()
+            metrics_log.stats(metrics_log.read_records())
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+            print(f"Results written to {args.json}")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Project kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark how much of each scene prompt the backend can serve from its prefix cache.
+
+Plays a scripted session (several scenes, several turns per scene, a few
+regenerations per turn, memories and world state changing between scenes)
+against a local mock server, once with the old mixed layout and once with the
+prefix-stable layout from interactive_scene, and reports the shared prefix and
+the prefill work saved.
+
+    python bench_prefix.py [--scenes 4] [--turns 4] [--regens 2] [--npcs 3]
+"""
+import time
+import argparse
+import llm_client
+import metrics_log
+import response_cache
+import context_builder
+import interactive_scene
+import mock_server
+
+WORDS = ("ash bell cold dusk ember frost gate hollow iron jade keep lantern mist north oath pale "
+         "quiet river salt thorn umber vale wind yew").split()
+
+def filler(seed, n_words):
+    """Deterministic pseudo-prose so runs are comparable"""
+    return " ".join(WORDS[(seed * 7 + i * 3) % len(WORDS)] for i in range(n_words))
+
+def make_world(n_npcs):
+    """Synthetic style guide, encyclopedia, cast and story"""
+    style_guide = interactive_scene.load_file(
+        interactive_scene.os.path.join(interactive_scene.PROJECT_ROOT, "prompts", "style_guide.txt")) or filler(1, 300)
+    encyclopedia = "\n\n".join(f"ENTRY {i}: {filler(i, 60)}" for i in range(20))
+    npc_data = {}
+    for i in range(n_npcs):
+        name = f"npc_{i}"
+        npc_data[name] = {
+            'name': name.replace("_", " ").title(),
+            'background': filler(100 + i, 150),
+            'shortterm': "\n---\n".join(f"[memory {j}] {filler(200 + i * 10 + j, 40)}" for j in range(5)),
+            'longterm': filler(300 + i, 120),
+        }
+    story = "\n\n".join(f"Scene {i}. {filler(400 + i, 150)}" for i in range(6))
+    return style_guide, encyclopedia, npc_data, story
+
+def legacy_prompt(style_guide, encyclopedia, world_state, npc_data, story, draft, action, extra):
+    """The original interactive_scene layout: instruction first, volatile sections mixed in"""
+    make = context_builder.make_section
+    sections = [
+        make("instruction", interactive_scene.CRITICAL_INSTRUCTION, 0, keep=None),
+        make("style guide", style_guide, 1, keep="start"),
+        make("world encyclopedia", encyclopedia, 7, header="WORLD ENCYCLOPEDIA:", keep="start"),
+        make("world state", world_state, 4, header="CURRENT WORLD STATE:", keep="start"),
+        make("active characters", "ACTIVE CHARACTERS IN THIS SCENE (ONLY WRITE FOR THESE):", 0, keep=None),
+    ]
+    for data in npc_data.values():
+        sections += [
+            make(data['name'], f"CHARACTER [{data['name'].upper()}]:", 0, keep=None),
+            make("background", data['background'], 2, header="BACKGROUND:", keep="start"),
+            make("short-term", data['shortterm'], 5, header="SHORT-TERM MEMORY:"),
+            make("long-term", data['longterm'], 6, header="LONG-TERM MEMORY:"),
+        ]
+    sections += [
+        make("recent story", story, 8, header="RECENT STORY:"),
+        make("scene so far", draft, 3, header="CURRENT SCENE SO FAR:"),
+        make("latest action", action, 0, header="LATEST ACTION:"),
+        make("closing", interactive_scene.CLOSING_INSTRUCTION, 0, keep=None),
+        make("regeneration", extra, 0, keep=None),
+    ]
+    prompt, _ = context_builder.assemble(sections, interactive_scene.CONTEXT_BUDGET)
+    return prompt
+
+def stable_prompt(scene_context, draft, action, extra):
+    prompt, _ = interactive_scene.build_prompt(scene_context, draft, action, extra)
+    return prompt
+
+def run_session(layout, args):
+    """Play the scripted session with one layout; returns totals from the mock server"""
+    server = mock_server.start_server(prefill_tps=args.prefill_tps, reply_tokens=20)
+    llm_client.API_BASE = mock_server.server_url(server)
+    style_guide, encyclopedia, npc_data, story = make_world(args.npcs)
+    regen_instructions = ["MINOR ADJUSTMENT NEEDED: less dialogue",
+                          "MAJOR CHANGE REQUIRED: the guard refuses",
+                          "CRITICAL FACT YOU MUST RESPECT: it is night"]
+
+    start = time.perf_counter()
+    for scene in range(args.scenes):
+        world_state = f"Day {scene + 1}. {filler(500 + scene, 40)}"
+        scene_context = interactive_scene.prepare_scene_context(style_guide, encyclopedia, world_state,
+                                                                npc_data, story)
+        draft = []
+        for turn in range(args.turns):
+            action = f"Liara acts ({scene}/{turn}). {filler(600 + scene * 10 + turn, 50)}"
+            current_draft = "\n\n".join(draft)
+            for regen in range(args.regens + 1):
+                extra = regen_instructions[(regen - 1) % len(regen_instructions)] if regen else ""
+                if layout == "legacy":
+                    prompt = legacy_prompt(style_guide, encyclopedia, world_state, npc_data, story,
+                                           current_draft, action, extra)
+                else:
+                    prompt = stable_prompt(scene_context, current_draft, action, extra)
+                reply = llm_client.chat(prompt, max_tokens=20)
+            draft += [action, reply or ""]
+
+        # Between scenes: commit the scene and give everyone a new memory
+        story += "\n\n" + "\n\n".join(draft)
+        for key, data in npc_data.items():
+            data['shortterm'] += f"\n---\n[scene {scene}] {filler(700 + scene, 40)}"
+
+    wall = time.perf_counter() - start
+    stats = dict(server.stats)
+    server.shutdown()
+    stats['wall'] = wall
+    stats['prefill_tokens'] = stats['prompt_tokens'] - stats['cached_tokens']
+    return stats
+
+def print_row(label, stats, prefill_tps):
+    shared = 100.0 * stats['cached_tokens'] / stats['prompt_tokens'] if stats['prompt_tokens'] else 0.0
+    print(f"{label:<14} {stats['requests']:>5} {stats['prompt_tokens']:>10} {shared:>8.1f}% "
+          f"{stats['prefill_tokens']:>10} {stats['prefill_tokens'] / prefill_tps:>9.1f}s {stats['wall']:>7.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix-cache benchmark for scene prompts")
+    parser.add_argument("--scenes", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--regens", type=int, default=2, help="regenerations per turn")
+    parser.add_argument("--npcs", type=int, default=3)
+    parser.add_argument("--prefill-tps", type=float, default=20000.0,
+                        help="mock prefill speed in tokens/sec (lower = slower, more realistic waits)")
+    args = parser.parse_args()
+    response_cache.ENABLED = False   # a cached answer never reaches the mock, so it would measure nothing
+    metrics_log.ENABLED = False      # and synthetic calls don't belong in logs/metrics.jsonl
+
+    print(f"Session: {args.scenes} scenes x {args.turns} turns x {args.regens + 1} generations, {args.npcs} NPCs\n")
+    legacy = run_session("legacy", args)
+    stable = run_session("stable", args)
+
+    print(f"{'layout':<14} {'calls':>5} {'prompt tok':>10} {'shared':>9} {'prefill':>10} {'prefill t':>10} {'wall':>8}")
+    print_row("mixed (old)", legacy, args.prefill_tps)
+    print_row("prefix-stable", stable, args.prefill_tps)
+    if legacy['prefill_tokens']:
+        saved = 100.0 * (1 - stable['prefill_tokens'] / legacy['prefill_tokens'])
+        print(f"\nPrefill tokens saved by prefix-stable layout: {saved:.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Registry of every character in a folder, with their backgrounds packed together.
+
+The character_<name>_background/shortterm/longterm.txt files stay the source
+of truth - they're what you edit and what memory_store writes. Next to them,
+characters.pack holds a copy of every background in one file: a header line,
+a JSON index (display name, aliases, metadata from the background header, and
+the offset, length and stamp of each background) and then the backgrounds
+themselves. Finding a cast's backgrounds is one read of the pack (once per
+process) and a dictionary lookup per character instead of a directory glob and
+an open per background.
+
+Memory files aren't packed: they change after almost every scene, and each
+change would mean rewriting the whole pack. They are read directly through
+file_cache, so a fresh process still opens two memory files per character;
+later loads in the same process only stat them.
+
+The pack keeps itself in sync. Every lookup stats the character's background
+and rereads it if it changed; characters added or removed are noticed with
+one directory listing whenever the folder itself changes. Whatever changed is
+written back to the pack (atomically). A pack that is missing or unreadable
+is rebuilt from the files.
+
+Aliases come from an "ALIASES: Cass, The Seeker" line in the background file.
+
+    python character_registry.py list [--folder characters]
+    python character_registry.py rebuild [--folder characters]
+    python character_registry.py show <name> [--folder characters]
+"""
+import os
+import re
+import json
+import time
+import argparse
+import threading
+import file_cache
+import memory_store
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")
+PACK_NAME = "characters.pack"
+PACK_MAGIC = "STORYPACK 1"
+
+KINDS = ("background", memory_store.SHORTTERM, memory_store.LONGTERM)
+PACKED = "background"      # the one kind kept in the pack
+HEADER_LINE = re.compile(r"^([A-Z][A-Z /]*):\s*(.*)$")
+
+_registries = {}   # folder -> Registry
+_registries_lock = threading.Lock()
+
+def folder_stamp(folder):
+    """Changes when a file is added to, removed from or replaced in folder"""
+    try:
+        return os.stat(folder).st_mtime_ns
+    except OSError:
+        return None
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def parse_background(key, text):
+    """(display name, aliases, metadata) from the header lines at the top of a background file"""
+    name, aliases, meta = memory_store.display_name(key), [], {}
+    for line in text.split("\n"):
+        match = HEADER_LINE.match(line.strip())
+        if not match:
+            if line.strip():
+                break   # header lines only - the prose below can contain "SOMETHING:" too
+            continue
+        label, value = match.group(1).strip(), match.group(2).strip()
+        if label == "CHARACTER" and value:
+            name = value
+        elif label == "ALIASES":
+            aliases = [alias.strip() for alias in value.split(",") if alias.strip()]
+        elif value:
+            meta[label.lower()] = value
+    return name, aliases, meta
+
+def scan_keys(folder):
+    """Every character with at least one file in folder (one directory listing)"""
+    keys = set()
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return keys
+    for filename in names:
+        if filename.startswith("character_") and filename.endswith(".txt"):
+            key, _, kind = filename[len("character_"):-len(".txt")].rpartition("_")
+            if key and kind in KINDS:
+                keys.add(key)
+    return keys
+
+class Registry:
+    """Index and texts of every character in one folder, kept in step with characters.pack"""
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder or ".")
+        self.pack_path = os.path.join(self.folder, PACK_NAME)
+        self.lock = threading.RLock()
+        self.entries = {}     # key -> {'name', 'aliases', 'meta', 'stamp' of the background}
+        self.texts = {}       # key -> background text, or (offset, length) in self.data until first used
+        self.data = b""       # the pack as last read
+        self.names = None     # lowercased key / name / alias -> key (rebuilt when a background changes)
+        self.pack_stamp = None
+        self.folder_stamp = None   # folder as of the last listing
+        self.dirty = False
+        self.stats = {"pack_reads": 0, "file_reads": 0, "pack_writes": 0}
+
+    def path(self, key, kind):
+        return os.path.join(self.folder, f"character_{key}_{kind}.txt")
+
+    # -- pack file -----------------------------------------------------------
+
+    def read_pack(self):
+        """Load the pack in one read; False if it's missing or unreadable"""
+        try:
+            with open(self.pack_path, "rb") as f:
+                data = f.read()
+            self.stats["pack_reads"] += 1
+            magic_end = data.index(b"\n")
+            index_end = data.index(b"\n", magic_end + 1)
+            if data[:magic_end].decode("ascii") != PACK_MAGIC:
+                return False
+            rows = json.loads(data[magic_end + 1:index_end])
+            offset = index_end + 1
+            entries, texts = {}, {}
+            for key, name, aliases, meta, mtime, size, length in rows:
+                entries[key] = {'name': name, 'aliases': aliases, 'meta': meta,
+                                'stamp': None if mtime is None else [mtime, size]}
+                # Decoded when the character is first looked up
+                texts[key] = (offset, length)
+                offset += length
+        except (OSError, ValueError, TypeError):
+            return False
+        self.entries, self.texts, self.data = entries, texts, data
+        self.pack_stamp = file_stamp(self.pack_path)
+        self.names = None
+        return True
+
+    def write_pack(self):
+        """Write every background and the index to the pack (via a temp file)"""
+        # The index is one flat row per character - much quicker to parse than nested objects:
+        #   [key, name, aliases, meta, background mtime, size, packed length]
+        # and the backgrounds follow it in the same order.
+        blobs, rows = [], []
+        for key in sorted(self.entries):
+            entry = self.entries[key]
+            text = self.texts.get(key, "")
+            blob = self.data[text[0]:text[0] + text[1]] if isinstance(text, tuple) else text.encode("utf-8")
+            rows.append([key, entry['name'], entry['aliases'], entry['meta']]
+                        + (entry['stamp'] or [None, None]) + [len(blob)])
+            blobs.append(blob)
+        header = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+        tmp = f"{self.pack_path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(f"{PACK_MAGIC}\n{header}\n".encode("utf-8"))
+            f.write(b"".join(blobs))
+        os.replace(tmp, self.pack_path)
+        self.pack_stamp = file_stamp(self.pack_path)
+        self.stats["pack_writes"] += 1
+        self.dirty = False
+
+    # -- keeping in sync with the loose files ------------------------------
+
+    def rebuild_names(self):
+        names = {}
+        for key, entry in self.entries.items():
+            for name in [key, key.replace("_", " "), entry['name']] + entry['aliases']:
+                names.setdefault(name.lower(), key)
+        self.names = names
+
+    def load_character(self, key):
+        """(Re)read a character's background"""
+        path = self.path(key, PACKED)
+        self.texts[key] = read_text(path)
+        self.stats["file_reads"] += 1
+        name, aliases, meta = parse_background(key, self.texts[key])
+        self.entries[key] = {'name': name, 'aliases': aliases, 'meta': meta, 'stamp': file_stamp(path)}
+        self.names = None
+        self.dirty = True
+
+    def check(self, key):
+        """Reread a character's background if it changed since it was packed (a stat, no open)"""
+        if file_stamp(self.path(key, PACKED)) != self.entries[key]['stamp']:
+            self.load_character(key)
+
+    def refresh(self):
+        """Pick up another process's pack, or characters added/removed since the pack was written"""
+        stamp = file_stamp(self.pack_path)
+        if stamp is None or stamp != self.pack_stamp:
+            if not self.read_pack():
+                self.entries, self.texts, self.names = {}, {}, None
+            self.folder_stamp = None
+        current = folder_stamp(self.folder)
+        if current != self.folder_stamp:
+            keys = scan_keys(self.folder)
+            for key in set(self.entries) - keys:
+                del self.entries[key], self.texts[key]
+                self.names = None
+                self.dirty = True
+            for key in keys - set(self.entries):
+                self.load_character(key)
+            self.folder_stamp = current
+
+    def save(self):
+        if self.dirty:
+            self.write_pack()
+            # Replacing the pack touched the folder, which isn't a change to the characters
+            self.folder_stamp = folder_stamp(self.folder)
+
+    # -- lookups ---------------------------------------------------------------
+
+    def resolve(self, name):
+        if self.names is None:
+            self.rebuild_names()
+        return self.names.get(name.strip().lower()) or self.names.get(memory_store.character_key(name))
+
+    def background(self, key):
+        value = self.texts[key]
+        if isinstance(value, tuple):
+            offset, length = value
+            value = self.texts[key] = self.data[offset:offset + length].decode("utf-8", errors="replace")
+        return value
+
+    def record(self, key):
+        entry = self.entries[key]
+        record = {kind: file_cache.load_file(self.path(key, kind), "") for kind in KINDS if kind != PACKED}
+        record[PACKED] = self.background(key)
+        record.update(key=key, name=entry['name'], aliases=entry['aliases'], meta=entry['meta'])
+        return record
+
+    def lookup(self, names):
+        """({name: character record} for the names found, [names not found])"""
+        with self.lock:
+            self.refresh()
+            found, missing = {}, []
+            checked = False
+            for name in names:
+                key = self.resolve(name)
+                if key is None and not checked:
+                    # Maybe a background was edited to add the name or alias
+                    for other in list(self.entries):
+                        self.check(other)
+                    checked = True
+                    key = self.resolve(name)
+                if key is None:
+                    missing.append(name)
+                    continue
+                self.check(key)
+                found[name] = self.record(key)
+            self.save()
+            return found, missing
+
+    def all(self):
+        """Every character's record, sorted by key"""
+        with self.lock:
+            self.refresh()
+            for key in self.entries:
+                self.check(key)
+            self.save()
+            return [self.record(key) for key in sorted(self.entries)]
+
+def registry(folder):
+    """The shared Registry for folder"""
+    folder = os.path.abspath(folder or ".")
+    with _registries_lock:
+        if folder not in _registries:
+            _registries[folder] = Registry(folder)
+        return _registries[folder]
+
+def load_cast(folder, names):
+    """
+    Characters by name, key or alias: ({name asked for: {key, name, aliases,
+    meta, background, shortterm, longterm}}, [names not found])
+    """
+    return registry(folder).lookup(names)
+
+def characters(folder):
+    """Every character in folder (same records as load_cast)"""
+    return registry(folder).all()
+
+def rebuild(folder):
+    """Throw the pack away and build it again from the text files"""
+    reg = registry(folder)
+    with reg.lock:
+        if os.path.exists(reg.pack_path):
+            os.remove(reg.pack_path)
+        reg.entries, reg.texts, reg.names = {}, {}, None
+        reg.pack_stamp = reg.folder_stamp = None
+    return characters(folder)
+
+def main():
+    parser = argparse.ArgumentParser(description="Character registry and pack file")
+    parser.add_argument("command", choices=("list", "rebuild", "show"))
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("--folder", default=CHARACTER_FOLDER)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "show":
+        found, missing = load_cast(args.folder, [args.name or ""])
+        if missing:
+            print(f"No character called '{args.name}'.")
+            return
+        record = next(iter(found.values()))
+        print(f"{record['name']} [{record['key']}]")
+        if record['aliases']:
+            print(f"  aliases: {', '.join(record['aliases'])}")
+        for label, value in sorted(record['meta'].items()):
+            print(f"  {label}: {value}")
+        for kind in KINDS:
+            print(f"  {kind:<11} {len(record[kind]):>8} chars")
+        return
+
+    records = rebuild(args.folder) if args.command == "rebuild" else characters(args.folder)
+    elapsed = time.perf_counter() - start
+    for record in records:
+        aliases = f"  ({', '.join(record['aliases'])})" if record['aliases'] else ""
+        sizes = " ".join(f"{len(record[kind]):>7}" for kind in KINDS)
+        print(f"  {record['name']:<28} {sizes}{aliases}")
+    reg = registry(args.folder)
+    print(f"{len(records)} characters in {reg.pack_path} ({elapsed * 1000:.1f} ms, "
+          f"{reg.stats['pack_reads']} pack reads, {reg.stats['file_reads']} file reads)")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
-import requests
 import os
-from datetime import datetime
+import llm_client
+import file_cache
+import memory_store
+import prompt_templates
 from backup_utils import backup_file
 
 # Configuration
-API_URL = "http://127.0.0.1:5000/v1/completions"
-STORY_FOLDER = "."  # Current folder
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORY_FOLDER = os.path.join(BASE_DIR, "characters")  # character_*.txt files and memories.db
 
 def get_character_name():
     """Prompt for character name"""
@@ -13,38 +15,57 @@ def get_character_name():
 
 def load_file(filepath):
     """Load text file, return content or None"""
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return f.read()
-    return None
+    return file_cache.load_file(filepath)
 
 def call_oobabooga(prompt, max_tokens=600):
     """Send prompt to Oobabooga API"""
-    payload = {
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "stop": ["---END---"]
-    }
-    
-    try:
-        response = requests.post(API_URL, json=payload, timeout=90)
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['text'].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"API Error: {e}")
-        return None
+    return llm_client.complete(prompt, max_tokens=max_tokens, meta={"operation": "consolidation"})
+
+def memory_files(folder, char_lower):
+    """(background, shortterm, longterm) paths for a character"""
+    return tuple(os.path.join(folder, f"character_{char_lower}_{kind}.txt")
+                 for kind in ("background", "shortterm", "longterm"))
+
+def load_shortterm(folder, char_lower):
+    """Active shortterm rows from memories.db (newest first) and the text the prompt shows"""
+    # Active entries come from memories.db (imported from the text file the first time)
+    rows = memory_store.recent_entries(folder, char_lower, memory_store.SHORTTERM, limit=-1)
+    shortterm = "".join(memory_store.format_entry(text, ts) for _, ts, text in reversed(rows))
+    return rows, shortterm
+
+def build_prompt(character_name, background, shortterm, entry_count):
+    return prompt_templates.render("consolidation", character=character_name, background=background,
+                                   shortterm=shortterm, entry_count=entry_count)
+
+def save_consolidation(folder, character_name, rows, summary):
+    """
+    Back up both memory files, record the consolidation in memories.db, then
+    rewrite both files from it: the longterm file with the summary added, the
+    shortterm file without the consolidated entries. Each file is replaced in
+    one step, never left half-written.
+    """
+    char_lower = memory_store.character_key(character_name)
+    background_file, shortterm_file, longterm_file = memory_files(folder, char_lower)
+
+    # Backup files before making changes
+    backup_file(shortterm_file)
+    if os.path.exists(longterm_file):
+        backup_file(longterm_file)
+
+    # Record the batch and retire the consolidated entries in one transaction
+    summary_entry = f"Consolidated from {len(rows)} memories:\n{summary}"
+    memory_store.record_consolidation(folder, char_lower, summary_entry, [row[0] for row in rows])
+
+    memory_store.write_file(folder, char_lower, memory_store.LONGTERM)
+    memory_store.write_file(folder, char_lower, memory_store.SHORTTERM)
+    return longterm_file, shortterm_file
 
 def consolidate_memories(character_name):
     """Consolidate shortterm memories into longterm summary"""
     
     # File paths
-    char_lower = character_name.lower().strip().replace(" ", "_")
-    background_file = os.path.join(STORY_FOLDER, f"character_{char_lower}_background.txt")
-    shortterm_file = os.path.join(STORY_FOLDER, f"character_{char_lower}_shortterm.txt")
-    longterm_file = os.path.join(STORY_FOLDER, f"character_{char_lower}_longterm.txt")
+    char_lower = memory_store.character_key(character_name)
+    background_file, shortterm_file, longterm_file = memory_files(STORY_FOLDER, char_lower)
     
     # Load files
     background = load_file(background_file)
@@ -58,9 +79,11 @@ def consolidate_memories(character_name):
         print(f"Error: No shortterm memories found for {character_name}")
         return
     
-    # Count entries
-    entries = [e.strip() for e in shortterm.split("---") if e.strip()]
-    entry_count = len(entries)
+    rows, shortterm = load_shortterm(STORY_FOLDER, char_lower)
+    entry_count = len(rows)
+    if not rows:
+        print(f"Error: No shortterm memories found for {character_name}")
+        return
     
     print(f"\nFound {entry_count} shortterm memories for {character_name}")
     
@@ -72,24 +95,7 @@ def consolidate_memories(character_name):
             return
     
     # Build consolidation prompt
-    prompt = f"""You are consolidating {character_name}'s recent memories into a summary.
-
-CHARACTER BACKGROUND:
-{background}
-
-RECENT SHORTTERM MEMORIES (LAST {entry_count} SCENES):
-{shortterm}
-
-Task: Write a consolidated summary (4-8 sentences) in first-person from {character_name}'s perspective that captures:
-- Key events they witnessed or participated in
-- Important relationships that developed or changed
-- Critical information they learned
-- Significant emotional moments or realizations
-- Any ongoing concerns or goals they developed
-
-Focus on what's important for {character_name} to remember long-term. Compress similar events together. Keep specific details that matter.
-
-Consolidated memory summary:"""
+    prompt = build_prompt(character_name, background, shortterm, entry_count)
 
     print(f"\nGenerating consolidated summary...")
     summary = call_oobabooga(prompt, max_tokens=400)
@@ -107,29 +113,8 @@ Consolidated memory summary:"""
     save = input("Save this consolidated summary? (y/n): ").strip().lower()
     
     if save == 'y':
-        # Backup files before making changes
-        backup_file(shortterm_file)
-        if os.path.exists(longterm_file):
-            backup_file(longterm_file)
-        
-        # Now make changes
-        # Add to longterm
-        consolidation_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        entry = f"\n---\n[{consolidation_timestamp}] Consolidated from {entry_count} memories:\n{summary}\n"
-        
-        with open(longterm_file, 'a', encoding='utf-8') as f:
-            f.write(entry)
-        
+        save_consolidation(STORY_FOLDER, character_name, rows, summary)
         print(f"✓ Added consolidated summary to {longterm_file}")
-        
-        # Clear shortterm file (keep header)
-        header = f"""CHARACTER: {character_name}
-SHORT-TERM MEMORY (Recent detailed memories - last 10 scenes):
-
-"""
-        with open(shortterm_file, 'w', encoding='utf-8') as f:
-            f.write(header)
-        
         print(f"✓ Cleared {shortterm_file}")
         print(f"\n✓ Consolidation complete for {character_name}")
     else:
@@ -0,0 +1,114 @@
+import re
+from functools import lru_cache
+
+# Rough size of a token for the Llama/Mistral-style tokenizers oobabooga usually runs.
+# Good enough for budgeting - we only need to stay safely under the context window.
+CHARS_PER_TOKEN = 4
+WORDS_TO_TOKENS = 1.3
+
+# Sections that can't fit at least this many tokens are dropped instead of cut to a stub
+MIN_SECTION_TOKENS = 40
+
+TRIM_MARKER = "[...]"
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Estimate token count (cached - the same files get counted every turn)"""
+    if not text:
+        return 0
+    words = len(re.findall(r"\w+|[^\w\s]", text))
+    return max(int(len(text) / CHARS_PER_TOKEN), int(words * WORDS_TO_TOKENS))
+
+def make_section(name, text, priority, header="", keep="end"):
+    """
+    One block of the prompt.
+    priority: lower numbers are filled first and are the last to be cut.
+    keep: which part survives trimming - "end" (newest story, latest draft) or "start".
+          None means the section is all-or-nothing.
+    """
+    return {'name': name, 'text': text or "", 'priority': priority, 'header': header, 'keep': keep}
+
+def trim_to_tokens(text, max_tokens, keep="end"):
+    """Cut text on line boundaries so it fits in max_tokens, keeping the start or the end"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.split("\n")
+    if keep == "start":
+        lines_iter = lines
+    else:
+        lines_iter = reversed(lines)
+
+    kept = []
+    used = count_tokens(TRIM_MARKER) + 1
+    for line in lines_iter:
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+
+    if not kept:
+        # A single huge line (pasted prose with no breaks) - fall back to characters
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        kept = [text[:max_chars]] if keep == "start" else [text[-max_chars:]]
+
+    if keep == "start":
+        return "\n".join(kept + [TRIM_MARKER])
+    return "\n".join([TRIM_MARKER] + kept[::-1])
+
+def render_section(header, text):
+    """Header line followed by the section text (nothing at all if the text is empty)"""
+    if not text:
+        return ""
+    return f"{header}\n{text}" if header else text
+
+def assemble(sections, budget):
+    """
+    Fit sections into budget tokens.
+    Sections are filled in priority order, then joined in the order given.
+    Returns (prompt, report) - report rows are (name, tokens used, tokens available).
+    """
+    remaining = budget
+    fitted = {}
+    order = sorted(range(len(sections)), key=lambda i: sections[i]['priority'])
+    for i in order:
+        section = sections[i]
+        if not section['text']:
+            fitted[i] = ""
+            continue
+        header_cost = count_tokens(section['header']) + 1 if section['header'] else 0
+        full_cost = header_cost + count_tokens(section['text'])
+        if full_cost <= remaining:
+            fitted[i] = section['text']
+            remaining -= full_cost
+        elif section['keep'] and remaining - header_cost >= MIN_SECTION_TOKENS:
+            fitted[i] = trim_to_tokens(section['text'], remaining - header_cost, section['keep'])
+            remaining -= header_cost + count_tokens(fitted[i])
+        else:
+            fitted[i] = ""
+
+    parts = []
+    report = []
+    for i, section in enumerate(sections):
+        full = render_section(section['header'], section['text'])
+        part = render_section(section['header'], fitted[i])
+        report.append((section['name'], count_tokens(part), count_tokens(full)))
+        if part:
+            parts.append(part)
+
+    return "\n\n".join(parts), report
+
+def print_report(report, budget):
+    """Tokens spent per section, flagging anything trimmed or dropped"""
+    used = sum(row[1] for row in report)
+    print(f"\n=== CONTEXT ({used}/{budget} tokens) ===")
+    for name, tokens, available in report:
+        if available == 0:
+            continue
+        note = ""
+        if tokens == 0:
+            note = f"  DROPPED ({available})"
+        elif tokens < available:
+            note = f"  trimmed from {available}"
+        print(f"  {name:<32} {tokens:>6}{note}")
+    print("=" * 30 + "\n")
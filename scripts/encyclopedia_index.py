@@ -0,0 +1,212 @@
+"""
+BM25 inverted index over world_encyclopedic.txt.
+
+The encyclopedia is split into entries (blank-line separated blocks; a heading
+line sticks to the block under it). The index is saved next to the file as
+<file>.index.json and rebuilt incrementally: when the file changes, only
+entries whose text changed are re-tokenized.
+
+    python encyclopedia_index.py [path] "query words"   # build/refresh and show the top entries
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+from collections import Counter, defaultdict
+from context_builder import count_tokens
+
+TOP_K = 6
+FULL_TEXT_TOKENS = 1500   # an encyclopedia this small goes into the prompt whole - no search
+BM25_K1 = 1.5
+BM25_B = 0.75
+INDEX_VERSION = 1
+
+STOPWORDS = set("""a an and are as at be but by for from had has have he her his i in into is it its
+of on or she that the their them they this to was were what when where which who will with you your
+not no do does did so than then there these those our we us me my him""".split())
+
+# Indexes already loaded this process, keyed by encyclopedia path
+_loaded = {}
+
+def tokenize(text):
+    """Lowercase words worth searching on"""
+    return [w for w in re.findall(r"[a-z0-9']+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+def split_entries(text):
+    """Blank-line separated blocks; a block that is only a heading joins the next one"""
+    blocks = [b.strip() for b in re.split(r"\n\s*\n", text) if b.strip()]
+    entries = []
+    pending = ""
+    for block in blocks:
+        if block.startswith("#") and "\n" not in block:
+            pending = f"{pending}\n{block}".strip()
+            continue
+        entries.append(f"{pending}\n{block}".strip() if pending else block)
+        pending = ""
+    if pending:
+        entries.append(pending)
+    return entries
+
+def entry_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def index_file_path(path):
+    return path + ".index.json"
+
+def build_postings(index):
+    """Inverted index term -> [(entry number, term frequency)] plus document frequencies"""
+    postings = defaultdict(list)
+    for i, entry in enumerate(index['entries']):
+        for term, tf in entry['tf'].items():
+            postings[term].append((i, tf))
+    index['postings'] = postings
+    lengths = [e['length'] for e in index['entries']]
+    index['avg_length'] = (sum(lengths) / len(lengths)) if lengths else 0.0
+    return index
+
+def build_index(path, old_index=None):
+    """(Re)build the index for path, reusing term counts for entries that didn't change"""
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    st = os.stat(path)
+
+    reusable = {}
+    if old_index:
+        reusable = {e['hash']: e for e in old_index['entries']}
+
+    entries = []
+    reused = 0
+    for block in split_entries(text):
+        h = entry_hash(block)
+        if h in reusable:
+            old = reusable[h]
+            entries.append({'hash': h, 'text': block, 'tf': old['tf'], 'length': old['length']})
+            reused += 1
+            continue
+        terms = tokenize(block)
+        entries.append({'hash': h, 'text': block, 'tf': dict(Counter(terms)), 'length': len(terms)})
+
+    index = {
+        'version': INDEX_VERSION,
+        'stamp': [st.st_mtime_ns, st.st_size],
+        'entries': entries,
+    }
+    try:
+        with open(index_file_path(path), "w", encoding="utf-8") as f:
+            json.dump({k: index[k] for k in ('version', 'stamp', 'entries')}, f)
+    except OSError as e:
+        print(f"Warning: couldn't save encyclopedia index: {e}")
+
+    build_postings(index)
+    index['build_seconds'] = time.perf_counter() - start
+    index['reused'] = reused
+    index['full_tokens'] = count_tokens(text)
+    return index
+
+def load_index(path):
+    """Index for path, rebuilding (incrementally) only if the encyclopedia changed"""
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    stamp = [st.st_mtime_ns, st.st_size]
+
+    index = _loaded.get(path)
+    if index and index['stamp'] == stamp:
+        return index
+
+    if index is None and os.path.exists(index_file_path(path)):
+        try:
+            with open(index_file_path(path), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get('version') == INDEX_VERSION:
+                index = saved
+        except (OSError, ValueError):
+            index = None
+
+    if index and index['stamp'] == stamp:
+        build_postings(index)
+        index.setdefault('build_seconds', 0.0)
+        index.setdefault('reused', len(index['entries']))
+        index['full_tokens'] = sum(count_tokens(e['text']) for e in index['entries'])
+    else:
+        index = build_index(path, index)
+    _loaded[path] = index
+    return index
+
+def search(index, query, k=TOP_K, exclude=()):
+    """Top k entry numbers for query by BM25 score, best first"""
+    n = len(index['entries'])
+    if not n:
+        return []
+    scores = defaultdict(float)
+    for term, qtf in Counter(tokenize(query)).items():
+        postings = index['postings'].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for i, tf in postings:
+            length = index['entries'][i]['length']
+            norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (index['avg_length'] or 1)))
+            scores[i] += idf * norm * qtf
+    ranked = sorted((i for i in scores if i not in exclude), key=lambda i: -scores[i])
+    return ranked[:k]
+
+def relevant_entries(path, query, k=TOP_K, exclude=(), full_text_tokens=FULL_TEXT_TOKENS):
+    """
+    The k encyclopedia entries most relevant to query, in file order - or, when the
+    whole encyclopedia fits in full_text_tokens, all of it (less any excluded entries),
+    so entries that share no words with the query aren't lost.
+    Returns (text, entry numbers, stats) - stats has build/query times and tokens saved.
+    """
+    index = load_index(path)
+    if not index:
+        return "", [], None
+    start = time.perf_counter()
+    whole = index['full_tokens'] <= full_text_tokens
+    if whole:
+        hits = [i for i in range(len(index['entries'])) if i not in exclude]
+    else:
+        hits = sorted(search(index, query, k, exclude))
+    query_seconds = time.perf_counter() - start
+    if whole and not exclude:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+    else:
+        text = "\n\n".join(index['entries'][i]['text'] for i in hits)
+    stats = {
+        'entries': len(index['entries']),
+        'selected': len(hits),
+        'whole': whole,
+        'build_seconds': index['build_seconds'],
+        'reused': index['reused'],
+        'query_seconds': query_seconds,
+        'tokens_saved': max(0, index['full_tokens'] - count_tokens(text)),
+    }
+    return text, hits, stats
+
+def format_stats(stats):
+    """One-line summary for the context report"""
+    if stats.get('whole'):
+        return (f"encyclopedia: whole file, {stats['selected']}/{stats['entries']} entries "
+                f"(under {FULL_TEXT_TOKENS} tokens, no search needed)")
+    return (f"encyclopedia: {stats['selected']}/{stats['entries']} entries, "
+            f"index {stats['build_seconds'] * 1000:.1f}ms ({stats['reused']} reused), "
+            f"query {stats['query_seconds'] * 1000:.2f}ms, saved ~{stats['tokens_saved']} tokens")
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "world", "world_encyclopedic.txt")
+    query = " ".join(sys.argv[2:]) or input("Search for: ")
+    text, hits, stats = relevant_entries(path, query)
+    if stats is None:
+        print(f"Error: {path} not found")
+        return
+    print(text or "(no matching entries)")
+    print(f"\n[{format_stats(stats)}]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Pool of text-generation backends for llm_client.
+
+Endpoints come from STORY_API_BASES (comma-separated base URLs) or, failing
+that, endpoints.json in the project root:
+
+    {"endpoints": ["http://127.0.0.1:5000", "http://192.168.1.20:5000"]}
+
+With neither, the pool is just llm_client.API_BASE, so a single backend works
+as it always has.
+
+Each request goes to the healthy endpoint with the fewest requests in flight.
+An endpoint that fails FAILURE_THRESHOLD times in a row is taken out of
+rotation (its circuit "opens") for COOLDOWN seconds; after that one trial
+request - or a successful health probe - decides whether it comes back. With
+more than one endpoint a background thread probes them every HEALTH_INTERVAL
+seconds. Latency statistics are kept per endpoint.
+
+    python endpoint_pool.py status                  # probe the configured endpoints
+    python endpoint_pool.py bench [--backends 3]    # try the routing against local mock servers
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+ENDPOINTS_FILE = os.path.join(PROJECT_ROOT, "endpoints.json")
+ENDPOINTS_ENV = "STORY_API_BASES"
+FAILURE_THRESHOLD = 3    # consecutive failures that open an endpoint's circuit
+COOLDOWN = 30.0          # seconds an open endpoint is left alone before it's tried again
+HEALTH_INTERVAL = 15.0   # seconds between health probes (only with more than one endpoint)
+HEALTH_PATH = "/v1/models"
+HEALTH_TIMEOUT = 3.0
+LATENCY_WINDOW = 200     # recent request latencies kept per endpoint
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+def configured_endpoints():
+    """Base URLs from the environment or endpoints.json; [] if neither is set"""
+    env = os.environ.get(ENDPOINTS_ENV, "")
+    if env.strip():
+        return [url.strip().rstrip("/") for url in env.split(",") if url.strip()]
+    if os.path.exists(ENDPOINTS_FILE):
+        with open(ENDPOINTS_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        urls = config.get("endpoints", []) if isinstance(config, dict) else config
+        return [url.rstrip("/") for url in urls]
+    return []
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+class Endpoint:
+    """One backend: requests in flight, circuit state and recent latencies"""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.state = CLOSED
+        self.failures = 0            # consecutive
+        self.opened_at = 0.0
+        self.trial = False           # a half-open trial request is in flight
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def available(self, now):
+        if self.state == OPEN and now - self.opened_at >= COOLDOWN:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.trial
+        return self.state == CLOSED
+
+    def summary(self):
+        latencies = list(self.latencies)
+        return {
+            "url": self.url,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+        }
+
+class EndpointPool:
+    """Least-outstanding-requests routing with a circuit breaker per endpoint"""
+
+    def __init__(self, urls, health_checks=None):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.health_thread = None
+        if health_checks if health_checks is not None else len(self.endpoints) > 1:
+            self.health_thread = threading.Thread(target=self.health_loop, name="endpoint-health", daemon=True)
+            self.health_thread.start()
+
+    def acquire(self, exclude=()):
+        """
+        Endpoint to send the next request to (counted as in flight until release()).
+        exclude skips endpoints that just failed this call, if anything else is usable.
+        """
+        with self.lock:
+            now = time.monotonic()
+            usable = [e for e in self.endpoints if e.available(now)]
+            preferred = [e for e in usable if e.url not in exclude] or usable
+            if preferred:
+                endpoint = min(preferred, key=lambda e: (e.outstanding, e.requests))
+            else:
+                # Everything is open: try the one that has been resting longest rather than fail outright
+                endpoint = min(self.endpoints, key=lambda e: e.opened_at)
+            if endpoint.state == HALF_OPEN:
+                endpoint.trial = True
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok, seconds=None):
+        """
+        Record how a request went. ok=True/False updates the circuit;
+        ok=None (e.g. a cancelled stream) only frees the slot.
+        """
+        with self.lock:
+            endpoint.outstanding -= 1
+            if endpoint.state == HALF_OPEN:
+                endpoint.trial = False
+            if ok is None:
+                return
+            if ok:
+                endpoint.failures = 0
+                endpoint.state = CLOSED
+                if seconds is not None:
+                    endpoint.latencies.append(seconds)
+            else:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.state == HALF_OPEN or endpoint.failures >= FAILURE_THRESHOLD:
+                    self.open(endpoint)
+
+    def open(self, endpoint):
+        if endpoint.state != OPEN:
+            print(f"[endpoint {endpoint.url} taken out of rotation after {endpoint.failures} failures]")
+        endpoint.state = OPEN
+        endpoint.opened_at = time.monotonic()
+        endpoint.trial = False
+
+    def probe(self, endpoint):
+        """GET the health path; closes or opens the circuit accordingly"""
+        import llm_client
+        try:
+            response = llm_client.get_session().get(endpoint.url + HEALTH_PATH, timeout=HEALTH_TIMEOUT)
+            healthy = response.status_code == 200
+        except Exception:
+            healthy = False
+        with self.lock:
+            if healthy and endpoint.state != CLOSED:
+                print(f"[endpoint {endpoint.url} is healthy again]")
+                endpoint.state = CLOSED
+                endpoint.failures = 0
+                endpoint.trial = False
+            elif not healthy:
+                endpoint.failures = max(endpoint.failures, FAILURE_THRESHOLD)
+                self.open(endpoint)
+        return healthy
+
+    def health_loop(self):
+        while not self.stop.wait(HEALTH_INTERVAL):
+            for endpoint in list(self.endpoints):
+                self.probe(endpoint)
+
+    def close(self):
+        self.stop.set()
+
+    def summary(self):
+        with self.lock:
+            return [endpoint.summary() for endpoint in self.endpoints]
+
+def print_summary(rows):
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}"
+    print(f"{'endpoint':<32} {'state':<10} {'reqs':>5} {'errors':>6} {'p50 s':>6} {'p90 s':>6}")
+    for row in rows:
+        print(f"{row['url']:<32} {row['state']:<10} {row['requests']:>5} {row['errors']:>6} "
+              f"{fmt(row['p50']):>6} {fmt(row['p90']):>6}")
+
+def status():
+    import llm_client
+    urls = configured_endpoints() or [llm_client.API_BASE]
+    pool = EndpointPool(urls, health_checks=False)
+    for endpoint in pool.endpoints:
+        start = time.perf_counter()
+        healthy = pool.probe(endpoint)
+        print(f"  {endpoint.url:<32} {'up' if healthy else 'DOWN'} ({time.perf_counter() - start:.2f}s)")
+
+def bench(args):
+    """Spread requests over several mock servers, one of which fails for the first part of the run"""
+    import llm_client
+    import metrics_log
+    import mock_server
+    import response_cache
+    response_cache.ENABLED = False   # every request should reach a backend
+    metrics_log.ENABLED = False      # and none of them belong in logs/metrics.jsonl
+    # llm_client uses the imported module, not this __main__ copy
+    import endpoint_pool
+    endpoint_pool.COOLDOWN, endpoint_pool.HEALTH_INTERVAL = args.cooldown, args.cooldown / 2
+
+    servers = [mock_server.start_server(latency=args.latency * (i + 1), decode_tps=args.decode_tps,
+                                        prefill_tps=0) for i in range(args.backends)]
+    flaky = servers[-1]
+    flaky.options["fail_rate"] = 1.0
+    llm_client.set_endpoints([mock_server.server_url(server) for server in servers])
+    llm_client.BACKOFF_BASE = 0.05
+
+    def heal():
+        time.sleep(args.heal_after)
+        flaky.options["fail_rate"] = 0.0
+    threading.Thread(target=heal, daemon=True).start()
+
+    def one(i):
+        start = time.perf_counter()
+        text = llm_client.complete(f"Request {i}: continue the story.", max_tokens=40,
+                                   meta={"operation": "pool-bench"})
+        return text is not None, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - start
+    ok = sum(1 for good, _ in results if good)
+    print(f"\n{ok}/{len(results)} requests answered in {wall:.1f}s "
+          f"({args.workers} workers, {args.backends} backends, last one failing for {args.heal_after:.0f}s)\n")
+    print_summary(llm_client.get_pool().summary())
+    for server in servers:
+        server.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or exercise the backend endpoint pool")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("status", help="probe each configured endpoint")
+    bench_parser = sub.add_parser("bench", help="route requests across local mock servers")
+    bench_parser.add_argument("--backends", type=int, default=3)
+    bench_parser.add_argument("--requests", type=int, default=60)
+    bench_parser.add_argument("--workers", type=int, default=8)
+    bench_parser.add_argument("--latency", type=float, default=0.05, help="backend i waits (i+1) times this")
+    bench_parser.add_argument("--decode-tps", type=float, default=400.0)
+    bench_parser.add_argument("--heal-after", type=float, default=1.0, help="seconds before the failing backend recovers")
+    bench_parser.add_argument("--cooldown", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        if args.backends < 2:
+            sys.exit("bench needs at least two backends")
+        bench(args)
+    elif args.command == "status":
+        status()
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
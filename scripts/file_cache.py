@@ -0,0 +1,130 @@
+"""
+Shared file loader with an in-process cache.
+
+Files are cached by path and only reread when their modification time or size
+changes. The memory-entry count ("---" separated) is kept alongside the text and
+updated on append, so counting after a save doesn't reread or re-split the file.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+ENTRY_SEPARATOR = "---"
+
+MAX_FILES = 256                  # least recently used files are dropped past this
+MAX_BYTES = 64 * 1024 * 1024     # total text kept in memory
+MAX_FILE_BYTES = 16 * 1024 * 1024  # bigger files are read every time instead of cached
+
+_cache = OrderedDict()   # path -> {'stamp', 'text', 'entries', 'tail'}
+_cached_bytes = 0
+_lock = threading.RLock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def file_stamp(path):
+    """(mtime_ns, size) of path, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def count_pieces(text):
+    """Return (non-empty entry count, text after the last separator)"""
+    pieces = text.split(ENTRY_SEPARATOR)
+    return sum(1 for p in pieces if p.strip()), pieces[-1]
+
+def forget(path):
+    """Drop a file from the cache"""
+    global _cached_bytes
+    with _lock:
+        item = _cache.pop(os.path.abspath(path), None)
+        if item:
+            _cached_bytes -= len(item['text'])
+
+def clear():
+    """Empty the whole cache"""
+    global _cached_bytes
+    with _lock:
+        _cache.clear()
+        _cached_bytes = 0
+
+def remember(key, stamp, text, entries=None, tail=None):
+    """Store text for key and evict old files until we're back under the limits"""
+    global _cached_bytes
+    if len(text) > MAX_FILE_BYTES:
+        forget(key)
+        return
+    if entries is None:
+        entries, tail = count_pieces(text)
+    with _lock:
+        old = _cache.pop(key, None)
+        if old:
+            _cached_bytes -= len(old['text'])
+        _cache[key] = {'stamp': stamp, 'text': text, 'entries': entries, 'tail': tail}
+        _cached_bytes += len(text)
+        while _cache and (len(_cache) > MAX_FILES or _cached_bytes > MAX_BYTES):
+            _, dropped = _cache.popitem(last=False)
+            _cached_bytes -= len(dropped['text'])
+            stats["evictions"] += 1
+
+def get_entry(path):
+    """Cached record for path, reading the file if it changed. None if it doesn't exist."""
+    key = os.path.abspath(path)
+    stamp = file_stamp(key)
+    if stamp is None:
+        forget(key)
+        return None
+    with _lock:
+        item = _cache.get(key)
+        if item and item['stamp'] == stamp:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            return item
+        stats["misses"] += 1
+
+    with open(key, "r", encoding="utf-8") as f:
+        text = f.read()
+    entries, tail = count_pieces(text)
+    remember(key, stamp, text, entries, tail)
+    return {'stamp': stamp, 'text': text, 'entries': entries, 'tail': tail}
+
+def load_file(path, default=None):
+    """Load text file through the cache; default if it doesn't exist"""
+    item = get_entry(path)
+    return item['text'] if item else default
+
+def count_entries(path):
+    """Number of non-empty "---" separated entries in path (0 if missing)"""
+    item = get_entry(path)
+    return item['entries'] if item else 0
+
+def append_text(path, text):
+    """Append text to path and update the cached copy and entry count in place"""
+    key = os.path.abspath(path)
+    with _lock:
+        before = file_stamp(key)
+        item = _cache.get(key)
+        with open(key, "a", encoding="utf-8") as f:
+            f.write(text)
+        after = file_stamp(key)
+
+        # Only patch the cache if nobody else touched the file since we last read it
+        if item and before is not None and item['stamp'] == before:
+            added, tail = count_pieces(item['tail'] + text)
+            tail_had = 1 if item['tail'].strip() else 0
+            remember(key, after, item['text'] + text, item['entries'] - tail_had + added, tail)
+        elif before is None:
+            remember(key, after, text)
+        else:
+            forget(key)
+
+def write_text(path, text):
+    """Overwrite path with text (via a temp file, so readers never see half of it) and cache it"""
+    key = os.path.abspath(path)
+    with _lock:
+        tmp = f"{key}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, key)
+        remember(key, file_stamp(key), text)
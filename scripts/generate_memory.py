@@ -1,13 +1,18 @@
-import requests
 import os
-from datetime import datetime
+import llm_client
+import file_cache
+import story_log
+import memory_store
+import memory_dedup
+import prompt_templates
 from backup_utils import backup_file
 
 # Configuration
-API_URL = "http://127.0.0.1:5000/v1/completions"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STORY_DIR = os.path.join(BASE_DIR, "story")
 CHARACTERS_DIR = os.path.join(BASE_DIR, "characters")
+# How many of the latest scenes the memory is written from
+MEMORY_SCENES = 1
 
 def get_character_name():
     """Prompt for character name"""
@@ -15,49 +20,27 @@ def get_character_name():
 
 def load_file(filepath):
     """Load text file, return content or None"""
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return f.read()
-    return None
+    return file_cache.load_file(filepath)
 
-def count_shortterm_entries(filepath):
-    """Count memory entries in shortterm file"""
-    content = load_file(filepath)
-    if not content:
-        return 0
-    # Count entries separated by "---"
-    entries = [e.strip() for e in content.split("---") if e.strip()]
-    return len(entries)
+def count_shortterm_entries(character_key):
+    """Count active shortterm memory entries"""
+    return memory_store.count_entries(CHARACTERS_DIR, character_key)
 
 def call_oobabooga(prompt, max_tokens=400):
     """Send prompt to Oobabooga API"""
-    payload = {
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "stop": ["---END---"]
-    }
-    
-    try:
-        response = requests.post(API_URL, json=payload, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['text'].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"API Error: {e}")
-        return None
+    return llm_client.complete(prompt, max_tokens=max_tokens, meta={"operation": "memory"})
 
 def generate_memory(character_name):
     """Generate memory summary for character from latest scene"""
     
     # File paths
-    story_file = os.path.join(STORY_FOLDER, "story_recent.txt")
-    background_file = os.path.join(STORY_FOLDER, f"character_{character_name}_background.txt")
-    shortterm_file = os.path.join(STORY_FOLDER, f"character_{character_name}_shortterm.txt")
+    char_lower = character_name.lower().strip().replace(" ", "_")
+    story_file = os.path.join(STORY_DIR, "story_recent.txt")
+    background_file = os.path.join(CHARACTERS_DIR, f"character_{char_lower}_background.txt")
+    shortterm_file = os.path.join(CHARACTERS_DIR, f"character_{char_lower}_shortterm.txt")
     
     # Load files
-    story = load_file(story_file)
+    story = story_log.recent_text(story_file, MEMORY_SCENES)
     background = load_file(background_file)
     
     if not story:
@@ -69,23 +52,8 @@ def generate_memory(character_name):
         return
     
     # Build prompt
-    prompt = f"""You are summarizing a scene from {character_name}'s perspective.
-
-CHARACTER BACKGROUND:
-{background}
-
-RECENT SCENE:
-{story}
-
-Task: Write a brief memory summary (2-4 sentences) from {character_name}'s first-person perspective about what they observed, experienced, or learned in this scene. Focus on:
-- What they saw others do or say
-- Their own actions
-- Important information they learned
-- Emotions they felt (without announcing internal thoughts to others)
-
-Do NOT include what others were thinking. Only what {character_name} could observe.
-
-Memory summary:"""
+    prompt = prompt_templates.render("memory_summary", character=character_name,
+                                     background=background, story=story)
 
     print(f"\nGenerating memory for {character_name}...")
     memory = call_oobabooga(prompt, max_tokens=200)
@@ -98,29 +66,32 @@ Memory summary:"""
     print(memory)
     print("------------------------\n")
     
-    save = input("Save this memory? (y/n): ").strip().lower()
+    duplicates = memory_dedup.find_duplicates(CHARACTERS_DIR, char_lower, memory)
+    if duplicates:
+        print(f"⚠️  Near-duplicate: {memory_dedup.describe(duplicates[0])}")
+        save = input("Save anyway (y), replace the old memory with this one (r), or discard (n): ").strip().lower()
+    else:
+        save = input("Save this memory? (y/n): ").strip().lower()
     
-    if save == 'y':
+    if save == 'r' and duplicates:
+        memory_dedup.replace_entry(CHARACTERS_DIR, char_lower, duplicates[0][0], memory)
+        print(f"Replaced the earlier memory in {shortterm_file}")
+    elif save == 'y':
         # Backup shortterm file before modifying
         backup_file(shortterm_file)
         
-        # Add timestamp and separator
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        entry = f"\n---\n[{timestamp}]\n{memory}\n"
-        
-        # Append to shortterm file
-        with open(shortterm_file, 'a', encoding='utf-8') as f:
-            f.write(entry)
+        # Same entry layout as batch_generate_memories.py
+        memory_store.add_entry(CHARACTERS_DIR, char_lower, memory)
         
         print(f"Memory saved to {shortterm_file}")
         
         # Check entry count
-        count = count_shortterm_entries(shortterm_file)
+        count = count_shortterm_entries(char_lower)
         print(f"\nShortterm memory entries: {count}/10")
         
         if count >= 10:
             print(f"⚠️  WARNING: {character_name} has 10+ shortterm memories!")
-            print(f"Run: python consolidate_memories.py")
+            print(f"Run: python consolidate_memories.py (or batch_consolidate_memories.py for everyone)")
     else:
         print("Memory discarded")
 
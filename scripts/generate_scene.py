@@ -1,50 +1,48 @@
 import os
-import requests
+import llm_client
+import file_cache
+import story_log
+import story_summary
+import encyclopedia_index
+import memory_retrieval
+import character_registry
+import prompt_templates
 from backup_utils import backup_file
 
-CHARACTER_FOLDER = "characters"
-WORLD_FOLDER = "world"
-STORY_FILE = "data/story_recent.txt"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 
-API_URL = "http://127.0.0.1:5000/v1/chat/completions"
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")
+WORLD_FOLDER = os.path.join(PROJECT_ROOT, "world")
+STORY_FILE = os.path.join(PROJECT_ROOT, "story", "story_recent.txt")
+# How many of the latest committed scenes go into RECENT STORY
+RECENT_SCENES = 5
+# Older scenes are covered by rolling summaries (STORY SO FAR), at most this many tokens
+STORY_SUMMARY_TOKENS = 800
+# How many encyclopedia entries (the most relevant ones) go into the prompt
+LORE_ENTRIES = 6
+# Per-character token allowance for each memory file; bigger files keep only their most relevant entries
+MEMORY_TOKENS = 600
 
-def load_file(filepath):
-    if os.path.exists(filepath):
-        with open(filepath, "r", encoding='utf-8') as file:
-            return file.read()
-    return ""
+# Print tokens as they arrive instead of waiting for the whole response
+STREAM_OUTPUT = True
 
-def get_ai_response(context, retries=3):
-    retry_count = 0
-    while retry_count < retries:
-        try:
-            print(f"Attempting API Call (Try {retry_count + 1}/{retries})...")
-            
-            payload = {
-                "mode": "instruct",
-                "messages": [{"role": "user", "content": context}],
-                "max_tokens": 800,
-                "temperature": 0.8,
-                "top_p": 0.9
-            }
-            
-            response = requests.post(API_URL, json=payload, timeout=120)
-            
-            if response.status_code == 200:
-                return response.json()['choices'][0]['message']['content'].strip()
-            else:
-                print(f"API Error: Status Code {response.status_code}")
-        except Exception as e:
-            print(f"Error: {e}")
-        
-        retry_count += 1
-        if retry_count < retries:
-            retry = input("Retry failed API call? (yes/no): ").strip().lower()
-            if retry != "yes":
-                return None
-        else:
-            print("Maximum retries reached.")
-            return None
+def load_file(filepath):
+    return file_cache.load_file(filepath, "")
+
+def get_ai_response(context, retries=3, stream=STREAM_OUTPUT):
+    # Not cached: running the script again for a rejected scene should get a new one
+    if not stream:
+        return llm_client.chat(context, max_tokens=800, temperature=0.8, retries=retries,
+                               meta={"operation": "scene"}, cache=False)
+
+    print("\n=== AI RESPONSE ===")
+    text, stats = llm_client.chat_stream(context, on_token=llm_client.print_token,
+                                         max_tokens=800, temperature=0.8, retries=retries,
+                                         meta={"operation": "scene"}, cache=False)
+    print("\n===================")
+    print(f"[{llm_client.format_stream_stats(stats)}]\n")
+    return text
 
 def generate_scene():
     npcs = input("Enter characters (NPCs) for this scene, separated by commas: ").split(",")
@@ -60,53 +58,52 @@ def generate_scene():
 
     style_guide = load_file(f"{WORLD_FOLDER}/style_guide.txt")
     world_state = load_file(f"{WORLD_FOLDER}/world_state.txt")
-    world_encyclopedic = load_file(f"{WORLD_FOLDER}/world_encyclopedic.txt")
-    story_recent = load_file(STORY_FILE)
+    story_so_far, story_recent = story_summary.story_context(STORY_FILE, RECENT_SCENES, STORY_SUMMARY_TOKENS)
+
+    # Only the encyclopedia entries and memories that matter for this cast and passage
+    scene_query = " ".join(npcs + [protagonist_passage, story_log.recent_text(STORY_FILE, 1)])
+    world_encyclopedic, _, lore_stats = encyclopedia_index.relevant_entries(
+        f"{WORLD_FOLDER}/world_encyclopedic.txt", scene_query, LORE_ENTRIES)
+    if lore_stats:
+        print(f"[{encyclopedia_index.format_stats(lore_stats)}]")
 
     npc_memories = []
+    npcs = [npc.strip() for npc in npcs]
+    cast, _ = character_registry.load_cast(CHARACTER_FOLDER, npcs)
     for npc in npcs:
-        npc = npc.strip().lower().replace(" ", "_")
-        background = load_file(f"{CHARACTER_FOLDER}/character_{npc}_background.txt")
-        shortterm = load_file(f"{CHARACTER_FOLDER}/character_{npc}_shortterm.txt")
-        longterm = load_file(f"{CHARACTER_FOLDER}/character_{npc}_longterm.txt")
-        if background or shortterm or longterm:
-            npc_memories.append(f"NPC [{npc}]:\n{background}\n{shortterm}\n{longterm}")
+        data = cast.get(npc)
+        if not data:
+            print(f"Warning: No memory files found for NPC '{npc}'. Skipping...")
+            continue
+        shortterm, _, _ = memory_retrieval.select_memories(data['shortterm'], scene_query, MEMORY_TOKENS)
+        longterm, _, _ = memory_retrieval.select_memories(data['longterm'], scene_query, MEMORY_TOKENS)
+        if data['background'] or shortterm or longterm:
+            npc_memories.append(f"NPC [{data['key']}]:\n{data['background']}\n{shortterm}\n{longterm}")
         else:
             print(f"Warning: No memory files found for NPC '{npc}'. Skipping...")
 
-    context = f"""{style_guide}
-
-WORLD ENCYCLOPEDIA:
-{world_encyclopedic}
-
-CURRENT WORLD STATE:
-{world_state}
-
-ACTIVE CHARACTERS IN THIS SCENE:
-{chr(10).join(npc_memories)}
-
-RECENT STORY:
-{story_recent}
-
-CURRENT SCENE:
-{protagonist_passage}
-
-Continue the scene. How do the other characters react?"""
+    context = prompt_templates.render("scene", style_guide=style_guide, world_encyclopedic=world_encyclopedic,
+                                      world_state=world_state, characters="\n".join(npc_memories),
+                                      story_so_far=story_so_far, story_recent=story_recent,
+                                      passage=protagonist_passage)
 
     ai_response = get_ai_response(context)
     if ai_response:
-        print("\n=== AI RESPONSE ===")
-        print(ai_response)
-        print("===================\n")
+        if not STREAM_OUTPUT:
+            print("\n=== AI RESPONSE ===")
+            print(ai_response)
+            print("===================\n")
 
         approve = input("Add to story? (y/n): ").strip().lower()
         if approve == "y":
             # Backup before saving
             backup_file(STORY_FILE)
             
-            with open(STORY_FILE, "a", encoding='utf-8') as story:
-                story.write(f"\n\n{protagonist_passage}\n\n{ai_response}")
+            story_log.append_scene(STORY_FILE, f"{protagonist_passage}\n\n{ai_response}")
+            summary = story_summary.update_in_background(STORY_FILE)
             print("\nSaved to story.")
+            print("Summarizing the scene for STORY SO FAR before exiting...")
+            summary.join()
         else:
             print("Response rejected.")
 
@@ -1,10 +1,19 @@
 import os
-import requests
+import llm_client
+import file_cache
+import story_log
+import context_builder
+import encyclopedia_index
+import memory_retrieval
+import story_summary
+import metrics_log
+import speculative
+import memory_store
+import memory_queue
+import character_registry
+import prompt_templates
 from backup_utils import backup_file
 
-# Configuration
-API_URL = "http://127.0.0.1:5000/v1/chat/completions"
-
 # Get script directory and project root
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
@@ -14,32 +23,131 @@ CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")
 WORLD_FOLDER = os.path.join(PROJECT_ROOT, "world")
 STORY_FOLDER = os.path.join(PROJECT_ROOT, "story")
 STORY_FILE = os.path.join(STORY_FOLDER, "story_recent.txt")
+ENCYCLOPEDIA_FILE = os.path.join(WORLD_FOLDER, "world_encyclopedic.txt")
+# How many of the latest committed scenes go into RECENT STORY (before the token budget trims it)
+RECENT_SCENES = 5
+# Everything older is covered by the rolling summaries in STORY SO FAR, at most this many tokens
+STORY_SUMMARY_TOKENS = 800
+
+# Print tokens as they arrive instead of waiting for the whole response
+STREAM_OUTPUT = True
+# Generate memories for the scene's NPCs as soon as it's committed (held for review)
+BACKGROUND_MEMORIES = True
+# Spare responses generated in the background so "Fresh regeneration" is instant.
+# Off by default: each spare is another full generation after every paragraph, and on a
+# backend that serves one request at a time the writer's next request queues behind them.
+# Set this to 2 (or STORY_SPECULATIVE=2) when the backend has slots to spare.
+SPECULATIVE_CANDIDATES = int(os.environ.get("STORY_SPECULATIVE", "0"))
+
+# Prompt size limit in tokens - leave room for the response inside the model's context window
+CONTEXT_BUDGET = 7000
+# Most the static part (style guide, backgrounds, long-term memory) may use
+STATIC_BUDGET = 4000
+# Kept free for the scene draft and latest action when sizing the per-scene sections
+TURN_RESERVE = 1500
+# Kept for a regeneration instruction on every turn, used or not, so asking for one never
+# re-trims the scene so far (longer instructions are cut to fit)
+REGEN_RESERVE = 200
+
+# Encyclopedia entries picked for the whole scene, and extra ones picked per paragraph
+SCENE_LORE_ENTRIES = 6
+TURN_LORE_ENTRIES = 2
+
+# Per-character token allowance for memories; bigger files keep only their most relevant entries
+SHORTTERM_TOKENS = 600
+LONGTERM_TOKENS = 600
+
+# Time to first token / tokens per second for every streamed call this session
+generation_stats = []
+# Background candidates for the current paragraph (created on first use)
+candidates = None
+# Memory and summary threads started by committed scenes; main() waits for them before exiting
+background_jobs = []
 
 def load_file(filepath):
     """Load text file, return content or empty string"""
-    if os.path.exists(filepath):
-        with open(filepath, "r", encoding='utf-8') as f:
-            return f.read()
-    return ""
-
-def get_ai_response(context, max_tokens=800):
-    """Call Oobabooga API using chat completions format"""
-    payload = {
-        "mode": "instruct",
-        "messages": [{"role": "user", "content": context}],
-        "max_tokens": max_tokens,
-        "temperature": 0.5,  # Lowered to reduce hallucination
-        "top_p": 0.9
-    }
-    
-    try:
-        response = requests.post(API_URL, json=payload, timeout=120)
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content'].strip()
-    except requests.exceptions.RequestException as e:
-        print(f"API Error: {e}")
-        return None
+    return file_cache.load_file(filepath, "")
+
+def get_ai_response(context, max_tokens=800, stream=STREAM_OUTPUT, meta=None, cache=True):
+    """Call Oobabooga API using chat completions format (cache=False for a new sample of the same prompt)"""
+    # Temperature lowered to reduce hallucination
+    if not stream:
+        return llm_client.chat(context, max_tokens=max_tokens, temperature=0.5, meta=meta, cache=cache)
+
+    print("\n" + "="*60)
+    print("AI RESPONSE:")
+    print("="*60)
+    text, stats = llm_client.chat_stream(context, on_token=llm_client.print_token,
+                                         max_tokens=max_tokens, temperature=0.5, meta=meta, cache=cache)
+    print("\n" + "="*60)
+    print(f"[{llm_client.format_stream_stats(stats)}]")
+    if text:
+        generation_stats.append(stats)
+    return text
+
+def generate_candidate(prompt, cancel_event):
+    """One spare response, generated quietly; stops as soon as cancel_event is set"""
+    text, _ = llm_client.chat_stream(prompt, on_token=speculative.stop_on(cancel_event), max_tokens=800,
+                                     temperature=0.5, meta={"operation": "speculative"}, cache=False)
+    return text
+
+def get_candidates():
+    global candidates
+    if candidates is None and SPECULATIVE_CANDIDATES > 0:
+        candidates = speculative.CandidatePool(generate_candidate, SPECULATIVE_CANDIDATES)
+    return candidates
+
+def cancel_candidates():
+    if candidates:
+        candidates.cancel()
+
+def close_candidates():
+    """Stop the spares and their worker threads once the scene is over"""
+    global candidates
+    if candidates:
+        candidates.close()
+        summary = candidates.summary()
+        if summary:
+            print(summary)
+        candidates = None
+
+def show_candidate(text, waited):
+    """Print a spare response the way a streamed one would have appeared"""
+    print("\n" + "="*60)
+    print("AI RESPONSE:")
+    print("="*60)
+    print(text)
+    print("="*60)
+    note = "ready" if waited < 0.05 else f"waited {waited:.1f}s"
+    print(f"[background candidate, {note}]")
+
+def running_jobs():
+    return [thread for thread in background_jobs if thread.is_alive()]
+
+def wait_for_background_jobs():
+    """Let memory and summary jobs from committed scenes finish before the program exits"""
+    running = running_jobs()
+    if running:
+        print(f"\nWaiting for {len(running)} background jobs (memories, story summary) to finish...")
+    for thread in running:
+        thread.join()
+    background_jobs.clear()
+
+def call_metrics(operation, report, npc_data):
+    """metrics_log fields for one generation: what kind it was and tokens per prompt section"""
+    names = {data['name'] for data in npc_data.values()}
+    sections = {(f"{name} name" if name in names else name): used for name, used, _ in report if used}
+    return {"operation": operation, "sections": sections}
+
+def print_generation_summary():
+    """Average streaming figures for this session"""
+    if not generation_stats:
+        return
+    ttfts = [s['ttft'] for s in generation_stats if s['ttft'] is not None]
+    avg_ttft = sum(ttfts) / len(ttfts) if ttfts else 0.0
+    avg_tps = sum(s['tokens_per_sec'] for s in generation_stats) / len(generation_stats)
+    print(f"\nGenerations: {len(generation_stats)}, avg first token {avg_ttft:.2f}s, avg {avg_tps:.1f} tok/s")
+
 
 def get_protagonist_input():
     """Get protagonist paragraph from user"""
@@ -71,8 +179,171 @@ def show_regen_menu():
     print("[d] Remind of detail - inject forgotten context/fact")
     return input("Choose: ").strip().lower()
 
+CRITICAL_INSTRUCTION = "CRITICAL INSTRUCTION: You may ONLY write for characters explicitly listed in ACTIVE CHARACTERS above. Do NOT write for any other characters. Do NOT introduce new characters. If a character is not in the ACTIVE CHARACTERS list, they do NOT exist in this scene and you must NOT mention them."
+REGEN_INSTRUCTIONS = {
+    "major": "MAJOR CHANGE REQUIRED: {text}",
+    "minor": "MINOR ADJUSTMENT NEEDED: {text}",
+    "detail": "CRITICAL FACT YOU MUST RESPECT: {text}\n\nThis fact OVERRIDES any assumptions. Characters must act according to their established traits and background.",
+}
+CLOSING_INSTRUCTION = "Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other characters exist in this scene."
+
+# The prompt is laid out from least to most volatile so the backend can reuse its cached prefix:
+#   static (same across scenes): style guide, backgrounds, long-term memory
+#   scene  (same for every turn of a scene): encyclopedia entries, world state, short-term memory, recent story
+#   turn   (changes every paragraph): extra encyclopedia entries, scene so far, latest action, instructions
+#   regeneration instructions are only ever appended at the very end
+def build_static_sections(style_guide, npc_data):
+    """Sections that only change between sessions - always emitted in the same order"""
+    make = context_builder.make_section
+    sections = [
+        make("style guide", style_guide, 1, keep="start"),
+        make("active characters", "ACTIVE CHARACTERS IN THIS SCENE (ONLY WRITE FOR THESE):", 0, keep=None),
+    ]
+    # Sort so the same cast always produces the same bytes, whatever order it was typed in
+    npcs = [npc_data[key] for key in sorted(npc_data)]
+    for data in npcs:
+        name = data['name']
+        sections += [
+            make(name, f"CHARACTER [{name.upper()}]:", 0, keep=None),
+            make(f"{name} background", data['background'], 2, header="BACKGROUND:", keep="start"),
+        ]
+    for data in npcs:
+        # Newest memories sit at the bottom of the files, so keep the end
+        sections.append(make(f"{data['name']} long-term", data['longterm'], 3,
+                             header=f"LONG-TERM MEMORY [{data['name'].upper()}]:"))
+    return sections
+
+def build_scene_sections(lore, world_state, npc_data, story_recent, story_so_far=""):
+    """Sections that change between scenes but not between turns"""
+    make = context_builder.make_section
+    sections = [
+        make("world encyclopedia", lore, 2, header="WORLD ENCYCLOPEDIA:", keep="start"),
+        make("world state", world_state, 1, header="CURRENT WORLD STATE:", keep="start"),
+    ]
+    for key in sorted(npc_data):
+        data = npc_data[key]
+        sections.append(make(f"{data['name']} short-term", data['shortterm'], 2,
+                             header=f"SHORT-TERM MEMORY [{data['name'].upper()}]:"))
+    # Older story is the first thing to go
+    sections.append(make("story so far", story_so_far, 3, header="STORY SO FAR:"))
+    sections.append(make("recent story", story_recent, 3, header="RECENT STORY:"))
+    return sections
+
+def build_turn_sections(current_draft, protag_paragraph, extra_lore=""):
+    """Sections that change every paragraph"""
+    make = context_builder.make_section
+    return [
+        make("more encyclopedia", extra_lore, 2, header="MORE FROM THE WORLD ENCYCLOPEDIA:", keep="start"),
+        make("scene so far", current_draft, 1, header="CURRENT SCENE SO FAR:"),
+        make("instruction", CRITICAL_INSTRUCTION, 0, keep=None),
+        make("latest action", protag_paragraph, 0, header="LATEST ACTION:"),
+        make("closing instruction", CLOSING_INSTRUCTION, 0, keep=None),
+    ]
+
+def select_lore(npc_data, query_text, k, exclude=()):
+    """
+    Encyclopedia entries relevant to the cast and query_text.
+    Returns (text, entry numbers) and prints the index timing / tokens saved.
+    """
+    query = " ".join([data['name'] for data in npc_data.values()] + [query_text])
+    text, hits, stats = encyclopedia_index.relevant_entries(ENCYCLOPEDIA_FILE, query, k, exclude)
+    if stats:
+        print(f"[{encyclopedia_index.format_stats(stats)}]")
+    return text, hits
+
+def select_npc_memories(npc_data, query_text):
+    """Copy of npc_data with each memory file cut down to the entries relevant to query_text"""
+    query = " ".join([data['name'] for data in npc_data.values()] + [query_text])
+    selected = {}
+    for key, data in npc_data.items():
+        shortterm, st_kept, st_total = memory_retrieval.select_memories(data['shortterm'], query, SHORTTERM_TOKENS)
+        longterm, lt_kept, lt_total = memory_retrieval.select_memories(data['longterm'], query, LONGTERM_TOKENS)
+        cut = []
+        if st_kept is not None:
+            cut.append(f"short-term {st_kept}/{st_total}")
+        if lt_kept is not None:
+            cut.append(f"long-term {lt_kept}/{lt_total}")
+        if cut:
+            print(f"[{data['name']}: {', '.join(cut)} memories selected]")
+        selected[key] = dict(data, shortterm=shortterm, longterm=longterm)
+    return selected
+
+def prepare_scene_context(style_guide, lore, world_state, npc_data, story_recent, story_so_far=""):
+    """
+    Assemble the static and per-scene parts once at the start of a scene.
+    Their sizes are fixed here so later turns can't shift them and break the cached prefix.
+    """
+    # The static part is reused as-is by later scenes with the same cast until one of its inputs changes
+    cast = tuple(sorted(npc_data))
+    inputs = (STATIC_BUDGET, style_guide) + tuple(
+        (npc_data[key]['name'], npc_data[key]['background'], npc_data[key]['longterm']) for key in cast)
+    static_text, static_report = prompt_templates.section(
+        ("static",) + cast, inputs,
+        lambda: context_builder.assemble(build_static_sections(style_guide, npc_data), STATIC_BUDGET))
+    static_tokens = context_builder.count_tokens(static_text)
+
+    scene_budget = max(0, CONTEXT_BUDGET - static_tokens - TURN_RESERVE)
+    scene_text, scene_report = context_builder.assemble(
+        build_scene_sections(lore, world_state, npc_data, story_recent, story_so_far), scene_budget)
+
+    prefix = "\n\n".join(part for part in (static_text, scene_text) if part)
+    return {
+        'prefix': prefix,
+        'tokens': context_builder.count_tokens(prefix),
+        'report': static_report + scene_report,
+    }
+
+def load_npc_data(npcs):
+    """{key: {name, background, shortterm, longterm}} for every NPC that has files (names or aliases)"""
+    cast, _ = character_registry.load_cast(CHARACTER_FOLDER, npcs)
+    npc_data = {}
+    for npc in npcs:
+        data = cast.get(npc)
+        if not data or not (data['background'] or data['shortterm'] or data['longterm']):
+            print(f"Warning: No files found for '{npc}' - skipping")
+            continue
+        npc_data[data['key']] = {
+            'name': npc,
+            'background': data['background'],
+            'shortterm': data['shortterm'],
+            'longterm': data['longterm']
+        }
+    return npc_data
+
+def regen_instruction(kind, text):
+    """The instruction appended for a steered regeneration ("major", "minor" or "detail")"""
+    return REGEN_INSTRUCTIONS[kind].format(text=text)
+
+def build_prompt(scene_context, current_draft, protag_paragraph, additional_instruction="", extra_lore=""):
+    """Scene prefix + budgeted turn sections + optional regeneration suffix"""
+    # The turn's budget doesn't depend on the instruction, so a regeneration only adds a suffix
+    turn_budget = CONTEXT_BUDGET - scene_context['tokens'] - REGEN_RESERVE
+    turn_text, turn_report = context_builder.assemble(
+        build_turn_sections(current_draft, protag_paragraph, extra_lore), turn_budget)
+    additional_instruction = context_builder.trim_to_tokens(additional_instruction, REGEN_RESERVE, keep="start")
+
+    prompt = f"{scene_context['prefix']}\n\n{turn_text}"
+    if additional_instruction:
+        prompt += f"\n\n{additional_instruction}"
+    report = scene_context['report'] + turn_report
+    report.append(("regeneration", context_builder.count_tokens(additional_instruction),
+                   context_builder.count_tokens(additional_instruction)))
+    return prompt, report
+
 def interactive_scene():
-    """Main interactive scene writing loop"""
+    """Main interactive scene writing loop. Returns True if the scene was committed."""
+    
+    # Memories generated after the last scene wait here until they're approved
+    running = running_jobs()
+    if running:
+        print(f"({len(running)} background jobs from the last scene are still running; "
+              f"memories they finish later are reviewed at the next scene.)")
+    pending = memory_store.pending_entries(CHARACTER_FOLDER)
+    if pending:
+        print(f"{len(pending)} memories from earlier scenes are waiting for review.")
+        if input("Review them now? (y/N): ").strip().lower() == "y":
+            memory_queue.review(CHARACTER_FOLDER, pending)
+        print()
     
     # Get NPCs for this scene
     npcs_input = input("Characters in this scene (comma-separated): ").strip()
@@ -82,31 +353,18 @@ def interactive_scene():
     print("\nLoading context...")
     style_guide = load_file(os.path.join(PROJECT_ROOT, "prompts", "style_guide.txt"))
     world_state = load_file(os.path.join(PROJECT_ROOT, "world", "world_state.txt"))
-    world_encyclopedic = load_file(os.path.join(PROJECT_ROOT, "world", "world_encyclopedic.txt"))
-    story_recent = load_file(STORY_FILE)
+    story_so_far, story_recent = story_summary.story_context(STORY_FILE, RECENT_SCENES, STORY_SUMMARY_TOKENS)
     
     # Load NPC data
-    npc_data = {}
-    for npc in npcs:
-        npc_clean = npc.lower().replace(" ", "_")
-        background = load_file(f"{CHARACTER_FOLDER}/character_{npc_clean}_background.txt")
-        shortterm = load_file(f"{CHARACTER_FOLDER}/character_{npc_clean}_shortterm.txt")
-        longterm = load_file(f"{CHARACTER_FOLDER}/character_{npc_clean}_longterm.txt")
-        
-        if not background and not shortterm and not longterm:
-            print(f"Warning: No files found for '{npc}' - skipping")
-            continue
-            
-        npc_data[npc_clean] = {
-            'name': npc,
-            'background': background,
-            'shortterm': shortterm,
-            'longterm': longterm
-        }
+    npc_data = load_npc_data(npcs)
     
     if not npc_data:
         print("Error: No valid NPCs loaded. Exiting.")
-        return
+        return False
+    
+    # Static and per-scene context is built once (after the first paragraph) so every turn shares the same prefix
+    scene_context = None
+    scene_lore_hits = []
     
     # Scene draft accumulator
     scene_draft = []
@@ -122,91 +380,75 @@ def interactive_scene():
             print("Empty input. Ending scene.")
             break
         
-        # Build base context for AI
-        npc_context_parts = []
-        for npc_key, data in npc_data.items():
-            npc_section = f"CHARACTER [{data['name'].upper()}]:\n"
-            if data['background']:
-                npc_section += f"BACKGROUND:\n{data['background']}\n\n"
-            if data['shortterm']:
-                npc_section += f"SHORT-TERM MEMORY:\n{data['shortterm']}\n\n"
-            if data['longterm']:
-                npc_section += f"LONG-TERM MEMORY:\n{data['longterm']}\n"
-            npc_context_parts.append(npc_section)
-        
-        npc_context = "\n".join(npc_context_parts)
         current_draft = "\n\n".join(scene_draft)
         
-        base_context = f"""CRITICAL INSTRUCTION: You may ONLY write for characters explicitly listed in ACTIVE CHARACTERS below. Do NOT write for any other characters. Do NOT introduce new characters. If a character is not in the ACTIVE CHARACTERS list, they do NOT exist in this scene and you must NOT mention them.
-
-{style_guide}
-
-WORLD ENCYCLOPEDIA:
-{world_encyclopedic}
-
-CURRENT WORLD STATE:
-{world_state}
-
-ACTIVE CHARACTERS IN THIS SCENE (ONLY WRITE FOR THESE):
-{npc_context}
-
-RECENT STORY:
-{story_recent}
-
-CURRENT SCENE SO FAR:
-{current_draft}
-
-LATEST ACTION:
-{protag_paragraph}
-
-Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other characters exist in this scene."""
+        if scene_context is None:
+            scene_query = f"{protag_paragraph}\n{story_log.recent_text(STORY_FILE, 1)}"
+            lore, scene_lore_hits = select_lore(npc_data, scene_query, SCENE_LORE_ENTRIES)
+            scene_npcs = select_npc_memories(npc_data, scene_query)
+            scene_context = prepare_scene_context(style_guide, lore, world_state, scene_npcs,
+                                                  story_recent, story_so_far)
+            extra_lore = ""
+        else:
+            # Entries the scene-level pick missed that this paragraph brings up
+            extra_lore, _ = select_lore(npc_data, f"{protag_paragraph}\n{current_draft[-2000:]}",
+                                        TURN_LORE_ENTRIES, exclude=scene_lore_hits)
         
         # AI generation loop with regeneration options
         additional_instruction = ""
+        operation = "paragraph"
         
         while True:
-            # Build full context with any additional instructions
-            full_context = base_context
-            if additional_instruction:
-                full_context += f"\n\n{additional_instruction}"
-            
-            # DEBUG: Show what's being loaded
-            print("\n=== CONTEXT DEBUG ===")
-            print(f"NPCs loaded: {', '.join([data['name'] for data in npc_data.values()])}")
-            for npc_key, data in npc_data.items():
-                bg_lines = len([l for l in data['background'].split('\n') if l.strip()]) if data['background'] else 0
-                st_lines = len([l for l in data['shortterm'].split('\n') if l.strip()]) if data['shortterm'] else 0
-                lt_lines = len([l for l in data['longterm'].split('\n') if l.strip()]) if data['longterm'] else 0
-                print(f"  {data['name']}: BG={bg_lines} lines, ST={st_lines} entries, LT={lt_lines} entries")
+            # Fit everything (plus any regeneration instruction) into the token budget
+            full_context, report = build_prompt(scene_context, current_draft, protag_paragraph,
+                                                additional_instruction, extra_lore)
+            context_builder.print_report(report, CONTEXT_BUDGET)
             
-            draft_paragraphs = len(scene_draft)
-            print(f"Scene draft: {draft_paragraphs} paragraphs")
-            print(f"Style guide: {'loaded' if style_guide else 'MISSING'}")
-            print(f"World state: {'loaded' if world_state else 'MISSING'}")
-            print("====================\n")
+            # A fresh regeneration takes a spare that's been generating in the background
+            ai_response = None
+            pool = get_candidates()
+            if operation == "regen:fresh" and pool:
+                ai_response, waited = pool.take(full_context)
+                if ai_response:
+                    show_candidate(ai_response, waited)
+                    metrics_log.record(dict(call_metrics(operation, report, npc_data), outcome="candidate",
+                                            latency=round(waited, 4),
+                                            prompt_tokens=context_builder.count_tokens(full_context)))
             
-            # Generate AI response
-            print("Generating AI response...")
-            ai_response = get_ai_response(full_context)
+            if not ai_response:
+                if pool and additional_instruction:
+                    pool.cancel()   # spares are for the plain prompt, not this one
+                # Generate AI response
+                print("Generating AI response...")
+                # Never the cached reply: the same prompt again means the writer wants another take
+                ai_response = get_ai_response(full_context, meta=call_metrics(operation, report, npc_data),
+                                              cache=False)
+                # Spares only start once this reply is done, so a backend that serves one
+                # request at a time never makes the writer wait behind them
+                if ai_response and pool and not additional_instruction:
+                    pool.start(full_context)
             
             if not ai_response:
                 print("Generation failed. Try again.")
                 retry = input("Retry? (y/n): ").strip().lower()
                 if retry != 'y':
                     break
+                operation = "retry"
                 continue
             
-            # Show response
-            print("\n" + "="*60)
-            print("AI RESPONSE:")
-            print("="*60)
-            print(ai_response)
-            print("="*60)
+            # Show response (already on screen if it was streamed)
+            if not STREAM_OUTPUT:
+                print("\n" + "="*60)
+                print("AI RESPONSE:")
+                print("="*60)
+                print(ai_response)
+                print("="*60)
             
             # Get user choice
             choice = show_main_menu()
             
             if choice == "1":  # Accept
+                cancel_candidates()
                 scene_draft.append(protag_paragraph)
                 scene_draft.append(ai_response)
                 print("\n✓ Added to scene draft.")
@@ -215,6 +457,10 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
             elif choice == "2":  # Regenerate
                 regen_choice = show_regen_menu()
                 
+                # Logged per menu option, even when an empty answer falls back to a fresh regeneration
+                operation = {"a": "regen:fresh", "b": "regen:major", "c": "regen:minor",
+                             "d": "regen:detail"}.get(regen_choice, "regen:fresh")
+                
                 if regen_choice == "a":  # Fresh
                     print("\nRegenerating fresh response...")
                     additional_instruction = ""
@@ -223,7 +469,7 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                 elif regen_choice == "b":  # Major redirect
                     redirect = input("\nDescribe major change needed: ").strip()
                     if redirect:
-                        additional_instruction = f"MAJOR CHANGE REQUIRED: {redirect}"
+                        additional_instruction = regen_instruction("major", redirect)
                         print("\nRegenerating with major redirect...")
                         continue
                     else:
@@ -234,7 +480,7 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                 elif regen_choice == "c":  # Minor adjustment
                     adjustment = input("\nDescribe minor adjustment: ").strip()
                     if adjustment:
-                        additional_instruction = f"MINOR ADJUSTMENT NEEDED: {adjustment}"
+                        additional_instruction = regen_instruction("minor", adjustment)
                         print("\nRegenerating with adjustment...")
                         continue
                     else:
@@ -245,7 +491,7 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                 elif regen_choice == "d":  # Remind of detail
                     reminder = input("\nWhat detail should AI remember?: ").strip()
                     if reminder:
-                        additional_instruction = f"CRITICAL FACT YOU MUST RESPECT: {reminder}\n\nThis fact OVERRIDES any assumptions. Characters must act according to their established traits and background."
+                        additional_instruction = regen_instruction("detail", reminder)
                         print("\nRegenerating with reminder...")
                         continue
                     else:
@@ -268,6 +514,7 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                     edited_lines.append(line)
                 
                 if edited_lines:
+                    cancel_candidates()
                     ai_response = "\n".join(edited_lines)
                     scene_draft.append(protag_paragraph)
                     scene_draft.append(ai_response)
@@ -278,6 +525,7 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                     continue
             
             elif choice == "4":  # Commit scene
+                close_candidates()
                 scene_draft.append(protag_paragraph)
                 scene_draft.append(ai_response)
                 
@@ -294,12 +542,23 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
                 if confirm == 'y':
                     backup_file(STORY_FILE)
                     
-                    with open(STORY_FILE, "a", encoding="utf-8") as f:
-                        f.write(f"\n\n{final_scene}")
+                    story_log.append_scene(STORY_FILE, final_scene)
+                    # Summarize it for STORY SO FAR while the writer starts the next scene
+                    background_jobs.append(story_summary.update_in_background(STORY_FILE))
                     
                     print(f"\n✓ Scene committed to {STORY_FILE}")
-                    print("\nREMINDER: Run batch_generate_memories.py to update character memories.")
-                    return
+                    if BACKGROUND_MEMORIES:
+                        characters = [(key, data['name'], data['background'])
+                                      for key, data in npc_data.items() if data['background']]
+                        background_jobs.append(
+                            memory_queue.enqueue_scene(CHARACTER_FOLDER, final_scene, characters))
+                        print(f"\nGenerating memories for {', '.join(name for _, name, _ in characters)} "
+                              f"while you start the next scene.")
+                        print("They'll be waiting for review at the start of a later scene "
+                              "(or run memory_queue.py).")
+                    else:
+                        print("\nREMINDER: Run batch_generate_memories.py to update character memories.")
+                    return True
                 else:
                     print("Commit cancelled. Returning to options...")
                     continue
@@ -313,12 +572,21 @@ Write ONLY the reactions of characters listed in ACTIVE CHARACTERS. No other cha
         if continue_writing != 'y':
             print("\nScene incomplete. Progress not saved.")
             break
+    return False
 
 def main():
     print("="*60)
     print("INTERACTIVE SCENE WRITER")
     print("="*60)
-    interactive_scene()
+    # Keep going in this process so memories and summaries of a committed scene
+    # are generated while the next one is being written
+    while interactive_scene():
+        if input("\nStart the next scene? (y/n): ").strip().lower() != "y":
+            break
+        print()
+    close_candidates()
+    wait_for_background_jobs()
+    print_generation_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,376 @@
+import json
+import time
+import random
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import metrics_log
+import endpoint_pool
+import response_cache
+from context_builder import count_tokens
+
+# Config - change API_BASE if your oobabooga uses a different host/port
+# (several backends: list them in STORY_API_BASES or endpoints.json, see endpoint_pool.py)
+API_BASE = "http://127.0.0.1:5000"
+COMPLETIONS_PATH = "/v1/completions"
+CHAT_PATH = "/v1/chat/completions"
+
+TIMEOUT = 120          # seconds per attempt
+MAX_RETRIES = 3        # total attempts per call
+BACKOFF_BASE = 1.0     # first retry waits up to this many seconds, doubling after
+BACKOFF_MAX = 20.0     # never wait longer than this between attempts
+POOL_SIZE = 16         # keep-alive connections kept open to the backend
+
+# Status codes worth retrying; anything else (bad payload etc.) fails straight away
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_pool = None
+_pool_urls = None        # None = a single backend that follows API_BASE
+_pool_lock = threading.Lock()
+
+class Cancelled(Exception):
+    """Raised from an on_token callback to abandon a stream (the connection is closed)"""
+
+def get_session():
+    """Return the shared keep-alive session, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def set_endpoints(urls):
+    """Spread calls across these base URLs from now on"""
+    global _pool, _pool_urls
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool_urls = [url.rstrip("/") for url in urls]
+        _pool = endpoint_pool.EndpointPool(_pool_urls)
+
+def get_pool():
+    """The endpoint pool, built from the configured endpoints (or API_BASE) on first use"""
+    global _pool, _pool_urls
+    with _pool_lock:
+        if _pool is None:
+            _pool_urls = endpoint_pool.configured_endpoints() or None
+            _pool = endpoint_pool.EndpointPool(_pool_urls or [API_BASE])
+        elif _pool_urls is None and _pool.endpoints[0].url != API_BASE:
+            # API_BASE was changed after the first call (the benchmarks do this)
+            _pool = endpoint_pool.EndpointPool([API_BASE])
+        return _pool
+
+def backend_id():
+    """The base URLs a call can be sent to; part of the response cache key"""
+    return " ".join(sorted(endpoint.url for endpoint in get_pool().endpoints))
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given (0-based) retry"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def prompt_text(payload):
+    return payload.get("prompt") or "\n".join(m.get("content", "") for m in payload.get("messages", []))
+
+def log_call(path, payload, meta, start, attempts, outcome, completion_tokens=None, ttft=None, backend=None):
+    """Write one metrics_log record for a finished call"""
+    prompt = prompt_text(payload)
+    entry = {
+        "operation": "call",
+        "endpoint": path,
+        "backend": backend,
+        "prompt_chars": len(prompt),
+        "prompt_tokens": count_tokens.__wrapped__(prompt),
+        "completion_tokens": completion_tokens,
+        "latency": round(time.perf_counter() - start, 4),
+        "ttft": round(ttft, 4) if ttft is not None else None,
+        "attempts": attempts,
+        "retries": max(0, attempts - 1),
+        "outcome": outcome,
+    }
+    entry.update(meta or {})
+    metrics_log.record(entry)
+
+def reply_tokens(result):
+    """completion_tokens from the usage block, or an estimate from the reply text"""
+    try:
+        return int(result["usage"]["completion_tokens"])
+    except (TypeError, KeyError, ValueError):
+        pass
+    try:
+        choice = result["choices"][0]
+        return count_tokens.__wrapped__(choice.get("text") or choice["message"]["content"])
+    except (TypeError, KeyError, IndexError):
+        return None
+
+def result_text(result):
+    """The generated text of a completions or chat response"""
+    choice = result['choices'][0]
+    return (choice['text'] if 'text' in choice else choice['message']['content']).strip()
+
+def as_result(payload, text, tokens):
+    """A streamed reply in the shape of a non-streamed response, for the cache"""
+    choice = {"message": {"role": "assistant", "content": text}} if "messages" in payload else {"text": text}
+    return {"choices": [dict(choice, index=0)], "usage": {"completion_tokens": tokens}}
+
+def post_json(path, payload, timeout=TIMEOUT, retries=MAX_RETRIES, meta=None, cache=True):
+    """
+    Like send_json(), but answered from response_cache when the same request was made before,
+    and sharing one backend call with any identical request already in flight.
+    cache=False always asks the backend (e.g. when a fresh sample is wanted).
+    """
+    if not (cache and response_cache.ENABLED):
+        return send_json(path, payload, timeout, retries, meta)
+    start = time.perf_counter()
+    key = response_cache.cache_key(path, payload, backend_id())
+    result = response_cache.get(key)
+    if result is not None:
+        log_call(path, payload, meta, start, 0, "cached", reply_tokens(result))
+        return result
+
+    result, leader = response_cache.coalesce(key, lambda: send_json(path, payload, timeout, retries, meta))
+    if leader and result is not None:
+        response_cache.put(key, path, result)
+    elif not leader:
+        log_call(path, payload, meta, start, 0, "coalesced", reply_tokens(result) if result else None)
+    return result
+
+def send_json(path, payload, timeout=TIMEOUT, retries=MAX_RETRIES, meta=None):
+    """
+    POST payload to the backend and return the decoded JSON.
+    Retries connection errors, timeouts and 429/5xx responses with backoff.
+    Returns None once every attempt has failed.
+    meta (e.g. {"operation": "memory"}) is added to the call's metrics record.
+    Each attempt goes to the least busy healthy endpoint, avoiding ones that already failed this call.
+    """
+    start = time.perf_counter()
+    failed = set()
+    for attempt in range(retries):
+        pool = get_pool()
+        endpoint = pool.acquire(exclude=failed)
+        attempt_start = time.perf_counter()
+        healthy = False
+        try:
+            response = get_session().post(endpoint.url + path, json=payload, timeout=timeout)
+            if response.status_code in RETRY_STATUS:
+                print(f"API Error: Status Code {response.status_code} (try {attempt + 1}/{retries})")
+            else:
+                # The backend answered; a bad request is our problem, not its
+                healthy = True
+                response.raise_for_status()
+                result = response.json()
+                log_call(path, payload, meta, start, attempt + 1, "ok", reply_tokens(result), backend=endpoint.url)
+                return result
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(f"API Error: {e} (try {attempt + 1}/{retries})")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Client errors and bad JSON won't get better by asking again
+            print(f"API Error: {e}")
+            log_call(path, payload, meta, start, attempt + 1, "error", backend=endpoint.url)
+            return None
+        finally:
+            pool.release(endpoint, healthy, time.perf_counter() - attempt_start)
+        failed.add(endpoint.url)
+
+        if attempt + 1 < retries:
+            time.sleep(backoff_delay(attempt))
+
+    print("Maximum retries reached.")
+    log_call(path, payload, meta, start, retries, "failed")
+    return None
+
+def completion_payload(prompt, max_tokens, temperature, top_p, stop):
+    """Request body for /v1/completions"""
+    return {
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": top_p,
+        "stop": stop if stop is not None else ["---END---"]
+    }
+
+def chat_payload(content, max_tokens, temperature, top_p, mode):
+    """Request body for /v1/chat/completions with a single user message"""
+    return {
+        "mode": mode,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": top_p
+    }
+
+def complete(prompt, max_tokens=400, temperature=0.7, top_p=0.9, stop=None,
+             timeout=TIMEOUT, retries=MAX_RETRIES, meta=None, cache=True):
+    """Call /v1/completions and return the generated text, or None on failure"""
+    payload = completion_payload(prompt, max_tokens, temperature, top_p, stop)
+    result = post_json(COMPLETIONS_PATH, payload, timeout=timeout, retries=retries, meta=meta, cache=cache)
+    try:
+        return result['choices'][0].get('text', '').strip()
+    except (TypeError, KeyError, IndexError):
+        if result is not None:
+            print("API Error: unexpected completions response")
+        return None
+
+def chat(content, max_tokens=800, temperature=0.7, top_p=0.9, mode="instruct",
+         timeout=TIMEOUT, retries=MAX_RETRIES, meta=None, cache=True):
+    """Call /v1/chat/completions with a single user message and return the reply, or None"""
+    payload = chat_payload(content, max_tokens, temperature, top_p, mode)
+    result = post_json(CHAT_PATH, payload, timeout=timeout, retries=retries, meta=meta, cache=cache)
+    try:
+        return result['choices'][0]['message']['content'].strip()
+    except (TypeError, KeyError, IndexError):
+        if result is not None:
+            print("API Error: unexpected chat response")
+        return None
+
+def stream_post(path, payload, extract, on_token=None, timeout=TIMEOUT, retries=MAX_RETRIES, meta=None,
+                cache=True):
+    """
+    Like send_stream(), but a cached (or coalesced) reply is passed to on_token in one piece.
+    cache=False always asks the backend.
+    """
+    if not (cache and response_cache.ENABLED):
+        return send_stream(path, payload, extract, on_token, timeout, retries, meta)
+    start = time.perf_counter()
+    key = response_cache.cache_key(path, payload, backend_id())
+    result = response_cache.get(key)
+    outcome = "cached"
+    if result is None:
+        (text, stats), leader = response_cache.coalesce(
+            key, lambda: send_stream(path, payload, extract, on_token, timeout, retries, meta))
+        if leader:
+            if text is not None:
+                response_cache.put(key, path, as_result(payload, text, stats["tokens"]))
+            return text, stats
+        if text is None:
+            return None, stats
+        result = as_result(payload, text, stats["tokens"])
+        outcome = "coalesced"
+
+    text = result_text(result)
+    if on_token:
+        on_token(text)
+    elapsed = time.perf_counter() - start
+    tokens = reply_tokens(result)
+    log_call(path, payload, meta, start, 0, outcome, tokens, ttft=elapsed)
+    return text, {"ttft": elapsed, "tokens": tokens or 0, "seconds": elapsed, "tokens_per_sec": 0.0}
+
+def send_stream(path, payload, extract, on_token=None, timeout=TIMEOUT, retries=MAX_RETRIES, meta=None):
+    """
+    POST payload with stream=True and read the server-sent events as they arrive.
+    extract(choice) pulls the text out of one chunk; on_token(text) is called for each piece.
+    Only the connection is retried - once tokens have been shown they can't be taken back.
+    Returns (full_text or None, stats) where stats has ttft, tokens, seconds and tokens_per_sec.
+    """
+    payload = dict(payload, stream=True)
+    stats = {"ttft": None, "tokens": 0, "seconds": 0.0, "tokens_per_sec": 0.0}
+    call_start = time.perf_counter()
+    failed = set()
+    for attempt in range(retries):
+        pool = get_pool()
+        endpoint = pool.acquire(exclude=failed)
+        start = time.perf_counter()
+        pieces = []
+        healthy = False
+        try:
+            with get_session().post(endpoint.url + path, json=payload, timeout=timeout, stream=True) as response:
+                if response.status_code in RETRY_STATUS:
+                    print(f"API Error: Status Code {response.status_code} (try {attempt + 1}/{retries})")
+                else:
+                    healthy = True
+                    response.raise_for_status()
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            stats["tokens"] = chunk["usage"].get("completion_tokens", stats["tokens"])
+                        if not chunk.get("choices"):
+                            continue
+                        text = extract(chunk["choices"][0]) or ""
+                        if not text:
+                            continue
+                        if stats["ttft"] is None:
+                            stats["ttft"] = time.perf_counter() - start
+                        pieces.append(text)
+                        if on_token:
+                            on_token(text)
+
+                    # Servers that don't send usage get one token per chunk, which is what oobabooga does
+                    stats["tokens"] = stats["tokens"] or len(pieces)
+                    stats["seconds"] = time.perf_counter() - start
+                    gen_time = stats["seconds"] - (stats["ttft"] or 0)
+                    if gen_time > 0:
+                        stats["tokens_per_sec"] = stats["tokens"] / gen_time
+                    log_call(path, payload, meta, call_start, attempt + 1, "ok", stats["tokens"],
+                             ttft=(start - call_start + stats["ttft"]) if stats["ttft"] is not None else None,
+                             backend=endpoint.url)
+                    return "".join(pieces).strip(), stats
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            healthy = False
+            if pieces:
+                print(f"\nAPI Error: stream interrupted: {e}")
+                log_call(path, payload, meta, call_start, attempt + 1, "interrupted", len(pieces),
+                         backend=endpoint.url)
+                return None, stats
+            print(f"API Error: {e} (try {attempt + 1}/{retries})")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"API Error: {e}")
+            log_call(path, payload, meta, call_start, attempt + 1, "error", backend=endpoint.url)
+            return None, stats
+        except Cancelled:
+            # Says nothing about the backend's health
+            healthy = None
+            log_call(path, payload, meta, call_start, attempt + 1, "cancelled", len(pieces), backend=endpoint.url)
+            return None, stats
+        finally:
+            pool.release(endpoint, healthy, time.perf_counter() - start)
+        failed.add(endpoint.url)
+
+        if attempt + 1 < retries:
+            time.sleep(backoff_delay(attempt))
+
+    print("Maximum retries reached.")
+    log_call(path, payload, meta, call_start, retries, "failed")
+    return None, stats
+
+def complete_stream(prompt, on_token=None, max_tokens=400, temperature=0.7, top_p=0.9, stop=None,
+                    timeout=TIMEOUT, retries=MAX_RETRIES, meta=None, cache=True):
+    """Streaming version of complete(); returns (text or None, stats)"""
+    payload = completion_payload(prompt, max_tokens, temperature, top_p, stop)
+    return stream_post(COMPLETIONS_PATH, payload, lambda choice: choice.get('text'),
+                       on_token=on_token, timeout=timeout, retries=retries, meta=meta, cache=cache)
+
+def chat_stream(content, on_token=None, max_tokens=800, temperature=0.7, top_p=0.9, mode="instruct",
+                timeout=TIMEOUT, retries=MAX_RETRIES, meta=None, cache=True):
+    """Streaming version of chat(); returns (text or None, stats)"""
+    payload = chat_payload(content, max_tokens, temperature, top_p, mode)
+    return stream_post(CHAT_PATH, payload, lambda choice: (choice.get('delta') or {}).get('content'),
+                       on_token=on_token, timeout=timeout, retries=retries, meta=meta, cache=cache)
+
+def print_token(text):
+    """on_token callback that writes tokens straight to the terminal"""
+    print(text, end="", flush=True)
+
+def format_stream_stats(stats):
+    """One-line summary of a streamed call"""
+    ttft = f"{stats['ttft']:.2f}s" if stats['ttft'] is not None else "n/a"
+    return (f"first token {ttft}, {stats['tokens']} tokens in {stats['seconds']:.1f}s "
+            f"({stats['tokens_per_sec']:.1f} tok/s)")
+
+async def complete_async(prompt, **kwargs):
+    """Async version of complete(); runs on a worker thread sharing the same pool"""
+    return await asyncio.to_thread(complete, prompt, **kwargs)
+
+async def chat_async(content, **kwargs):
+    """Async version of chat(); runs on a worker thread sharing the same pool"""
+    return await asyncio.to_thread(chat, content, **kwargs)
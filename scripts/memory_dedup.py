@@ -0,0 +1,232 @@
+"""
+Near-duplicate detection for character memories.
+
+Re-running memory generation on the same scene produces memories that say
+the same thing in nearly the same words. Each memory is reduced to a MinHash
+signature of its word shingles (NUM_PERM values); signatures are split into
+BANDS bands and hashed into LSH buckets, so finding the entries that might be
+similar to a new memory is one indexed lookup instead of comparing it with
+every entry. Candidates whose estimated Jaccard similarity reaches THRESHOLD
+count as duplicates.
+
+Signatures and buckets live in memories.db next to the entries they describe,
+and entries saved since the last check are indexed on the next one, so the
+index never goes stale.
+
+    python memory_dedup.py [--folder characters] [--threshold 0.45] [--kind shortterm|longterm|all] [--dry-run] [names...]
+
+cleans up the existing files: within each character, every entry that
+near-duplicates an earlier one is removed (the earliest is kept) and the text
+files are rewritten from the database, after a backup.
+"""
+import os
+import zlib
+import random
+import hashlib
+import argparse
+from array import array
+import memory_store
+from backup_utils import backup_file
+from encyclopedia_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # without NumPy signatures are computed in plain Python (slower, same values)
+    np = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")
+SHINGLE_CHARS = 5        # characters per shingle, taken over the memory's content words
+NUM_PERM = 120           # MinHash values per signature
+BANDS = 40               # LSH bands of NUM_PERM // BANDS rows; a pair at THRESHOLD shares a bucket ~98% of the time
+THRESHOLD = 0.45         # estimated Jaccard similarity that counts as a duplicate
+                         # (a reworded copy of the same memory scores ~0.5, the next scene's memory ~0.15)
+
+# Hash functions (a * x + b) mod a prime just under 2**32, so a * x + b still fits in 64 bits
+_PRIME = 4294967291
+_rng = random.Random(1234)   # fixed, so signatures stored in memories.db stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_ROWS = NUM_PERM // BANDS
+if np is not None:
+    _A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    _B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+
+def shingles(text):
+    """
+    Set of SHINGLE_CHARS-character runs over the lowercased content words, so
+    "walked"/"walks" or a swapped article still leave most shingles shared
+    """
+    words = " ".join(tokenize(text))
+    if len(words) <= SHINGLE_CHARS:
+        return {words} if words else set()
+    return {words[i:i + SHINGLE_CHARS] for i in range(len(words) - SHINGLE_CHARS + 1)}
+
+def stable_hash(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big", signed=True)
+
+def signature(text):
+    """MinHash signature of text (a tuple of NUM_PERM ints), or None if it has no words to compare"""
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    if np is not None:
+        values = (_A * np.array(hashes, dtype=np.uint64)[None, :] + _B) % np.uint64(_PRIME)
+        return tuple(values.min(axis=1).tolist())
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+def buckets(sig):
+    """(band, bucket) pairs - texts sharing any of them are candidates"""
+    return [(band, stable_hash(array("q", sig[band * _ROWS:(band + 1) * _ROWS]).tobytes()))
+            for band in range(BANDS)]
+
+def pack(sig):
+    return array("q", sig).tobytes()
+
+def unpack(blob):
+    return tuple(array("q", blob))
+
+def index_character(conn, character_id):
+    """Sign every active entry of a character that hasn't been signed yet"""
+    rows = conn.execute(
+        "SELECT entries.id, entries.kind, entries.text FROM entries "
+        "LEFT JOIN signatures ON signatures.entry_id = entries.id "
+        "WHERE entries.character_id = ? AND entries.consolidated = 0 AND signatures.entry_id IS NULL",
+        (character_id,)).fetchall()
+    if not rows:
+        return 0
+    with conn:
+        for entry_id, kind, text in rows:
+            sig = signature(text)
+            conn.execute("INSERT INTO signatures (entry_id, signature) VALUES (?, ?)",
+                         (entry_id, pack(sig) if sig else None))
+            if sig:
+                conn.executemany(
+                    "INSERT INTO lsh_buckets (character_id, kind, band, bucket, entry_id) VALUES (?, ?, ?, ?, ?)",
+                    [(character_id, kind, band, bucket, entry_id) for band, bucket in buckets(sig)])
+    return len(rows)
+
+def find_duplicates(folder, key, memory, kind=memory_store.SHORTTERM, threshold=THRESHOLD):
+    """
+    Active entries that memory near-duplicates, most similar first:
+    [(entry_id, similarity, created_at, text)]
+    """
+    sig = signature(memory)
+    if sig is None:
+        return []
+    conn = memory_store.connect(memory_store.db_path_for(folder))
+    character_id = memory_store.get_character(conn, key, folder)
+    index_character(conn, character_id)
+
+    candidates = set()
+    for band, bucket in buckets(sig):
+        candidates.update(row[0] for row in conn.execute(
+            "SELECT entry_id FROM lsh_buckets WHERE character_id = ? AND kind = ? AND band = ? AND bucket = ?",
+            (character_id, kind, band, bucket)))
+    matches = []
+    for entry_id in candidates:
+        row = conn.execute(
+            "SELECT signatures.signature, entries.created_at, entries.text FROM entries "
+            "JOIN signatures ON signatures.entry_id = entries.id WHERE entries.id = ? AND entries.consolidated = 0",
+            (entry_id,)).fetchone()
+        if row is None:
+            continue
+        score = similarity(sig, unpack(row[0]))
+        if score >= threshold:
+            matches.append((entry_id, score, row[1], row[2]))
+    return sorted(matches, key=lambda match: -match[1])
+
+def similar_texts(memory, texts, threshold=THRESHOLD):
+    """Indexes of texts (e.g. memories still waiting for review) that memory near-duplicates"""
+    sig = signature(memory)
+    if sig is None:
+        return []
+    matches = []
+    for i, text in enumerate(texts):
+        other = signature(text)
+        if other and similarity(sig, other) >= threshold:
+            matches.append(i)
+    return matches
+
+def describe(match):
+    entry_id, score, created_at, text = match
+    preview = text if len(text) <= 100 else text[:97] + "..."
+    return f"{score:.0%} similar to the memory from {created_at or 'an earlier scene'}: {preview}"
+
+def replace_entry(folder, key, entry_id, memory, kind=memory_store.SHORTTERM):
+    """Merge a new memory into its near-duplicate: the entry takes the new wording and timestamp"""
+    conn = memory_store.connect(memory_store.db_path_for(folder))
+    with conn:
+        conn.execute("UPDATE entries SET text = ?, created_at = ? WHERE id = ?", (memory, memory_store.now(), entry_id))
+        conn.execute("DELETE FROM signatures WHERE entry_id = ?", (entry_id,))
+        conn.execute("DELETE FROM lsh_buckets WHERE entry_id = ?", (entry_id,))
+    backup_file(memory_store.memory_path(folder, key, kind))
+    memory_store.write_file(folder, key, kind)
+
+def find_clusters(rows, threshold=THRESHOLD):
+    """
+    Group entries [(id, created_at, text)], oldest first, by near-duplication.
+    Returns [(kept row, [(duplicate row, similarity)])] for every group with duplicates.
+    """
+    table = {}           # (band, bucket) -> ids of kept entries
+    kept = {}            # id -> (row, signature, duplicates)
+    for row in rows:
+        sig = signature(row[2])
+        if sig is None:
+            continue
+        keys = buckets(sig)
+        candidates = {entry_id for k in keys for entry_id in table.get(k, ())}
+        best = max(((similarity(sig, kept[c][1]), c) for c in candidates), default=(0.0, None))
+        if best[0] >= threshold:
+            kept[best[1]][2].append((row, best[0]))
+            continue
+        kept[row[0]] = (row, sig, [])
+        for k in keys:
+            table.setdefault(k, []).append(row[0])
+    return [(row, duplicates) for row, _, duplicates in kept.values() if duplicates]
+
+def dedupe_character(folder, key, kind, threshold=THRESHOLD, dry_run=False):
+    """Remove the later copies of near-duplicate active entries; returns how many were removed"""
+    rows = list(reversed(memory_store.recent_entries(folder, key, kind, limit=-1)))
+    clusters = find_clusters(rows, threshold)
+    doomed = [duplicate[0] for _, duplicates in clusters for duplicate, _ in duplicates]
+    for kept, duplicates in clusters:
+        print(f"  {memory_store.display_name(key)} {kind}: keeping [{kept[1]}] {kept[2][:70]}")
+        for duplicate, score in duplicates:
+            print(f"      {'would drop' if dry_run else 'dropped'} [{duplicate[1]}] ({score:.0%}) {duplicate[2][:60]}")
+    if doomed and not dry_run:
+        path = memory_store.memory_path(folder, key, kind)
+        backup_file(path)
+        conn = memory_store.connect(memory_store.db_path_for(folder))
+        with conn:
+            conn.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in doomed])
+        memory_store.write_file(folder, key, kind)
+    return len(doomed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove near-duplicate memories")
+    parser.add_argument("names", nargs="*", help="characters to clean (default: everyone)")
+    parser.add_argument("--folder", default=CHARACTER_FOLDER)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--kind", choices=(memory_store.SHORTTERM, memory_store.LONGTERM, "all"),
+                        default=memory_store.SHORTTERM)
+    parser.add_argument("--dry-run", action="store_true", help="only show what would be removed")
+    args = parser.parse_args()
+
+    keys = [memory_store.character_key(name) for name in args.names] or memory_store.character_keys(args.folder)
+    kinds = (memory_store.SHORTTERM, memory_store.LONGTERM) if args.kind == "all" else (args.kind,)
+    removed = 0
+    for key in keys:
+        for kind in kinds:
+            removed += dedupe_character(args.folder, key, kind, args.threshold, args.dry_run)
+    verb = "would be removed" if args.dry_run else "removed"
+    print(f"\n{removed} near-duplicate memories {verb} across {len(keys)} characters.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Background memory generation for committed scenes, with a review queue.
+
+When interactive_scene commits a scene it hands the scene text and the NPCs
+that were in it to enqueue_scene(). Their memories are generated on a
+background thread (at most MAX_IN_FLIGHT requests at a time) while the writer
+moves on, and each one is held in the pending table of memories.db until it is
+reviewed - nothing reaches the short-term files unapproved.
+
+    python memory_queue.py [--folder characters] [--list | --approve-all | --reject-all]
+
+Without a flag it shows everything waiting and asks to approve it all at once,
+go through it one by one, or leave it for later.
+"""
+import os
+import argparse
+import threading
+import memory_store
+import memory_dedup
+import prompt_templates
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from backup_utils import backup_file
+from batch_generate_memories import call_oobabooga
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+CHARACTER_FOLDER = os.path.join(PROJECT_ROOT, "characters")
+MAX_IN_FLIGHT = 4        # memory requests sent to the backend at once
+ENTRY_WARNING = 10       # suggest consolidation once a character has this many short-term entries
+
+DUPLICATE = "duplicate"
+
+def generate_pending(folder, scene, characters, max_in_flight=MAX_IN_FLIGHT, log=print):
+    """
+    Generate a memory of scene for each (key, display name, background) and queue it for review.
+    Messages go to log (print, or e.g. a list's append for the daemon). Returns {key: pending id, None if the call failed, or DUPLICATE if the character already has that memory}.
+    """
+    queued = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = {}
+        for key, name, background in characters:
+            prompt = prompt_templates.render("memory_summary", character=name, background=background, story=scene)
+            futures[pool.submit(call_oobabooga, prompt, 200)] = (key, name)
+        for future in as_completed(futures):
+            key, name = futures[future]
+            memory = future.result()
+            if memory and is_duplicate(folder, key, memory):
+                queued[key] = DUPLICATE
+                log(f"\n[{name} already remembers this scene - memory not queued]")
+            elif memory:
+                queued[key] = memory_store.add_pending(folder, key, memory)
+            else:
+                queued[key] = None
+                log(f"\n⚠️  Background memory for {name} failed - run generate_memory.py for them.")
+    return queued
+
+def is_duplicate(folder, key, memory):
+    """True if memory near-duplicates one of the character's saved or queued memories"""
+    if memory_dedup.find_duplicates(folder, key, memory):
+        return True
+    queued = [text for _, pending_key, _, text in memory_store.pending_entries(folder) if pending_key == key]
+    return bool(memory_dedup.similar_texts(memory, queued))
+
+def enqueue_scene(folder, scene, characters, max_in_flight=MAX_IN_FLIGHT):
+    """Start generating memories for a committed scene without making the writer wait; returns the thread to join before exiting"""
+    thread = threading.Thread(target=generate_pending, args=(folder, scene, characters, max_in_flight),
+                              name="memory-queue")
+    thread.start()
+    return thread
+
+def approve(folder, rows, log=print):
+    """Save reviewed memories to the database and short-term files, then drop them from the queue (messages go to log)"""
+    backed_up = set()
+    counts = {}
+    for pending_id, key, created_at, text in rows:
+        if key not in backed_up:
+            backup_file(memory_store.memory_path(folder, key, memory_store.SHORTTERM))
+            backed_up.add(key)
+        counts[key] = memory_store.add_entry(folder, key, text)
+        memory_store.discard_pending(folder, [pending_id])
+    for key, entries in sorted(counts.items()):
+        log(f"✓ {memory_store.display_name(key)}: {entries} short-term memories")
+        if entries >= ENTRY_WARNING:
+            log(f"⚠️  {memory_store.display_name(key)} has {entries} short-term memories. "
+                  f"Consider running batch_consolidate_memories.py.")
+
+def print_pending(rows):
+    for number, (pending_id, key, created_at, text) in enumerate(rows, 1):
+        print(f"\n[{number}] {memory_store.display_name(key)} ({created_at})")
+        print(text)
+
+def review(folder, rows=None):
+    """Show the queue and let the writer approve it in bulk or one memory at a time"""
+    rows = memory_store.pending_entries(folder) if rows is None else rows
+    if not rows:
+        print("No memories waiting for review.")
+        return
+    print(f"=== {len(rows)} MEMORIES WAITING FOR REVIEW ===")
+    print_pending(rows)
+    answer = input("\nApprove all (a), review one by one (r), or leave for later (Enter): ").strip().lower()
+    if answer == "a":
+        approve(folder, rows)
+        return
+    if answer != "r":
+        print("Left in the queue.")
+        return
+
+    keep, drop = [], []
+    for number, row in enumerate(rows, 1):
+        answer = input(f"Save [{number}] {memory_store.display_name(row[1])}? (y/n/Enter = later): ").strip().lower()
+        if answer == "y":
+            keep.append(row)
+        elif answer == "n":
+            drop.append(row[0])
+    if keep:
+        approve(folder, keep)
+    if drop:
+        memory_store.discard_pending(folder, drop)
+        print(f"Discarded {len(drop)} memories.")
+    left = len(rows) - len(keep) - len(drop)
+    if left:
+        print(f"{left} memories left in the queue.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Review memories generated in the background")
+    parser.add_argument("--folder", default=CHARACTER_FOLDER)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--list", action="store_true", help="only show what's waiting")
+    group.add_argument("--approve-all", action="store_true", help="save everything without asking")
+    group.add_argument("--reject-all", action="store_true", help="empty the queue")
+    args = parser.parse_args()
+
+    rows = memory_store.pending_entries(args.folder)
+    if not rows:
+        print("No memories waiting for review.")
+    elif args.list:
+        print_pending(rows)
+    elif args.approve_all:
+        approve(args.folder, rows)
+    elif args.reject_all:
+        memory_store.discard_pending(args.folder, [row[0] for row in rows])
+        print(f"Discarded {len(rows)} memories.")
+    else:
+        review(args.folder, rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Pick the memory entries that matter for the current scene.
+
+A character's short-term or long-term file is split into its "---" entries,
+each entry becomes a TF-IDF vector, and entries are ranked by cosine similarity
+to the scene text blended with a recency weight. Scoring one query against all
+entries is a single NumPy pass over the non-zero weights, so thousands of
+entries per character cost well under a millisecond or two per character.
+
+If everything fits in the budget the file is passed through untouched, which
+keeps small memory files byte-identical from scene to scene.
+"""
+import re
+import math
+from collections import Counter, OrderedDict
+from context_builder import count_tokens
+from encyclopedia_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # without NumPy we fall back to "newest entries first"
+    np = None
+
+RECENCY_WEIGHT = 0.3     # 0 = pure relevance, 1 = pure recency
+RECENCY_HALF_LIFE = 10   # entries; an entry this many places back gets half the recency score
+ALWAYS_KEEP_NEWEST = 2   # the latest entries go in regardless of score
+MAX_CACHED_FILES = 512
+
+ENTRY_SEPARATOR = "---"
+HEADER_LINE = re.compile(r"^(CHARACTER:|SHORT-TERM MEMORY|LONG-TERM MEMORY|\[This file starts empty)")
+
+# file text -> parsed entries (file_cache hands back the same string until the file changes)
+_parsed = OrderedDict()
+
+def split_memories(text):
+    """Return (header, entries) - header is the CHARACTER:/title lines at the top of the file"""
+    pieces = text.split(ENTRY_SEPARATOR)
+    header_lines = []
+    first = []
+    for line in pieces[0].split("\n"):
+        if not first and (not line.strip() or HEADER_LINE.match(line.strip())):
+            header_lines.append(line)
+        else:
+            first.append(line)
+    pieces[0] = "\n".join(first)
+    entries = [p.strip() for p in pieces if p.strip()]
+    return "\n".join(header_lines).strip(), entries
+
+def vectorize(entries):
+    """Sparse L2-normalized TF-IDF rows as flat NumPy arrays (row, column, weight)"""
+    vocab = {}
+    rows, cols, counts = [], [], []
+    for i, entry in enumerate(entries):
+        for term, tf in Counter(tokenize(entry)).items():
+            rows.append(i)
+            cols.append(vocab.setdefault(term, len(vocab)))
+            counts.append(tf)
+
+    row = np.array(rows, dtype=np.int32)
+    col = np.array(cols, dtype=np.int32)
+    df = np.bincount(col, minlength=len(vocab)).astype(np.float32)
+    idf = np.log((1 + len(entries)) / (1 + df)) + 1.0
+    weight = (1.0 + np.log(np.array(counts, dtype=np.float32))) * idf[col]
+    norms = np.sqrt(np.bincount(row, weights=weight * weight, minlength=len(entries)))
+    weight = weight / np.maximum(norms[row], 1e-9)
+    return {'vocab': vocab, 'idf': idf, 'row': row, 'col': col, 'weight': weight, 'n': len(entries)}
+
+def parse_file(text):
+    """Split, token-count and vectorize a memory file once; reused until the text changes"""
+    parsed = _parsed.get(text)
+    if parsed is None:
+        header, entries = split_memories(text)
+        # Uncached counting - thousands of one-off entries would just flush count_tokens' cache
+        estimate = count_tokens.__wrapped__
+        parsed = {
+            'total': estimate(text),
+            'header': header,
+            'entries': entries,
+            'costs': [estimate(e) + 2 for e in entries],
+            'vectors': vectorize(entries) if np is not None else None,
+        }
+        _parsed[text] = parsed
+        if len(_parsed) > MAX_CACHED_FILES:
+            _parsed.popitem(last=False)
+    else:
+        _parsed.move_to_end(text)
+    return parsed
+
+def score_entries(vectors, query):
+    """Cosine similarity of query to every entry, as a NumPy array"""
+    q = np.zeros(len(vectors['vocab']), dtype=np.float32)
+    for term, tf in Counter(tokenize(query)).items():
+        j = vectors['vocab'].get(term)
+        if j is not None:
+            q[j] = (1.0 + math.log(tf)) * vectors['idf'][j]
+    q_norm = np.linalg.norm(q)
+    if q_norm == 0:
+        return np.zeros(vectors['n'], dtype=np.float32)
+    q /= q_norm
+    return np.bincount(vectors['row'], weights=vectors['weight'] * q[vectors['col']],
+                       minlength=vectors['n'])
+
+def rank_entries(parsed, query):
+    """Entry numbers, best first, by blended relevance and recency"""
+    n = len(parsed['entries'])
+    if parsed['vectors'] is None:
+        return list(range(n - 1, -1, -1))
+    age = np.arange(n - 1, -1, -1, dtype=np.float32)
+    recency = np.power(0.5, age / RECENCY_HALF_LIFE)
+    relevance = score_entries(parsed['vectors'], query)
+    scores = (1 - RECENCY_WEIGHT) * relevance + RECENCY_WEIGHT * recency
+    scores[max(0, n - ALWAYS_KEEP_NEWEST):] = np.inf
+    return [int(i) for i in np.argsort(-scores, kind="stable")]
+
+def select_memories(text, query, max_tokens):
+    """
+    The memory file cut down to the entries most relevant to query, within max_tokens.
+    Entries stay in their original (chronological) order.
+    Returns (text, entries kept, entries total) - the counts are None when nothing was cut.
+    """
+    if not text:
+        return "", None, None
+    parsed = _parsed.get(text)
+    total = parsed['total'] if parsed else count_tokens.__wrapped__(text)
+    if total <= max_tokens:
+        return text, None, None
+
+    parsed = parse_file(text)
+    costs = parsed['costs']
+    smallest = min(costs) if costs else 0
+    used = count_tokens(parsed['header'])
+    kept = []
+    for i in rank_entries(parsed, query):
+        if max_tokens - used < smallest:
+            break
+        if used + costs[i] > max_tokens:
+            continue
+        kept.append(i)
+        used += costs[i]
+
+    body = f"\n{ENTRY_SEPARATOR}\n".join(parsed['entries'][i] for i in sorted(kept))
+    return f"{parsed['header']}\n\n{body}".strip(), len(kept), len(parsed['entries'])
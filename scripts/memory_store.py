@@ -0,0 +1,353 @@
+"""
+SQLite store for character memories.
+
+The character_<name>_shortterm.txt / _longterm.txt files are still written
+(they're what the scene prompts read and what you edit by hand), but counting,
+appending and fetching a window of entries go through memories.db, which sits
+in the same folder as the character files.
+
+The store remembers the (mtime, size) of each text file as it last wrote or
+read it. Whenever a character is looked up and a file's stamp has changed -
+the first time the store sees it, or after a hand edit - that file's active
+entries are imported again, so counts, consolidation and later rewrites of
+the file all work from what's actually in it.
+
+    python memory_store.py import <folder>             # import every character_*_*term.txt
+    python memory_store.py export <folder> [name]      # rewrite the text files from the database
+    python memory_store.py stats <folder>
+"""
+import os
+import re
+import sys
+import glob
+import sqlite3
+import threading
+from datetime import datetime
+import file_cache
+from memory_retrieval import split_memories
+
+DB_NAME = "memories.db"
+SHORTTERM = "shortterm"
+LONGTERM = "longterm"
+
+ENTRY_SEPARATOR = "---"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+TIMESTAMP_LINE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\]\s*(.*)$")
+
+SHORTTERM_HEADER = "CHARACTER: {name}\nSHORT-TERM MEMORY (Recent detailed memories - last 10 scenes):\n\n"
+LONGTERM_HEADER = "CHARACTER: {name}\nLONG-TERM MEMORY (Consolidated summaries):\n\n"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    display_name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    imported_at TEXT
+);
+CREATE TABLE IF NOT EXISTS consolidation_batches (
+    id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL REFERENCES characters(id),
+    created_at TEXT NOT NULL,
+    entry_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL REFERENCES characters(id),
+    kind TEXT NOT NULL CHECK (kind IN ('shortterm', 'longterm')),
+    created_at TEXT NOT NULL,
+    text TEXT NOT NULL,
+    -- longterm entries: the batch they summarize; shortterm entries: the batch that consumed them
+    batch_id INTEGER REFERENCES consolidation_batches(id),
+    consolidated INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_by_character
+    ON entries (character_id, kind, consolidated, id);
+-- generated memories waiting to be approved (see memory_queue.py)
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL REFERENCES characters(id),
+    created_at TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+-- MinHash signatures and LSH buckets of active entries (see memory_dedup.py)
+CREATE TABLE IF NOT EXISTS signatures (
+    entry_id INTEGER PRIMARY KEY REFERENCES entries(id) ON DELETE CASCADE,
+    signature BLOB
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    character_id INTEGER NOT NULL REFERENCES characters(id),
+    kind TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES entries(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS lsh_lookup ON lsh_buckets (character_id, kind, band, bucket);
+CREATE INDEX IF NOT EXISTS lsh_by_entry ON lsh_buckets (entry_id);
+-- (mtime, size) of each text file as the store last wrote or imported it
+CREATE TABLE IF NOT EXISTS file_stamps (
+    character_id INTEGER NOT NULL REFERENCES characters(id),
+    kind TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (character_id, kind)
+);
+"""
+
+_local = threading.local()
+
+def db_path_for(folder):
+    """memories.db next to the character files in folder"""
+    return os.path.join(folder or ".", DB_NAME)
+
+def connect(db_path):
+    """Connection for this thread (WAL mode, schema created on first use)"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        connections[key] = conn
+    return conn
+
+def now():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def character_key(name):
+    """'Van Der Berg' -> 'van_der_berg', matching the file names"""
+    return name.lower().strip().replace(" ", "_")
+
+def display_name(key):
+    return key.replace("_", " ").title()
+
+def memory_path(folder, key, kind):
+    return os.path.join(folder or ".", f"character_{key}_{kind}.txt")
+
+def format_entry(memory, timestamp=None):
+    """One memory as it appears in the text files"""
+    return f"\n[{timestamp or now()}]\n{memory}\n{ENTRY_SEPARATOR}\n"
+
+def parse_entries(text):
+    """(created_at, text) pairs from a memory text file, oldest first"""
+    _, pieces = split_memories(text or "")
+    parsed = []
+    for piece in pieces:
+        lines = piece.split("\n")
+        match = TIMESTAMP_LINE.match(lines[0].strip())
+        if match:
+            body = "\n".join(([match.group(2)] if match.group(2) else []) + lines[1:]).strip()
+            parsed.append((match.group(1), body))
+        else:
+            parsed.append(("", piece.strip()))
+    return parsed
+
+def get_character(conn, key, folder=None):
+    """Character id for key, creating it on first sight and importing any text file that changed"""
+    ids = getattr(_local, "character_ids", None)
+    if ids is None:
+        ids = _local.character_ids = {}
+    character_id = ids.get((id(conn), key))
+    if character_id is None:
+        row = conn.execute("SELECT id FROM characters WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with conn:
+                cur = conn.execute("INSERT INTO characters (key, display_name, created_at) VALUES (?, ?, ?)",
+                                   (key, display_name(key), now()))
+            row = (cur.lastrowid,)
+        character_id = ids[(id(conn), key)] = row[0]
+    if folder is not None:
+        sync_files(conn, character_id, key, folder)
+    return character_id
+
+def recorded_stamp(conn, character_id, kind):
+    row = conn.execute("SELECT mtime_ns, size FROM file_stamps WHERE character_id = ? AND kind = ?",
+                       (character_id, kind)).fetchone()
+    return tuple(row) if row else None
+
+def record_stamp(conn, character_id, kind, path):
+    """Remember a file as the store last wrote it, so the next lookup doesn't reimport it"""
+    stamp = file_cache.file_stamp(path)
+    if stamp is None:
+        return
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO file_stamps (character_id, kind, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                     (character_id, kind) + stamp)
+
+def sync_files(conn, character_id, key, folder):
+    """Import whichever of a character's memory files changed since the store last saw it (a stat each)"""
+    for kind in (SHORTTERM, LONGTERM):
+        path = memory_path(folder, key, kind)
+        stamp = file_cache.file_stamp(path)
+        # A missing file is left alone - the next write recreates it from the database
+        if stamp is not None and stamp != recorded_stamp(conn, character_id, kind):
+            import_file(conn, character_id, kind, path)
+
+def import_file(conn, character_id, kind, path):
+    """
+    Make a character's active entries of one kind match the text file: entries
+    whose text is unchanged keep their timestamps, edited or added ones come in
+    as new entries, and ones deleted from the file are dropped.
+    """
+    parsed = parse_entries(file_cache.load_file(path, ""))
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        stamp = file_cache.file_stamp(path)
+        if stamp is None or stamp == recorded_stamp(conn, character_id, kind):
+            return   # another thread or process got here first
+        rows = conn.execute(
+            "SELECT id, created_at, text, batch_id FROM entries "
+            "WHERE character_id = ? AND kind = ? AND consolidated = 0 ORDER BY id",
+            (character_id, kind)).fetchall()
+        if [text.strip() for _, _, text, _ in rows] != [body for _, body in parsed]:
+            existing = {}
+            for row in rows:
+                existing.setdefault(row[2].strip(), []).append(row)
+            new_rows = []
+            for ts, body in parsed:
+                matches = existing.get(body)
+                old = matches.pop(0) if matches else None
+                created_at = ts or (old[1] if old else now())
+                new_rows.append((character_id, kind, created_at, body, old[3] if old else None))
+            # Rewritten in file order; signatures of the old rows go with them (ON DELETE CASCADE)
+            conn.executemany("DELETE FROM entries WHERE id = ?", [(row[0],) for row in rows])
+            conn.executemany("INSERT INTO entries (character_id, kind, created_at, text, batch_id) "
+                             "VALUES (?, ?, ?, ?, ?)", new_rows)
+        conn.execute("INSERT OR REPLACE INTO file_stamps (character_id, kind, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                     (character_id, kind) + stamp)
+        conn.execute("UPDATE characters SET imported_at = ? WHERE id = ?", (now(), character_id))
+
+def add_entry(folder, key, memory, kind=SHORTTERM):
+    """
+    Append a memory to the database and to the character's text file.
+    Returns the new shortterm/longterm entry count.
+    """
+    conn = connect(db_path_for(folder))
+    character_id = get_character(conn, key, folder)
+    timestamp = now()
+    with conn:
+        conn.execute("INSERT INTO entries (character_id, kind, created_at, text) VALUES (?, ?, ?, ?)",
+                     (character_id, kind, timestamp, memory))
+    path = memory_path(folder, key, kind)
+    if os.path.exists(path):
+        file_cache.append_text(path, format_entry(memory, timestamp))
+        record_stamp(conn, character_id, kind, path)
+    else:
+        write_file(folder, key, kind)
+    return count_entries(folder, key, kind)
+
+def count_entries(folder, key, kind=SHORTTERM):
+    """Active (not yet consolidated) entries of one kind"""
+    conn = connect(db_path_for(folder))
+    character_id = get_character(conn, key, folder)
+    return conn.execute("SELECT COUNT(*) FROM entries WHERE character_id = ? AND kind = ? AND consolidated = 0",
+                        (character_id, kind)).fetchone()[0]
+
+def recent_entries(folder, key, kind=SHORTTERM, limit=10, offset=0):
+    """Window of active entries, newest first: [(id, created_at, text)]"""
+    conn = connect(db_path_for(folder))
+    character_id = get_character(conn, key, folder)
+    return conn.execute(
+        "SELECT id, created_at, text FROM entries WHERE character_id = ? AND kind = ? AND consolidated = 0 "
+        "ORDER BY id DESC LIMIT ? OFFSET ?", (character_id, kind, limit, offset)).fetchall()
+
+def record_consolidation(folder, key, summary, entry_ids):
+    """
+    Store a consolidated summary: a new longterm entry, and the shortterm entries it
+    replaces marked as consolidated, in one transaction. Returns the batch id.
+    """
+    conn = connect(db_path_for(folder))
+    character_id = get_character(conn, key, folder)
+    timestamp = now()
+    with conn:
+        cur = conn.execute("INSERT INTO consolidation_batches (character_id, created_at, entry_count) VALUES (?, ?, ?)",
+                           (character_id, timestamp, len(entry_ids)))
+        batch_id = cur.lastrowid
+        conn.execute("INSERT INTO entries (character_id, kind, created_at, text, batch_id) VALUES (?, ?, ?, ?, ?)",
+                     (character_id, LONGTERM, timestamp, summary, batch_id))
+        conn.executemany("UPDATE entries SET consolidated = 1, batch_id = ? WHERE id = ?",
+                         [(batch_id, entry_id) for entry_id in entry_ids])
+    return batch_id
+
+def add_pending(folder, key, memory):
+    """Hold a generated memory for review instead of saving it; returns its pending id"""
+    conn = connect(db_path_for(folder))
+    character_id = get_character(conn, key, folder)
+    with conn:
+        cur = conn.execute("INSERT INTO pending (character_id, created_at, text) VALUES (?, ?, ?)",
+                           (character_id, now(), memory))
+    return cur.lastrowid
+
+def pending_entries(folder):
+    """Memories waiting for review, oldest first: [(id, key, created_at, text)]"""
+    conn = connect(db_path_for(folder))
+    return conn.execute(
+        "SELECT pending.id, characters.key, pending.created_at, pending.text FROM pending "
+        "JOIN characters ON characters.id = pending.character_id ORDER BY pending.id").fetchall()
+
+def discard_pending(folder, pending_ids):
+    """Remove reviewed memories from the queue"""
+    conn = connect(db_path_for(folder))
+    with conn:
+        conn.executemany("DELETE FROM pending WHERE id = ?", [(pending_id,) for pending_id in pending_ids])
+
+def render_file(folder, key, kind):
+    """The text file contents for one kind, rebuilt from the database"""
+    rows = recent_entries(folder, key, kind, limit=-1)
+    header = (SHORTTERM_HEADER if kind == SHORTTERM else LONGTERM_HEADER).format(name=display_name(key))
+    return header + "".join(format_entry(text, ts) for _, ts, text in reversed(rows))
+
+def write_file(folder, key, kind):
+    """Rewrite one text file from the database (after importing any hand edits to it); returns the path"""
+    path = memory_path(folder, key, kind)
+    file_cache.write_text(path, render_file(folder, key, kind))
+    conn = connect(db_path_for(folder))
+    record_stamp(conn, get_character(conn, key), kind, path)
+    return path
+
+def export_character(folder, key):
+    """Rewrite both text files from the database"""
+    for kind in (SHORTTERM, LONGTERM):
+        write_file(folder, key, kind)
+
+def character_keys(folder):
+    """Every character with a background or memory file in folder"""
+    keys = set()
+    for path in glob.glob(os.path.join(folder or ".", "character_*_*.txt")):
+        parts = os.path.basename(path)[:-len(".txt")].split("_")
+        if len(parts) >= 3 and parts[-1] in ("background", SHORTTERM, LONGTERM):
+            keys.add("_".join(parts[1:-1]))
+    return sorted(keys)
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("import", "export", "stats"):
+        print(__doc__)
+        return
+    command, folder = sys.argv[1], sys.argv[2]
+    keys = [character_key(sys.argv[3])] if len(sys.argv) > 3 else character_keys(folder)
+    conn = connect(db_path_for(folder))
+    for key in keys:
+        character_id = get_character(conn, key, folder)
+        if command == "import":
+            print(f"✓ {display_name(key)}: {count_entries(folder, key, SHORTTERM)} short-term, "
+                  f"{count_entries(folder, key, LONGTERM)} long-term entries in the database")
+        elif command == "export":
+            export_character(folder, key)
+            print(f"✓ Exported {display_name(key)}")
+        else:
+            st = count_entries(folder, key, SHORTTERM)
+            lt = count_entries(folder, key, LONGTERM)
+            batches = conn.execute("SELECT COUNT(*) FROM consolidation_batches WHERE character_id = ?",
+                                   (character_id,)).fetchone()[0]
+            waiting = conn.execute("SELECT COUNT(*) FROM pending WHERE character_id = ?",
+                                   (character_id,)).fetchone()[0]
+            print(f"{display_name(key):<24} short-term {st:>4}  long-term {lt:>4}  consolidations {batches:>3}"
+                  f"  pending {waiting:>3}")
+
+if __name__ == "__main__":
+    main()
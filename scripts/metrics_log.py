@@ -0,0 +1,197 @@
+"""
+Per-call metrics log.
+
+llm_client appends one JSON line per backend call to logs/metrics.jsonl (set
+STORY_METRICS_FILE to put it elsewhere, STORY_METRICS=0 to turn it off):
+
+    {"time", "script", "operation", "endpoint", "prompt_chars", "prompt_tokens",
+     "completion_tokens", "latency", "ttft", "attempts", "retries", "outcome", "backend", "sections"?}
+
+A fresh regeneration answered by a background candidate (see speculative.py)
+is logged with outcome "candidate" and latency = how long it had to wait.
+
+The stats command summarizes it:
+
+    python metrics_log.py stats [log file] [--script interactive_scene] [--since 2025-01-01]
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+METRICS_FILE = os.environ.get("STORY_METRICS_FILE") or os.path.join(PROJECT_ROOT, "logs", "metrics.jsonl")
+ENABLED = os.environ.get("STORY_METRICS", "1") != "0"
+# Script name recorded with each call; None = the running script's file name
+SCRIPT = None
+
+# Menu options in interactive_scene and the operation names they're logged under
+REGEN_OPERATIONS = {
+    "regen:fresh": "[a] fresh regeneration",
+    "regen:major": "[b] major redirect",
+    "regen:minor": "[c] minor adjustment",
+    "regen:detail": "[d] remind of detail",
+    "retry": "retry after a failed call",
+}
+
+# Outcomes that produced a reply (see llm_client and interactive_scene)
+OK_OUTCOMES = ("ok", "candidate", "cached", "coalesced")
+
+_lock = threading.Lock()
+
+def script_name():
+    """Name of the running script, e.g. 'interactive_scene'"""
+    name = os.path.basename(sys.argv[0] or "python")
+    return name[:-3] if name.endswith(".py") else name
+
+def record(entry):
+    """Append one metrics record (never lets logging break a call)"""
+    if not ENABLED:
+        return
+    entry = dict(entry)
+    entry.setdefault("time", datetime.now().isoformat(timespec="milliseconds"))
+    entry.setdefault("script", SCRIPT or script_name())
+    line = json.dumps(entry) + "\n"
+    try:
+        with _lock:
+            os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+            with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"Warning: couldn't write metrics: {e}")
+
+def read_records(path=None):
+    """Every record in the log, oldest first"""
+    path = path or METRICS_FILE
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+def percentile(values, p):
+    """p-th percentile (0-100) by linear interpolation; None for no values"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+def section_group(name):
+    """Fold per-character sections ('Marcus long-term') into one row ('[npc] long-term')"""
+    for suffix in ("name", "background", "long-term", "short-term"):
+        if name.endswith(" " + suffix) and name != suffix:
+            return f"[npc] {suffix}"
+    return name
+
+def fmt(value, unit=""):
+    return "-" if value is None else f"{value:.2f}{unit}"
+
+def print_latency_table(records):
+    """Call counts, outcomes and latency percentiles per script/operation"""
+    groups = defaultdict(list)
+    for r in records:
+        groups[(r.get("script", "?"), r.get("operation", "?"))].append(r)
+
+    print(f"{'script':<24} {'operation':<14} {'calls':>5} {'ok%':>5} {'retry':>5} "
+          f"{'p50 s':>6} {'p90 s':>6} {'p99 s':>6} {'ttft p50':>8} {'prompt tok':>10} {'out tok':>7}")
+    for (script, operation), rows in sorted(groups.items()):
+        latencies = [r.get("latency") for r in rows]
+        ok = sum(1 for r in rows if r.get("outcome") in OK_OUTCOMES)
+        retries = sum(r.get("retries", 0) for r in rows)
+        prompt = sum(r.get("prompt_tokens") or 0 for r in rows) // len(rows)
+        completion = sum(r.get("completion_tokens") or 0 for r in rows) // len(rows)
+        print(f"{script:<24} {operation:<14} {len(rows):>5} {100.0 * ok / len(rows):>5.0f} {retries:>5} "
+              f"{fmt(percentile(latencies, 50)):>6} {fmt(percentile(latencies, 90)):>6} "
+              f"{fmt(percentile(latencies, 99)):>6} {fmt(percentile([r.get('ttft') for r in rows], 50)):>8} "
+              f"{prompt:>10} {completion:>7}")
+
+def print_backend_table(records):
+    """Calls, errors and latency per backend, when calls were spread over more than one"""
+    groups = defaultdict(list)
+    for r in records:
+        if r.get("backend"):
+            groups[r["backend"]].append(r)
+    if len(groups) < 2:
+        return
+    print(f"\n{'backend':<32} {'calls':>5} {'ok%':>5} {'p50 s':>6} {'p90 s':>6}")
+    for backend, rows in sorted(groups.items()):
+        latencies = [r.get("latency") for r in rows]
+        ok = sum(1 for r in rows if r.get("outcome") == "ok")
+        print(f"{backend:<32} {len(rows):>5} {100.0 * ok / len(rows):>5.0f} "
+              f"{fmt(percentile(latencies, 50)):>6} {fmt(percentile(latencies, 90)):>6}")
+
+def print_regeneration_rates(records):
+    """How often each regenerate option is used, per paragraph written"""
+    scene_calls = [r for r in records if r.get("script") == "interactive_scene"]
+    paragraphs = sum(1 for r in scene_calls if r.get("operation") == "paragraph")
+    if not paragraphs:
+        return
+    print(f"\nRegenerations per paragraph (interactive_scene, {paragraphs} paragraphs):")
+    total = 0
+    for operation, label in REGEN_OPERATIONS.items():
+        count = sum(1 for r in scene_calls if r.get("operation") == operation)
+        total += count
+        print(f"  {label:<28} {count:>5}  {count / paragraphs:5.2f} per paragraph")
+    print(f"  {'all regenerations':<28} {total:>5}  {total / paragraphs:5.2f} per paragraph")
+
+def print_section_tokens(records):
+    """Average prompt tokens per context section, over calls that logged their sections"""
+    totals = defaultdict(float)
+    calls = 0
+    for r in records:
+        sections = r.get("sections")
+        if not sections:
+            continue
+        calls += 1
+        for name, tokens in sections.items():
+            totals[section_group(name)] += tokens
+    if not calls:
+        return
+    grand = sum(totals.values()) or 1
+    print(f"\nPrompt tokens by section (average over {calls} calls):")
+    for name, tokens in sorted(totals.items(), key=lambda item: -item[1]):
+        if tokens:
+            print(f"  {name:<28} {tokens / calls:>8.0f}  {100.0 * tokens / grand:5.1f}%")
+
+def stats(records):
+    if not records:
+        print("No metrics recorded yet.")
+        return
+    print(f"{len(records)} calls from {records[0].get('time', '?')} to {records[-1].get('time', '?')}\n")
+    print_latency_table(records)
+    print_backend_table(records)
+    print_regeneration_rates(records)
+    print_section_tokens(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the LLM call metrics log")
+    parser.add_argument("command", choices=("stats",))
+    parser.add_argument("path", nargs="?", default=METRICS_FILE)
+    parser.add_argument("--script", help="only calls made by this script")
+    parser.add_argument("--since", help="only calls on or after this date/time (ISO format)")
+    args = parser.parse_args()
+
+    records = read_records(args.path)
+    if args.script:
+        records = [r for r in records if r.get("script") == args.script]
+    if args.since:
+        records = [r for r in records if r.get("time", "") >= args.since]
+    stats(records)
+
+if __name__ == "__main__":
+    main()
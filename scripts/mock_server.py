@@ -0,0 +1,235 @@
+"""
+Local stand-in for the oobabooga OpenAI-compatible API.
+
+Answers /v1/completions and /v1/chat/completions (plain or stream: true) with
+filler text, and imitates the backend's prompt cache: the longest prefix shared
+with a recently seen prompt counts as cached, the rest has to be "prefilled".
+Request latency, generation speed and a rate of injected failures (503s and
+dropped connections) can be set to make it behave like a slow or flaky backend.
+
+Run on its own:   python mock_server.py --port 5000 [--latency 0.2 --decode-tps 30 --fail-rate 0.1]
+Or in-process:    server = start_server(port=0); ... server.shutdown()
+"""
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from context_builder import count_tokens
+
+FILLER = ("The lantern light wavered as she turned toward the door and said nothing for a long moment "
+          "before finally answering in a low voice that carried across the quiet room").split()
+
+DEFAULT_OPTIONS = {
+    "prefill_tps": 2000.0,   # prompt tokens processed per second (0 = don't simulate prefill time)
+    "cache_slots": 4,        # how many previous prompts the fake KV cache remembers
+    "reply_tokens": 40,      # words in each reply (capped by max_tokens)
+    "latency": 0.0,          # seconds added before every response (queueing, network)
+    "decode_tps": 0.0,       # reply tokens generated per second (0 = instant)
+    "fail_rate": 0.0,        # fraction of requests that fail
+    "fail_mode": "503",      # "503" answers with an error status, "drop" closes the connection
+    "seed": None,            # makes the injected failures repeatable
+}
+
+def common_prefix_length(a, b):
+    """Length of the shared leading substring of a and b"""
+    limit = min(len(a), len(b))
+    i = 0
+    # Compare in blocks first, then finish character by character
+    step = 4096
+    while i + step <= limit and a[i:i + step] == b[i:i + step]:
+        i += step
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+class PromptCache:
+    """Remembers recent prompts and reports how much of a new one was already seen"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def lookup(self, prompt):
+        """Return (cached_chars, best_slot_prompt) and remember this prompt"""
+        with self.lock:
+            best = 0
+            best_index = None
+            for i, seen in enumerate(self.prompts):
+                shared = common_prefix_length(prompt, seen)
+                if shared > best:
+                    best, best_index = shared, i
+            # A slot is reused by the continuing conversation, like llama.cpp does
+            if best_index is not None:
+                self.prompts.pop(best_index)
+            self.prompts.append(prompt)
+            if len(self.prompts) > self.slots:
+                self.prompts.pop(0)
+            return best
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.server.should_fail():
+            # A failing backend fails its health checks too
+            self.send_json(503, {"error": "injected failure"})
+        elif self.path.startswith("/v1/models"):
+            self.send_json(200, {"data": [{"id": "mock-model"}]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": "bad json"})
+            return
+
+        if self.path.startswith("/v1/chat/completions"):
+            prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+            chat = True
+        elif self.path.startswith("/v1/completions"):
+            prompt = body.get("prompt", "")
+            chat = False
+        else:
+            self.send_json(404, {"error": "not found"})
+            return
+
+        options = self.server.options
+        stats = self.server.stats
+        if options["latency"]:
+            time.sleep(options["latency"])
+        if self.server.should_fail():
+            with self.server.stats_lock:
+                stats["failures"] += 1
+            if options["fail_mode"] == "drop":
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)   # client sees the connection drop
+                return
+            self.send_json(503, {"error": "injected failure"})
+            return
+
+        cached_chars = self.server.prompt_cache.lookup(prompt)
+        prompt_tokens = count_tokens(prompt)
+        cached_tokens = count_tokens(prompt[:cached_chars])
+        with self.server.stats_lock:
+            stats["requests"] += 1
+            stats["prompt_chars"] += len(prompt)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+
+        if options["prefill_tps"]:
+            time.sleep((prompt_tokens - cached_tokens) / options["prefill_tps"])
+
+        n_words = min(options["reply_tokens"], int(body.get("max_tokens", options["reply_tokens"])))
+        words = [FILLER[i % len(FILLER)] for i in range(n_words)]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_words,
+            "cached_tokens": cached_tokens,
+        }
+        with self.server.stats_lock:
+            stats["completion_tokens"] += n_words
+
+        if body.get("stream"):
+            self.send_stream(words, chat, usage)
+            return
+
+        if options["decode_tps"]:
+            time.sleep(n_words / options["decode_tps"])
+        text = " ".join(words)
+        choice = {"message": {"role": "assistant", "content": text}} if chat else {"text": text}
+        self.send_json(200, {"choices": [dict(choice, index=0, finish_reason="length")], "usage": usage})
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def send_stream(self, words, chat, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / self.server.options["decode_tps"] if self.server.options["decode_tps"] else 0
+        try:
+            for i, word in enumerate(words):
+                if delay:
+                    time.sleep(delay)
+                piece = word if i == 0 else " " + word
+                choice = {"delta": {"content": piece}} if chat else {"text": piece}
+                self.send_chunk(f"data: {json.dumps({'choices': [dict(choice, index=0)]})}\n\n".encode("utf-8"))
+            self.send_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            self.send_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. a cancelled candidate), like a real backend would notice
+            self.close_connection = True
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start the mock in a background thread; port 0 picks a free one (see server.server_port)"""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.options = dict(DEFAULT_OPTIONS, **options)
+    server.prompt_cache = PromptCache(server.options["cache_slots"])
+    server.stats = {"requests": 0, "prompt_chars": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                    "completion_tokens": 0, "failures": 0}
+    server.stats_lock = threading.Lock()
+    rng = random.Random(server.options["seed"])
+
+    def should_fail():
+        with server.stats_lock:
+            return rng.random() < server.options["fail_rate"]
+    server.should_fail = should_fail
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def server_url(server):
+    """Base URL to put in llm_client.API_BASE"""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the oobabooga API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--prefill-tps", type=float, default=DEFAULT_OPTIONS["prefill_tps"])
+    parser.add_argument("--cache-slots", type=int, default=DEFAULT_OPTIONS["cache_slots"])
+    parser.add_argument("--reply-tokens", type=int, default=DEFAULT_OPTIONS["reply_tokens"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_OPTIONS["latency"])
+    parser.add_argument("--decode-tps", type=float, default=DEFAULT_OPTIONS["decode_tps"])
+    parser.add_argument("--fail-rate", type=float, default=DEFAULT_OPTIONS["fail_rate"])
+    parser.add_argument("--fail-mode", choices=("503", "drop"), default=DEFAULT_OPTIONS["fail_mode"])
+    parser.add_argument("--seed", type=int, default=DEFAULT_OPTIONS["seed"])
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, prefill_tps=args.prefill_tps,
+                          cache_slots=args.cache_slots, reply_tokens=args.reply_tokens,
+                          latency=args.latency, decode_tps=args.decode_tps,
+                          fail_rate=args.fail_rate, fail_mode=args.fail_mode, seed=args.seed)
+    print(f"Mock oobabooga listening on {server_url(server)} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
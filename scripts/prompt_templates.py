@@ -0,0 +1,244 @@
+"""
+Prompt templates loaded from prompts/.
+
+A template is a text file with {name} placeholders ({{ and }} for literal
+braces). It is compiled once into its literal segments and placeholder slots
+and only recompiled when the file changes, so rendering is a single join of
+pre-built pieces. The file's final newline isn't part of the prompt.
+
+Sections built from inputs that rarely change (the style guide, character
+backgrounds, long-term memory) are kept rendered by section() until the text
+they were built from changes - file_cache hands back the same string until a
+file is edited, so checking that is cheap.
+
+    python prompt_templates.py list                 # templates and their placeholders
+    python prompt_templates.py manual [--npcs "Marcus, Sera"]   # fill prompt_template.txt for pasting into a chat UI
+    python prompt_templates.py bench [--casts 1,4,16] [--scenes 5,50,200]
+"""
+import os
+import sys
+import time
+import string
+import argparse
+import threading
+from collections import OrderedDict
+import file_cache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+PROMPTS_FOLDER = os.path.join(PROJECT_ROOT, "prompts")
+MAX_SECTIONS = 256       # rendered sections kept; least recently used are dropped past this
+
+_templates = {}          # path -> (stamp, Template)
+_sections = OrderedDict()   # name -> (key, value)
+_lock = threading.Lock()
+
+stats = {"compiles": 0, "section_hits": 0, "section_builds": 0}
+
+class Template:
+    """A compiled template: the literal text between placeholders and the placeholder names"""
+
+    def __init__(self, text, name="<string>"):
+        self.name = name
+        self.parts = []      # literal strings, with None where a value goes
+        self.slots = []      # (index into parts, placeholder name)
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if literal:
+                self.parts.append(literal)
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"{name}: format specs aren't supported ({{{field}}})")
+            self.slots.append((len(self.parts), field))
+            self.parts.append(None)
+        self.fields = tuple(dict.fromkeys(field for _, field in self.slots))
+
+    def render(self, **values):
+        """Fill every placeholder (each must be given) and join"""
+        parts = list(self.parts)
+        try:
+            for index, field in self.slots:
+                value = values[field]
+                parts[index] = value if isinstance(value, str) else str(value)
+        except KeyError as e:
+            raise KeyError(f"{self.name}: no value for placeholder {e}") from None
+        return "".join(parts)
+
+def template_path(name):
+    return os.path.join(PROMPTS_FOLDER, name if name.endswith(".txt") else f"{name}.txt")
+
+def load(name):
+    """Compiled template prompts/<name>.txt, recompiled only if the file changed"""
+    path = template_path(name)
+    stamp = file_cache.file_stamp(path)
+    if stamp is None:
+        raise FileNotFoundError(f"Prompt template not found: {path}")
+    with _lock:
+        cached = _templates.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    text = file_cache.load_file(path)
+    if text.endswith("\n"):
+        text = text[:-1]
+    template = Template(text, os.path.basename(path))
+    with _lock:
+        _templates[path] = (stamp, template)
+        stats["compiles"] += 1
+    return template
+
+def render(name, **values):
+    return load(name).render(**values)
+
+def section(name, key, build):
+    """
+    Rendered text (or any value) for name, rebuilt by build() only when key changes.
+    key is whatever the section depends on, usually the input text itself.
+    """
+    with _lock:
+        cached = _sections.get(name)
+        if cached is not None and cached[0] == key:
+            _sections.move_to_end(name)
+            stats["section_hits"] += 1
+            return cached[1]
+    value = build()
+    with _lock:
+        _sections[name] = (key, value)
+        _sections.move_to_end(name)
+        while len(_sections) > MAX_SECTIONS:
+            _sections.popitem(last=False)
+        stats["section_builds"] += 1
+    return value
+
+def clear():
+    """Forget every compiled template and rendered section"""
+    with _lock:
+        _templates.clear()
+        _sections.clear()
+
+def list_templates():
+    for filename in sorted(os.listdir(PROMPTS_FOLDER)):
+        if not filename.endswith(".txt"):
+            continue
+        try:
+            fields = load(filename).fields
+        except ValueError as e:
+            print(f"  {filename:<28} ERROR: {e}")
+            continue
+        print(f"  {filename:<28} {', '.join(fields) if fields else '(no placeholders)'}")
+
+def manual(npcs):
+    """prompt_template.txt filled in from the project files, ready to paste into a chat UI"""
+    import story_log
+    import interactive_scene
+    names = [npc.strip() for npc in npcs.split(",") if npc.strip()]
+    npc_data = interactive_scene.load_npc_data(names)
+    characters = "\n\n".join(
+        f"CHARACTER [{data['name'].upper()}]:\n" + "\n".join(
+            text for text in (data['background'], data['shortterm'], data['longterm']) if text)
+        for data in npc_data.values())
+    world_state = interactive_scene.load_file(os.path.join(interactive_scene.WORLD_FOLDER, "world_state.txt"))
+    story_recent = story_log.recent_text(interactive_scene.STORY_FILE, interactive_scene.RECENT_SCENES)
+    print("Write the new addition to the story (Press Enter twice when done):", file=sys.stderr)
+    lines = []
+    while True:
+        line = input()
+        if line == "":
+            break
+        lines.append(line)
+    print(render("prompt_template", world_state=world_state, characters=characters,
+                 story_recent=story_recent, scene="\n".join(lines)))
+
+def bench(casts, scene_counts, turns):
+    """
+    Time building scene prompts for different cast sizes and story lengths:
+    the first scene (everything built), a later scene with the same cast
+    (static sections reused), each turn, and a template render.
+    """
+    import context_builder
+    import interactive_scene
+    # interactive_scene uses the imported module, not this __main__ copy
+    import prompt_templates
+    from bench_prefix import filler
+
+    def world(n_npcs, n_scenes):
+        style_guide = filler(1, 600)
+        lore = "\n\n".join(f"ENTRY {i}: {filler(i, 60)}" for i in range(6))
+        world_state = filler(2, 200)
+        npc_data = {}
+        for i in range(n_npcs):
+            name = f"npc_{i}"
+            npc_data[name] = {
+                'name': name.replace("_", " ").title(),
+                'background': filler(100 + i, 200),
+                'shortterm': "\n---\n".join(f"[memory {j}] {filler(200 + i * 10 + j, 40)}" for j in range(8)),
+                'longterm': filler(300 + i, 150),
+            }
+        story = "\n\n".join(f"Scene {i}. {filler(400 + i, 150)}" for i in range(n_scenes))
+        return style_guide, lore, world_state, npc_data, story
+
+    def timed(fn, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            value = fn()
+        return value, (time.perf_counter() - start) / repeat * 1000
+
+    print(f"{'cast':>4} {'story KB':>8} {'1st scene ms':>12} {'next scene ms':>13} "
+          f"{'turn ms':>8} {'template us':>11} {'format us':>9}")
+    for n_npcs in casts:
+        for n_scenes in scene_counts:
+            style_guide, lore, world_state, npc_data, story = world(n_npcs, n_scenes)
+            prompt_templates.clear()
+            context_builder.count_tokens.cache_clear()
+            scene_context, first = timed(lambda: interactive_scene.prepare_scene_context(
+                style_guide, lore, world_state, npc_data, story))
+            # A new scene with the same cast: new story and short-term text, same static sections
+            story += "\n\nOne more scene. " + filler(999, 150)
+            _, later = timed(lambda: interactive_scene.prepare_scene_context(
+                style_guide, lore, world_state, npc_data, story))
+
+            draft = ""
+            turn_total = 0.0
+            for turn in range(turns):
+                action = filler(500 + turn, 60)
+                _, ms = timed(lambda: interactive_scene.build_prompt(scene_context, draft, action))
+                turn_total += ms
+                draft += f"\n\n{action}\n\n{filler(600 + turn, 120)}"
+
+            memory = prompt_templates.load("memory_summary")
+            values = {'character': "Npc 0", 'background': npc_data['npc_0']['background'], 'story': story}
+            text = memory.render(**values)
+            format_string = text.replace(values['story'], "{story}").replace(
+                values['background'], "{background}").replace("Npc 0", "{character}")
+            _, render_ms = timed(lambda: memory.render(**values), repeat=200)
+            _, format_ms = timed(lambda: format_string.format(**values), repeat=200)
+            print(f"{n_npcs:>4} {len(story) / 1024:>8.1f} {first:>12.2f} {later:>13.2f} "
+                  f"{turn_total / turns:>8.2f} {render_ms * 1000:>11.1f} {format_ms * 1000:>9.1f}")
+    stats = prompt_templates.stats
+    print(f"\nsections built {stats['section_builds']}, reused {stats['section_hits']}; "
+          f"templates compiled {stats['compiles']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt templates in prompts/")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="show the templates and their placeholders")
+    manual_parser = sub.add_parser("manual", help="fill prompt_template.txt from the project files")
+    manual_parser.add_argument("--npcs", default="", help="comma-separated cast")
+    bench_parser = sub.add_parser("bench", help="time prompt building against cast size and story length")
+    bench_parser.add_argument("--casts", default="1,4,16")
+    bench_parser.add_argument("--scenes", default="5,50,200")
+    bench_parser.add_argument("--turns", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_templates()
+    elif args.command == "manual":
+        manual(args.npcs or input("Characters in this scene (comma-separated): "))
+    elif args.command == "bench":
+        bench([int(n) for n in args.casts.split(",")], [int(n) for n in args.scenes.split(",")], args.turns)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+On-disk cache of backend responses, plus coalescing of identical calls.
+
+llm_client looks every call up here first. The key is a hash of the backend
+URLs the call can go to, the API path (completions or chat) and the request
+body minus the stream flag, so the same prompt with the same sampling
+parameters sent to the same backend is answered from cache/responses.db
+however it was asked for. Pointing llm_client at another backend or endpoint
+pool starts from an empty cache; after loading a different model on the same
+backend, run "response_cache.py clear". Entries expire after TTL seconds; once
+the cache grows past MAX_BYTES the least recently used ones are evicted. While
+a call is in flight, an identical call waits for it instead of asking the
+backend again.
+
+Callers that want a new sample (anything the writer asks for in
+interactive_scene or generate_scene, speculative candidates) pass cache=False.
+STORY_CACHE=0 turns the cache off, STORY_CACHE_FILE moves it.
+
+    python response_cache.py stats | prune | clear
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+CACHE_FILE = os.environ.get("STORY_CACHE_FILE") or os.path.join(PROJECT_ROOT, "cache", "responses.db")
+ENABLED = os.environ.get("STORY_CACHE", "1") != "0"
+MAX_BYTES = 50 * 1024 * 1024     # evict least recently used responses beyond this
+TTL = 7 * 24 * 3600              # seconds a response stays usable
+PRUNE_EVERY = 100                # stores between full prunes (expiry and a fresh size total)...
+PRUNE_INTERVAL = 600             # ...or seconds, whichever comes first
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_use ON responses (last_used);
+"""
+
+_local = threading.local()
+_flights = {}
+_flights_lock = threading.Lock()
+# Running estimate of the cache size between prunes, so a store doesn't need a SUM over the table
+_usage = {"total": None, "puts": 0, "pruned_at": 0.0}
+_usage_lock = threading.Lock()
+
+def connect():
+    """Connection for this thread (WAL mode, schema created on first use)"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(CACHE_FILE)
+    conn = connections.get(key)
+    if conn is None:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[key] = conn
+    return conn
+
+def cache_key(path, payload, backend=""):
+    """Hash of the backend, the API path and the request body (streaming or not makes no difference)"""
+    body = {name: value for name, value in payload.items() if name != "stream"}
+    text = backend + "\n" + path + "\n" + json.dumps(body, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get(key):
+    """Cached response for key, or None if there isn't a fresh one"""
+    conn = connect()
+    row = conn.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    now = time.time()
+    with conn:
+        if now - row[1] > TTL:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+    return json.loads(row[0])
+
+def put(key, path, result):
+    """
+    Store a response. The cache is pruned when the running size total goes over
+    MAX_BYTES, and otherwise every PRUNE_EVERY stores or PRUNE_INTERVAL seconds
+    (which also picks up what other processes stored).
+    """
+    body = json.dumps(result, ensure_ascii=False)
+    now = time.time()
+    conn = connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO responses (key, path, created_at, last_used, size, body) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", (key, path, now, now, len(body), body))
+    with _usage_lock:
+        _usage["puts"] += 1
+        if _usage["total"] is not None:
+            _usage["total"] += len(body)   # an over-estimate when a row was replaced; the next prune corrects it
+        due = (_usage["total"] is None or _usage["total"] > MAX_BYTES or _usage["puts"] >= PRUNE_EVERY
+               or now - _usage["pruned_at"] >= PRUNE_INTERVAL)
+    if due:
+        prune(conn)
+
+def prune(conn=None):
+    """Drop expired responses and trim to MAX_BYTES, least recently used first; returns rows removed"""
+    conn = conn or connect()
+    with conn:
+        removed = conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - TTL,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        doomed = []
+        if total > MAX_BYTES:
+            # Go down to 90% so the next few stores don't each trigger another eviction
+            excess = total - int(MAX_BYTES * 0.9)
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                doomed.append((key,))
+                total -= size
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+    with _usage_lock:
+        _usage.update(total=total, puts=0, pruned_at=time.time())
+    return removed + len(doomed)
+
+def coalesce(key, compute):
+    """
+    Run compute() unless an identical call is already in flight, in which case wait for its result.
+    Returns (value, True if this thread did the work).
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = {"done": threading.Event(), "value": None}
+    if not leader:
+        flight["done"].wait()
+        return flight["value"], False
+    try:
+        flight["value"] = compute()
+        return flight["value"], True
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight["done"].set()
+
+def stats():
+    conn = connect()
+    count, size, oldest = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created_at) FROM responses").fetchone()
+    print(f"{CACHE_FILE}: {count} responses, {size / 1024:.1f} KB of {MAX_BYTES / 1024 / 1024:.0f} MB")
+    if oldest:
+        print(f"Oldest entry {(time.time() - oldest) / 3600:.1f} hours old (TTL {TTL / 3600:.0f} hours)")
+    for path, n in conn.execute("SELECT path, COUNT(*) FROM responses GROUP BY path ORDER BY path"):
+        print(f"  {path:<24} {n:>6}")
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        stats()
+    elif command == "prune":
+        print(f"Removed {prune()} responses.")
+    elif command == "clear":
+        conn = connect()
+        with conn:
+            removed = conn.execute("DELETE FROM responses").rowcount
+        conn.execute("VACUUM")
+        print(f"Removed {removed} responses.")
+    else:
+        print(__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Spare candidates for "Fresh regeneration".
+
+While the writer reads a generated paragraph, CandidatePool keeps a few more
+responses to the same prompt generating in the background. Asking for a fresh
+regeneration then takes the next finished candidate instead of starting a new
+request. Accepting, editing or changing the prompt cancels the spares - their
+streams are closed, so the backend stops generating them.
+
+interactive_scene only uses it when SPECULATIVE_CANDIDATES (or the
+STORY_SPECULATIVE environment variable) is above 0; it's off by default.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+import llm_client
+
+class CandidatePool:
+    """
+    Up to `size` background generations for one prompt.
+    generate(prompt, cancel_event) returns text or None and should give up once cancel_event is set.
+    """
+
+    def __init__(self, generate, size):
+        self.generate = generate
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix="candidate")
+        self.prompt = None
+        self.futures = []
+        self.cancel_event = threading.Event()
+        self.stats = {"requested": 0, "used": 0, "ready": 0, "waited": 0, "missed": 0, "cancelled": 0}
+
+    def submit(self):
+        self.futures.append(self.executor.submit(self.generate, self.prompt, self.cancel_event))
+        self.stats["requested"] += 1
+
+    def start(self, prompt):
+        """Start spares for prompt (any spares for another prompt are cancelled)"""
+        if self.size <= 0 or prompt == self.prompt:
+            return
+        self.cancel()
+        self.prompt = prompt
+        self.cancel_event = threading.Event()
+        for _ in range(self.size):
+            self.submit()
+
+    def take(self, prompt):
+        """
+        A spare response for prompt, or None if there isn't one.
+        Prefers one that's already finished; otherwise waits for the oldest.
+        Returns (text, seconds waited).
+        """
+        if prompt != self.prompt or not self.futures:
+            return None, 0.0
+        start = time.perf_counter()
+        done = [f for f in self.futures if f.done()]
+        future = done[0] if done else self.futures[0]
+        self.futures.remove(future)
+        try:
+            text = future.result()
+        except CancelledError:
+            text = None
+        waited = time.perf_counter() - start
+        if not text:
+            self.stats["missed"] += 1
+            return None, waited
+        # Keep the pool topped up for the next regeneration
+        self.submit()
+        self.stats["used"] += 1
+        self.stats["ready" if done else "waited"] += 1
+        return text, waited
+
+    def cancel(self):
+        """Drop every spare: queued ones never start, running ones stop streaming"""
+        self.cancel_event.set()
+        for future in self.futures:
+            if not future.done():
+                future.cancel()
+                self.stats["cancelled"] += 1
+        self.futures = []
+        self.prompt = None
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def summary(self):
+        """One line for the end-of-session report"""
+        s = self.stats
+        regenerations = s["used"] + s["missed"]
+        if not s["requested"]:
+            return ""
+        hit_rate = 100.0 * s["used"] / regenerations if regenerations else 0.0
+        return (f"Speculative candidates: {s['requested']} requested, {s['used']} used "
+                f"({s['ready']} ready, {s['waited']} waited for), {s['cancelled']} cancelled, "
+                f"hit rate {hit_rate:.0f}%")
+
+def stop_on(cancel_event):
+    """on_token callback that aborts a stream once cancel_event is set"""
+    def on_token(text):
+        if cancel_event.is_set():
+            raise llm_client.Cancelled()
+    return on_token
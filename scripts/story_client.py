@@ -0,0 +1,208 @@
+"""
+Thin command-line client for story_daemon.py.
+
+Imports nothing but the standard library and loads no story data itself, so it
+starts instantly; the daemon already has the world, characters, indexes and
+backend connections in memory. Start the daemon once (python story_daemon.py)
+and then:
+
+    python story_client.py scene          # write a scene paragraph by paragraph
+    python story_client.py review         # approve the memories waiting for review
+    python story_client.py memories [Marcus Sera]   # memories of the latest scene (all characters by default)
+    python story_client.py consolidate    # consolidate everyone over the threshold
+    python story_client.py status | jobs
+
+STORY_DAEMON_URL points it at a daemon on another port. Requests carry the
+daemon's token from .story_daemon_token (STORY_DAEMON_TOKEN_FILE if the daemon
+keeps it elsewhere).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import urllib.error
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAEMON_URL = os.environ.get("STORY_DAEMON_URL", "http://127.0.0.1:5100")
+TOKEN_FILE = os.environ.get("STORY_DAEMON_TOKEN_FILE") or os.path.join(PROJECT_ROOT, ".story_daemon_token")
+TIMEOUT = 600            # generation requests can take a while on a busy backend
+
+class DaemonError(Exception):
+    """The daemon refused a request (its message is shown to the writer)"""
+
+def read_token():
+    try:
+        with open(TOKEN_FILE, "r", encoding="ascii") as f:
+            return f.read().strip()
+    except OSError:
+        sys.exit(f"No daemon token at {TOKEN_FILE}. Start the daemon once (python story_daemon.py) to create it.")
+
+def call(path, body=None):
+    """GET (body None) or POST JSON to the daemon and return the decoded reply"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(DAEMON_URL + path, data=data,
+                                     headers={"Content-Type": "application/json", "X-Story-Token": read_token()})
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", str(e))
+        except ValueError:
+            message = str(e)
+        raise DaemonError(message)
+    except urllib.error.URLError:
+        sys.exit(f"The story daemon isn't running at {DAEMON_URL}. Start it with: python story_daemon.py")
+
+def read_lines(prompt):
+    print(prompt)
+    lines = []
+    while True:
+        line = input()
+        if line == "":
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+def show_reply(reply, seconds):
+    print("\n" + "="*60)
+    print("AI RESPONSE:")
+    print("="*60)
+    print(reply)
+    print("="*60)
+    print(f"[{seconds:.1f}s]")
+
+REGEN_PROMPTS = {
+    "b": ("major", "Describe major change needed: "),
+    "c": ("minor", "Describe minor adjustment: "),
+    "d": ("detail", "What detail should AI remember?: "),
+}
+
+def scene():
+    npcs = input("Characters in this scene (comma-separated): ").split(",")
+    started = call("/scene/start", {"npcs": npcs})
+    session = started["session"]
+    for name in started["missing"]:
+        print(f"Warning: No files found for '{name}' - skipping")
+    print("\n=== INTERACTIVE SCENE MODE ===\n")
+
+    try:
+        while True:
+            passage = read_lines("\nWrite your paragraph (Press Enter twice when done):\n")
+            if not passage.strip():
+                print("Empty input. Ending scene.")
+                return
+            kind, text = "paragraph", ""
+            while True:
+                print("Generating AI response...")
+                turn = call("/scene/turn", {"session": session, "passage": passage, "kind": kind, "text": text})
+                if not turn["reply"]:
+                    if input("Generation failed. Retry? (y/n): ").strip().lower() != "y":
+                        break
+                    kind = "fresh"
+                    continue
+                show_reply(turn["reply"], turn["seconds"])
+                choice = input("\n[1] Accept  [2] Regenerate  [3] Accept and commit scene\nChoose: ").strip()
+                if choice == "2":
+                    option = input("[a] Fresh  [b] Major redirect  [c] Minor adjustment  [d] Remind of detail\n"
+                                   "Choose: ").strip().lower()
+                    kind, text = "fresh", ""
+                    if option in REGEN_PROMPTS:
+                        kind, question = REGEN_PROMPTS[option]
+                        text = input(question).strip()
+                        if not text:
+                            kind = "fresh"
+                    continue
+                call("/scene/accept", {"session": session, "passage": passage, "reply": turn["reply"]})
+                if choice == "3":
+                    if input("\nCommit this scene? (y/n): ").strip().lower() == "y":
+                        committed = call("/scene/commit", {"session": session})
+                        session = None
+                        print(f"\n✓ Scene committed to {committed['story']}")
+                        if committed["memories"]:
+                            print(f"Generating memories for {', '.join(committed['memories'])} in the background "
+                                  f"(python story_client.py review).")
+                        return
+                    print("Commit cancelled.")
+                print("\n✓ Added to scene draft.")
+                break
+    finally:
+        if session:
+            call("/scene/close", {"session": session})
+
+def review():
+    pending = call("/review")["pending"]
+    if not pending:
+        print("No memories waiting for review.")
+        return
+    print(f"=== {len(pending)} MEMORIES WAITING FOR REVIEW ===")
+    for number, row in enumerate(pending, 1):
+        print(f"\n[{number}] {row['name']} ({row['created_at']})")
+        print(row['text'])
+    answer = input("\nApprove all (a), review one by one (r), or leave for later (Enter): ").strip().lower()
+    if answer == "a":
+        result = call("/review", {"approve": "all"})
+    elif answer == "r":
+        approve, reject = [], []
+        for number, row in enumerate(pending, 1):
+            choice = input(f"Save [{number}] {row['name']}? (y/n/Enter = later): ").strip().lower()
+            if choice == "y":
+                approve.append(row['id'])
+            elif choice == "n":
+                reject.append(row['id'])
+        result = call("/review", {"approve": approve, "reject": reject})
+    else:
+        print("Left in the queue.")
+        return
+    print(result["log"], end="")
+    print(f"{result['approved']} approved, {result['rejected']} discarded.")
+
+def wait_for(job):
+    """Poll a job until it finishes and print its result"""
+    print(f"Job {job['id']} ({job['kind']}) queued...")
+    while job["state"] in ("queued", "running"):
+        time.sleep(0.5)
+        job = call(f"/jobs/{job['id']}")
+    print(f"Job {job['state']} in {job.get('seconds', 0):.1f}s")
+    for line in job.get("log", []):
+        print(line)
+    result = job["result"]
+    if not result:
+        print("  (nothing to do)")
+    elif isinstance(result, dict):
+        for name, outcome in sorted(result.items()):
+            print(f"  {name:<20} {outcome if isinstance(outcome, str) else outcome.get('status')}")
+    else:
+        print(result)
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to the story daemon")
+    parser.add_argument("command", choices=("scene", "review", "memories", "consolidate", "status", "jobs"))
+    parser.add_argument("names", nargs="*", help="characters for 'memories' (default: everyone)")
+    parser.add_argument("--no-wait", action="store_true", help="queue a job and return straight away")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "scene":
+            scene()
+        elif args.command == "review":
+            review()
+        elif args.command in ("memories", "consolidate"):
+            body = {"characters": args.names} if args.command == "memories" else {}
+            job = call(f"/{args.command}", body)
+            if args.no_wait:
+                print(f"Job {job['id']} queued.")
+            else:
+                wait_for(job)
+        elif args.command == "jobs":
+            for job in call("/jobs")["jobs"]:
+                print(f"  {job['id']}  {job['kind']:<12} {job['state']:<8} {job['queued_at']}")
+        else:
+            print(json.dumps(call("/status"), indent=2))
+    except DaemonError as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+Long-running story server for story_client.py.
+
+Every script normally starts cold: it imports requests, reads the style guide,
+world files and character files, rebuilds the encyclopedia index and opens a
+new connection to the backend. The daemon does that once and keeps it all in
+memory - file_cache, the encyclopedia index, memories.db connections, the
+backend connection pool, the response cache and the background job queue.
+The file and index caches check each file's size and mtime on every use, so
+edits made while it runs are picked up without a restart.
+
+It listens on localhost only and speaks JSON over HTTP. Every request must
+carry the token from .story_daemon_token in the project folder (created on the
+first start, readable only by you; STORY_DAEMON_TOKEN_FILE puts it elsewhere)
+in an X-Story-Token header, and POST bodies must be application/json objects.
+A web page open in a browser can send neither, so it can't drive the daemon.
+Requests carrying an Origin header (i.e. from a browser) are refused outright.
+
+    GET  /status                       uptime, sessions, jobs, memories waiting
+    POST /scene/start   {npcs}         -> {session, npcs, missing}
+    POST /scene/turn    {session, passage, kind, text}
+                                       kind: paragraph | fresh | major | minor | detail
+    POST /scene/accept  {session, passage, reply}
+    POST /scene/commit  {session, memories}
+    POST /scene/close   {session}
+    GET  /review                       memories waiting for approval
+    POST /review        {approve: [ids] | "all", reject: [ids] | "all"}
+    POST /memories      {characters?}  job: memories of the latest scene, into the review queue
+    POST /consolidate   {entries?, tokens?}
+                                       job: consolidate everyone over the threshold
+    GET  /jobs, GET /jobs/<id>
+
+    python story_daemon.py [--port 5100]
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import secrets
+import traceback
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import llm_client
+import file_cache
+import story_log
+import story_summary
+import memory_store
+import memory_queue
+import character_registry
+import encyclopedia_index
+import context_builder
+import interactive_scene
+import batch_consolidate_memories
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+# Config
+TOKEN_FILE = os.environ.get("STORY_DAEMON_TOKEN_FILE") or os.path.join(PROJECT_ROOT, ".story_daemon_token")
+TOKEN_HEADER = "X-Story-Token"
+HOST = "127.0.0.1"
+PORT = 5100
+MAX_JOBS = 2             # memory / consolidation jobs run at once (each has its own request limit)
+SESSION_IDLE = 6 * 3600  # scene sessions untouched this long are dropped
+
+class ClientError(Exception):
+    """Bad request from a client; reported back with status 400"""
+
+def load_token(path=TOKEN_FILE):
+    """The shared secret clients must send, created (owner-only) if it doesn't exist yet"""
+    try:
+        with open(path, "r", encoding="ascii") as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token + "\n")
+    return token
+
+def number(body, key, default):
+    """An integer field of a request body"""
+    value = body.get(key, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ClientError(f"{key} must be a number, not {value!r}")
+
+class Session:
+    """One scene being written: cast, cached scene context and the accepted draft"""
+
+    def __init__(self, npc_data, shared):
+        self.id = uuid.uuid4().hex[:12]
+        self.npc_data = npc_data
+        self.shared = shared
+        self.context = None
+        self.lore_hits = []
+        self.passage = None
+        self.extra_lore = ""
+        self.draft = []
+        self.lock = threading.Lock()
+        self.touched = time.time()
+
+    def prepare(self, passage):
+        """Scene context on the first paragraph, extra encyclopedia entries on later ones"""
+        if passage == self.passage:
+            return
+        self.passage = passage
+        if self.context is None:
+            query = f"{passage}\n{self.shared['last_scene']}"
+            lore, self.lore_hits = interactive_scene.select_lore(
+                self.npc_data, query, interactive_scene.SCENE_LORE_ENTRIES)
+            scene_npcs = interactive_scene.select_npc_memories(self.npc_data, query)
+            self.context = interactive_scene.prepare_scene_context(
+                self.shared['style_guide'], lore, self.shared['world_state'], scene_npcs,
+                self.shared['story_recent'], self.shared['story_so_far'])
+            self.extra_lore = ""
+        else:
+            draft = "\n\n".join(self.draft)
+            self.extra_lore, _ = interactive_scene.select_lore(
+                self.npc_data, f"{passage}\n{draft[-2000:]}", interactive_scene.TURN_LORE_ENTRIES,
+                exclude=self.lore_hits)
+
+class StoryDaemon:
+    def __init__(self):
+        self.started = time.time()
+        self.sessions = {}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=MAX_JOBS, thread_name_prefix="job")
+        self.requests = 0
+        self.token = load_token()
+
+    def warm_up(self):
+        """Load what every request needs so the first one is as quick as the rest"""
+        start = time.perf_counter()
+        character_registry.characters(interactive_scene.CHARACTER_FOLDER)
+        encyclopedia_index.load_index(interactive_scene.ENCYCLOPEDIA_FILE)
+        self.shared_context()
+        llm_client.get_session()
+        llm_client.get_pool()
+        print(f"Warmed up in {time.perf_counter() - start:.2f}s")
+
+    def shared_context(self):
+        """Style guide, world state and story context as of now"""
+        story_file = interactive_scene.STORY_FILE
+        story_so_far, story_recent = story_summary.story_context(
+            story_file, interactive_scene.RECENT_SCENES, interactive_scene.STORY_SUMMARY_TOKENS)
+        return {
+            'style_guide': interactive_scene.load_file(
+                f"{interactive_scene.PROJECT_ROOT}/prompts/style_guide.txt"),
+            'world_state': interactive_scene.load_file(f"{interactive_scene.WORLD_FOLDER}/world_state.txt"),
+            'story_so_far': story_so_far,
+            'story_recent': story_recent,
+            'last_scene': story_log.recent_text(story_file, 1),
+        }
+
+    # --- scenes ---
+
+    def session(self, body):
+        with self.lock:
+            now = time.time()
+            for stale in [sid for sid, s in self.sessions.items() if now - s.touched > SESSION_IDLE]:
+                del self.sessions[stale]
+            session = self.sessions.get(body.get("session"))
+        if session is None:
+            raise ClientError("unknown or expired session")
+        session.touched = time.time()
+        return session
+
+    def scene_start(self, body):
+        npcs = [npc.strip() for npc in body.get("npcs", []) if npc.strip()]
+        npc_data = interactive_scene.load_npc_data(npcs)
+        if not npc_data:
+            raise ClientError("no files found for any of the characters")
+        session = Session(npc_data, self.shared_context())
+        with self.lock:
+            self.sessions[session.id] = session
+        found = {data['name'] for data in npc_data.values()}
+        return {"session": session.id, "npcs": sorted(found), "missing": [n for n in npcs if n not in found]}
+
+    def scene_turn(self, body):
+        session = self.session(body)
+        passage = body.get("passage", "").strip()
+        kind = body.get("kind", "paragraph")
+        if not passage:
+            raise ClientError("empty passage")
+        if kind not in ("paragraph", "fresh", "major", "minor", "detail"):
+            raise ClientError(f"unknown kind {kind!r}")
+        with session.lock:
+            session.prepare(passage)
+            instruction = ""
+            if kind in ("major", "minor", "detail"):
+                instruction = interactive_scene.regen_instruction(kind, body.get("text", ""))
+            prompt, report = interactive_scene.build_prompt(
+                session.context, "\n\n".join(session.draft), passage, instruction, session.extra_lore)
+        operation = "paragraph" if kind == "paragraph" else f"regen:{kind}"
+        start = time.perf_counter()
+        reply = llm_client.chat(prompt, max_tokens=800, temperature=0.5,
+                                meta=interactive_scene.call_metrics(operation, report, session.npc_data),
+                                cache=kind != "fresh")
+        return {"reply": reply, "seconds": round(time.perf_counter() - start, 3),
+                "prompt_tokens": context_builder.count_tokens(prompt)}
+
+    def scene_accept(self, body):
+        session = self.session(body)
+        passage, reply = body.get("passage", "").strip(), body.get("reply", "").strip()
+        if not passage or not reply:
+            raise ClientError("accept needs the passage and the reply")
+        with session.lock:
+            session.draft += [passage, reply]
+            return {"paragraphs": len(session.draft) // 2}
+
+    def scene_commit(self, body):
+        session = self.session(body)
+        with session.lock:
+            if not session.draft:
+                raise ClientError("nothing to commit")
+            scene = "\n\n".join(session.draft)
+            story_file = interactive_scene.STORY_FILE
+            interactive_scene.backup_file(story_file)
+            story_log.append_scene(story_file, scene)
+            story_summary.update_in_background(story_file)
+            queued = []
+            if body.get("memories", True):
+                characters = [(key, data['name'], data['background'])
+                              for key, data in session.npc_data.items() if data['background']]
+                memory_queue.enqueue_scene(interactive_scene.CHARACTER_FOLDER, scene, characters)
+                queued = [name for _, name, _ in characters]
+        with self.lock:
+            self.sessions.pop(session.id, None)
+        return {"story": story_file, "memories": queued}
+
+    def scene_close(self, body):
+        with self.lock:
+            self.sessions.pop(body.get("session"), None)
+        return {}
+
+    # --- memories and jobs ---
+
+    def review_list(self, body):
+        rows = memory_store.pending_entries(interactive_scene.CHARACTER_FOLDER)
+        return {"pending": [{"id": pid, "name": memory_store.display_name(key), "created_at": created, "text": text}
+                            for pid, key, created, text in rows]}
+
+    def review_apply(self, body):
+        folder = interactive_scene.CHARACTER_FOLDER
+        rows = memory_store.pending_entries(folder)
+
+        def chosen(value):
+            if value == "all":
+                return rows
+            wanted = set(value or [])
+            return [row for row in rows if row[0] in wanted]
+        approve, reject = chosen(body.get("approve")), chosen(body.get("reject"))
+        log = []
+        if approve:
+            memory_queue.approve(folder, approve, log=log.append)
+        memory_store.discard_pending(folder, [row[0] for row in reject])
+        return {"approved": len(approve), "rejected": len(reject), "log": "".join(f"{line}\n" for line in log)}
+
+    def submit(self, kind, work):
+        """Run work(log) on the job pool; what it logs is kept with the job instead of printed"""
+        job = {"id": uuid.uuid4().hex[:8], "kind": kind, "state": "queued",
+               "queued_at": datetime.now().isoformat(timespec="seconds"), "result": None, "log": []}
+
+        def run():
+            job["state"] = "running"
+            start = time.perf_counter()
+            try:
+                job["result"] = work(job["log"].append)
+                job["state"] = "done"
+            except Exception as e:
+                job["result"] = str(e)
+                job["state"] = "failed"
+            job["seconds"] = round(time.perf_counter() - start, 3)
+        with self.lock:
+            self.jobs[job["id"]] = job
+        self.executor.submit(run)
+        return job
+
+    def memories(self, body):
+        folder = interactive_scene.CHARACTER_FOLDER
+        scene = story_log.recent_text(interactive_scene.STORY_FILE, 1)
+        if not scene:
+            raise ClientError("the story has no scenes yet")
+        keys = [memory_store.character_key(name) for name in body.get("characters") or []]
+        characters = []
+        for key in keys or memory_store.character_keys(folder):
+            background = file_cache.load_file(memory_store.memory_path(folder, key, "background"))
+            if background:
+                characters.append((key, memory_store.display_name(key), background))
+        if not characters:
+            raise ClientError("no character backgrounds found")
+
+        def work(log):
+            queued = memory_queue.generate_pending(folder, scene, characters, log=log)
+            status = {None: "failed", memory_queue.DUPLICATE: "duplicate"}
+            return {memory_store.display_name(key): status.get(pid, "queued") for key, pid in queued.items()}
+        return self.submit("memories", work)
+
+    def consolidate(self, body):
+        folder = interactive_scene.CHARACTER_FOLDER
+        entries = number(body, "entries", batch_consolidate_memories.ENTRY_THRESHOLD)
+        tokens = number(body, "tokens", batch_consolidate_memories.TOKEN_THRESHOLD)
+
+        def work(log):
+            due = batch_consolidate_memories.find_due(folder, entries, tokens)
+            return batch_consolidate_memories.consolidate_all(folder, due, log=log) if due else {}
+        return self.submit("consolidate", work)
+
+    def job_list(self, body):
+        with self.lock:
+            return {"jobs": list(self.jobs.values())}
+
+    def status(self, body):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job["state"] in ("queued", "running"))
+            sessions = len(self.sessions)
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "sessions": sessions,
+            "jobs_running": running,
+            "pending_memories": len(memory_store.pending_entries(interactive_scene.CHARACTER_FOLDER)),
+            "endpoints": llm_client.get_pool().summary(),
+        }
+
+    def route(self, method, path, body):
+        routes = {
+            ("GET", "/status"): self.status,
+            ("POST", "/scene/start"): self.scene_start,
+            ("POST", "/scene/turn"): self.scene_turn,
+            ("POST", "/scene/accept"): self.scene_accept,
+            ("POST", "/scene/commit"): self.scene_commit,
+            ("POST", "/scene/close"): self.scene_close,
+            ("GET", "/review"): self.review_list,
+            ("POST", "/review"): self.review_apply,
+            ("POST", "/memories"): self.memories,
+            ("POST", "/consolidate"): self.consolidate,
+            ("GET", "/jobs"): self.job_list,
+        }
+        with self.lock:
+            self.requests += 1
+        if method == "GET" and path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            return (200, job) if job else (404, {"error": "no such job"})
+        handler = routes.get((method, path))
+        if handler is None:
+            return 404, {"error": "not found"}
+        try:
+            return 200, handler(body)
+        except ClientError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            traceback.print_exc()
+            return 500, {"error": f"internal error: {type(e).__name__}: {e}"}
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def refused(self):
+        """Status and error for a request that isn't from a client holding the token, or None"""
+        if self.headers.get("Origin"):
+            return 403, {"error": "browser requests aren't accepted"}
+        token = self.headers.get(TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode("utf-8"), self.server.story.token.encode("utf-8")):
+            return 401, {"error": f"missing or wrong {TOKEN_HEADER} (see {TOKEN_FILE})"}
+        return None
+
+    def do_GET(self):
+        self.send_json(*(self.refused() or self.server.story.route("GET", self.path, {})))
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = 0
+        data = self.rfile.read(length)
+        refused = self.refused()
+        if refused:
+            self.send_json(*refused)
+            return
+        if self.headers.get_content_type() != "application/json":
+            self.send_json(415, {"error": "POST bodies must be application/json"})
+            return
+        try:
+            body = json.loads(data or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": "bad json"})
+            return
+        if not isinstance(body, dict):
+            self.send_json(400, {"error": "the body must be a JSON object"})
+            return
+        self.send_json(*self.server.story.route("POST", self.path, body))
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_daemon(host=HOST, port=PORT, warm=True):
+    """Serve in a background thread; port 0 picks a free one (see server.server_port)"""
+    daemon = StoryDaemon()
+    if warm:
+        daemon.warm_up()
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.daemon_threads = True
+    server.story = daemon
+    threading.Thread(target=server.serve_forever, name="story-daemon", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the story data warm for story_client.py")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    server = start_daemon(HOST, args.port)
+    print(f"Story daemon listening on http://{HOST}:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
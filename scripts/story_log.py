@@ -0,0 +1,180 @@
+"""
+Append-only story log with a sidecar offset index.
+
+story_recent.txt stays a plain text file. Next to it, story_recent.txt.idx holds
+one fixed-size record (offset, length) per committed scene, so "the last N
+scenes" or "everything after byte X" is a couple of seeks instead of reading
+the whole story.
+
+Text the index doesn't cover yet - a story written before the index existed,
+or text added by hand - is indexed the next time the log is opened. It is
+split into scenes at scene-break lines ("***", "---", "###", "===") and
+otherwise into runs of paragraphs of at most MAX_SCENE_BYTES, so an old story
+never turns into one giant "scene".
+"""
+import os
+import re
+import struct
+import threading
+from bisect import bisect_left
+
+RECORD = struct.Struct("<QQ")   # byte offset of the scene text, byte length
+SCENE_SEPARATOR = "\n\n"
+MAX_SCENE_BYTES = 6000          # unindexed text is split into scenes no bigger than this
+PARAGRAPH_GAP = re.compile(rb"(?:\r?\n[ \t]*){2,}")
+SCENE_BREAK = re.compile(rb"^\s*(?:(?:\*\s*){3,}|#{3,}|-{3,}|={3,})\s*$")
+
+_lock = threading.Lock()
+
+def index_path(story_path):
+    return story_path + ".idx"
+
+def read_records(idx_path, first=0, count=None):
+    """Read index records [first, first+count) as a list of (offset, length)"""
+    if not os.path.exists(idx_path):
+        return []
+    with open(idx_path, "rb") as f:
+        f.seek(first * RECORD.size)
+        data = f.read() if count is None else f.read(count * RECORD.size)
+    usable = len(data) - len(data) % RECORD.size
+    return [RECORD.unpack_from(data, i) for i in range(0, usable, RECORD.size)]
+
+def record_count(idx_path):
+    if not os.path.exists(idx_path):
+        return 0
+    return os.path.getsize(idx_path) // RECORD.size
+
+def split_scenes(data, base=0):
+    """
+    (offset, length) records for a run of unindexed story text starting at byte
+    base: a new scene at every scene-break line, and paragraphs grouped into
+    scenes of at most MAX_SCENE_BYTES.
+    """
+    paragraphs = []
+    pos = 0
+    for gap in PARAGRAPH_GAP.finditer(data):
+        paragraphs.append((pos, gap.start()))
+        pos = gap.end()
+    paragraphs.append((pos, len(data)))
+
+    records = []
+    group = None   # [start, end] of the scene being collected
+    for start, end in paragraphs:
+        if not data[start:end].strip():
+            continue
+        if SCENE_BREAK.match(data[start:end]):
+            if group:
+                records.append(group)
+            group = None
+            continue
+        if group and end - group[0] > MAX_SCENE_BYTES:
+            records.append(group)
+            group = None
+        if group:
+            group[1] = end
+        else:
+            group = [start, end]
+    if group:
+        records.append(group)
+    return [(base + start, end - start) for start, end in records]
+
+def index_text(story_path, idx_path, start, size, mode):
+    """Index story bytes [start, size) as split_scenes() divides them"""
+    with open(story_path, "rb") as f:
+        f.seek(start)
+        data = f.read(size - start)
+    with open(idx_path, mode) as f:
+        for record in split_scenes(data, start):
+            f.write(RECORD.pack(*record))
+
+def sync_index(story_path):
+    """
+    Make sure the index covers the whole story file.
+    Unindexed text at the end is split into scenes and indexed; if the file
+    shrank or the index is damaged, the index is rebuilt from the whole file.
+    """
+    idx_path = index_path(story_path)
+    size = os.path.getsize(story_path) if os.path.exists(story_path) else 0
+    count = record_count(idx_path)
+    last = read_records(idx_path, count - 1, 1) if count else []
+    indexed_end = last[0][0] + last[0][1] if last else 0
+
+    if os.path.exists(idx_path) and os.path.getsize(idx_path) % RECORD.size:
+        indexed_end = size + 1   # torn write - start over
+
+    if indexed_end == size:
+        return
+    if indexed_end > size:
+        # Story was edited or truncated by hand; old offsets mean nothing now
+        index_text(story_path, idx_path, 0, size, "wb")
+        return
+    index_text(story_path, idx_path, indexed_end, size, "ab")
+
+def append_scene(story_path, scene_text):
+    """Append a committed scene to the story and index it"""
+    with _lock:
+        sync_index(story_path)
+        data = scene_text.encode("utf-8")
+        with open(story_path, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            sep = SCENE_SEPARATOR.encode("utf-8") if offset else b""
+            f.write(sep + data)
+        with open(index_path(story_path), "ab") as f:
+            f.write(RECORD.pack(offset + len(sep), len(data)))
+
+def read_span(story_path, records):
+    """Read the scenes described by records with a single seek/read"""
+    if not records:
+        return []
+    start = records[0][0]
+    end = records[-1][0] + records[-1][1]
+    with open(story_path, "rb") as f:
+        f.seek(start)
+        blob = f.read(end - start)
+    scenes = []
+    for offset, length in records:
+        text = blob[offset - start:offset - start + length].decode("utf-8", errors="replace")
+        scenes.append(text.replace("\r\n", "\n").strip())
+    return scenes
+
+def scene_count(story_path):
+    """Number of scenes in the story"""
+    with _lock:
+        sync_index(story_path)
+        return record_count(index_path(story_path))
+
+def scene_records(story_path):
+    """(offset, length) of every scene, oldest first"""
+    if not os.path.exists(story_path):
+        return []
+    with _lock:
+        sync_index(story_path)
+        return read_records(index_path(story_path))
+
+def last_scenes(story_path, n):
+    """The last n scenes, oldest first"""
+    if n <= 0 or not os.path.exists(story_path):
+        return []
+    with _lock:
+        sync_index(story_path)
+        idx_path = index_path(story_path)
+        count = record_count(idx_path)
+        records = read_records(idx_path, max(0, count - n), n)
+    return read_span(story_path, records)
+
+def scenes_since(story_path, offset):
+    """
+    Scenes that start at or after byte offset, oldest first.
+    Returns (scenes, end_offset) - pass end_offset back in next time to get only newer scenes.
+    """
+    if not os.path.exists(story_path):
+        return [], 0
+    records = scene_records(story_path)
+    starts = [r[0] for r in records]
+    records = records[bisect_left(starts, offset):]
+    end = records[-1][0] + records[-1][1] if records else offset
+    return read_span(story_path, records), end
+
+def recent_text(story_path, n):
+    """The last n scenes joined back into prompt-ready text"""
+    return SCENE_SEPARATOR.join(last_scenes(story_path, n))
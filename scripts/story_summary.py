@@ -0,0 +1,286 @@
+"""
+Rolling summary tree over the committed story.
+
+Every scene in story_recent.txt gets a short leaf summary; every SUMMARY_FANOUT
+consecutive leaves roll up into a chapter summary, every SUMMARY_FANOUT
+chapters into a part, and so on. The tree is saved next to the story as
+<story>.summary.json. Committing a scene only summarizes that scene plus any
+group it completes - nothing already summarized is sent to the model again.
+
+Scene prompts get the last few scenes raw and everything before them as the
+coarsest summaries that cover it, so the story section stays the same size no
+matter how long the campaign runs. Building a prompt never waits for the
+model: it uses the summaries already saved, and any scenes not summarized yet
+are caught up in the background (progress is saved as it goes, so a long
+backlog, e.g. an old story seen for the first time, survives restarts).
+
+    python story_summary.py [story file]     # bring the tree up to date and show the prompt text
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import llm_client
+import story_log
+import prompt_templates
+from context_builder import count_tokens, trim_to_tokens
+
+SUMMARY_FANOUT = 8          # children rolled up into each higher-level summary
+SUMMARY_TOKENS = 800        # most the summaries in a prompt may use
+LEAF_VERBATIM_TOKENS = 80   # scenes this short are their own summary
+MAX_IN_FLIGHT = 4           # summary requests sent at once when catching up
+SAVE_EVERY = 16             # leaf summaries between saves while catching up
+LEAF_INPUT_TOKENS = 2000    # most of one scene a leaf summary prompt shows
+STATE_VERSION = 1
+
+_lock = threading.Lock()
+_loaded = {}   # state path -> (stamp, state)
+_catching_up = set()   # story paths with a background catch-up running
+_catching_up_lock = threading.Lock()
+
+def state_path(story_path):
+    return story_path + ".summary.json"
+
+def node_hash(*parts):
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def default_summarize(prompt, max_tokens):
+    return llm_client.complete(prompt, max_tokens=max_tokens, temperature=0.3, meta={"operation": "summary"})
+
+def load_state(story_path):
+    path = state_path(story_path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {'version': STATE_VERSION, 'levels': [[]]}
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _loaded.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            raise ValueError("old summary format")
+    except (OSError, ValueError):
+        state = {'version': STATE_VERSION, 'levels': [[]]}
+    _loaded[path] = (stamp, state)
+    return state
+
+def save_state(story_path, state):
+    path = state_path(story_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+    st = os.stat(path)
+    _loaded[path] = ((st.st_mtime_ns, st.st_size), state)
+
+def known_summaries(state):
+    """hash -> summary for every node already summarized, so rebuilt trees reuse them"""
+    return {node['hash']: node['summary'] for level in state['levels'] for node in level if node.get('summary')}
+
+def sync_leaves(story_path, state, known):
+    """
+    Leaves for every scene in the story, and how many had to be read. Summarized
+    scenes whose (offset, length) still match their leaf are not reread; only new,
+    moved or not-yet-summarized scenes are read and hashed.
+    """
+    records = story_log.scene_records(story_path)
+    old = state['levels'][0] if state['levels'] else []
+    leaves = []
+    unread = []
+    for i, (offset, length) in enumerate(records):
+        if i < len(old) and old[i]['offset'] == offset and old[i]['length'] == length \
+                and old[i].get('summary'):
+            leaves.append(old[i])
+        else:
+            leaves.append({'first': i, 'count': 1, 'offset': offset, 'length': length})
+            unread.append(i)
+    if unread:
+        for i, text in zip(unread, story_log.read_span(story_path, [records[i] for i in unread])):
+            leaf = leaves[i]
+            leaf['hash'] = node_hash(text)
+            leaf['summary'] = known.get(leaf['hash'])
+            if leaf['summary'] is None and count_tokens(text) <= LEAF_VERBATIM_TOKENS:
+                leaf['summary'] = text
+            if leaf['summary'] is None:
+                leaf['text'] = text   # held only until it's summarized, never saved
+    return leaves, len(unread)
+
+def build_parents(children, old_level, known):
+    """One level up: a node for every complete group of SUMMARY_FANOUT children"""
+    parents = []
+    for g in range(len(children) // SUMMARY_FANOUT):
+        group = children[g * SUMMARY_FANOUT:(g + 1) * SUMMARY_FANOUT]
+        h = node_hash(*(child['hash'] for child in group))
+        if g < len(old_level) and old_level[g]['hash'] == h and old_level[g].get('summary'):
+            parents.append(old_level[g])
+            continue
+        parents.append({'first': group[0]['first'], 'count': sum(c['count'] for c in group),
+                        'hash': h, 'summary': known.get(h)})
+    return parents
+
+def summarize_nodes(nodes, prompts, summarize, max_in_flight):
+    """Fill in node summaries, at most max_in_flight requests at a time"""
+    if not nodes:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        results = list(pool.map(lambda p: summarize(*p), prompts))
+    done = 0
+    for node, summary in zip(nodes, results):
+        if summary:
+            node['summary'] = summary.strip()
+            node.pop('text', None)
+            done += 1
+    return done
+
+def update(story_path, summarize=None, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Bring the summary tree up to date with the story. Only new leaves and the
+    groups they complete are summarized. Returns (state, requests made).
+    """
+    summarize = summarize or default_summarize
+    with _lock:
+        state = load_state(story_path)
+        known = known_summaries(state)
+        leaves, reread = sync_leaves(story_path, state, known)
+        levels = [leaves]
+        requests = 0
+
+        pending = [leaf for leaf in levels[0] if not leaf.get('summary') and leaf.get('text')]
+        requests += len(pending)
+        for start in range(0, len(pending), SAVE_EVERY):
+            batch = pending[start:start + SAVE_EVERY]
+            summarize_nodes(batch, [(prompt_templates.render(
+                "summary_leaf", text=trim_to_tokens(leaf['text'], LEAF_INPUT_TOKENS, keep="start")), 150) for leaf in batch],
+                summarize, max_in_flight)
+            if len(pending) > SAVE_EVERY:
+                # A long backlog: keep what's done so far in case the process exits
+                save_state(story_path, {'version': STATE_VERSION, 'levels': [
+                    [{k: v for k, v in leaf.items() if k != 'text'} for leaf in leaves]] + state['levels'][1:]})
+
+        while len(levels[-1]) >= SUMMARY_FANOUT:
+            depth = len(levels)
+            old_level = state['levels'][depth] if depth < len(state['levels']) else []
+            parents = build_parents(levels[-1], old_level, known)
+            pending, prompts = [], []
+            for g, parent in enumerate(parents):
+                if parent.get('summary'):
+                    continue
+                group = levels[-1][g * SUMMARY_FANOUT:(g + 1) * SUMMARY_FANOUT]
+                if not all(child.get('summary') for child in group):
+                    continue   # try again once the children are summarized
+                pending.append(parent)
+                prompts.append((prompt_templates.render("summary_rollup", text="\n\n".join(
+                    f"{label(child)}\n{child['summary']}" for child in group)), 250))
+            requests += len(pending)
+            summarize_nodes(pending, prompts, summarize, max_in_flight)
+            levels.append(parents)
+
+        for leaf in levels[0]:
+            leaf.pop('text', None)
+        changed = reread or requests or len(levels) != len(state['levels'])
+        state = {'version': STATE_VERSION, 'levels': levels}
+        if changed:
+            save_state(story_path, state)
+        return state, requests
+
+def update_in_background(story_path, summarize=None):
+    """Summarize a newly committed scene without making the writer wait; returns the thread to join before exiting"""
+    thread = threading.Thread(target=update, args=(story_path, summarize), name="story-summary")
+    thread.start()
+    return thread
+
+def catch_up_in_background(story_path, summarize=None):
+    """
+    Start summarizing whatever isn't summarized yet, unless that's already running.
+    A daemon thread: leaving the program doesn't wait for a long backlog, whose
+    progress is saved every SAVE_EVERY scenes anyway.
+    """
+    with _catching_up_lock:
+        if story_path in _catching_up:
+            return None
+        _catching_up.add(story_path)
+
+    def run():
+        try:
+            update(story_path, summarize)
+        finally:
+            with _catching_up_lock:
+                _catching_up.discard(story_path)
+    thread = threading.Thread(target=run, name="story-summary-catch-up", daemon=True)
+    thread.start()
+    return thread
+
+def up_to_date(state, scenes):
+    leaves = state['levels'][0] if state['levels'] else []
+    return len(leaves) == scenes and all(leaf.get('summary') for leaf in leaves)
+
+def label(node):
+    first = node['first'] + 1
+    if node['count'] == 1:
+        return f"[Scene {first}]"
+    return f"[Scenes {first}-{first + node['count'] - 1}]"
+
+def cover(state, end):
+    """Coarsest summarized nodes covering scenes [0, end), oldest first"""
+    levels = state['levels']
+    starts = [{node['first']: node for node in level} for level in levels]
+    nodes = []
+    pos = 0
+    while pos < end:
+        for depth in range(len(levels) - 1, -1, -1):
+            node = starts[depth].get(pos)
+            if node and node.get('summary') and pos + node['count'] <= end:
+                nodes.append(node)
+                pos += node['count']
+                break
+        else:
+            pos += 1   # scene not summarized yet (request failed) - leave it out
+    return nodes
+
+def summary_text(state, end, max_tokens=SUMMARY_TOKENS):
+    """Summaries of everything before scene `end`, within max_tokens (oldest dropped first)"""
+    parts = [f"{label(node)} {node['summary']}" for node in cover(state, end)]
+    text = "\n\n".join(parts)
+    if count_tokens(text) > max_tokens:
+        text = trim_to_tokens(text, max_tokens, keep="end")
+    return text
+
+def story_context(story_path, recent_scenes, max_tokens=SUMMARY_TOKENS, summarize=None):
+    """
+    (summaries of older scenes, last recent_scenes scenes raw) for a scene prompt.
+    Uses the summaries saved so far; scenes that aren't summarized yet are left
+    out this time and caught up in the background.
+    """
+    recent = story_log.recent_text(story_path, recent_scenes)
+    if not os.path.exists(story_path):
+        return "", recent
+    scenes = story_log.scene_count(story_path)
+    # Not under _lock - an update holds it while it waits for the model
+    state = load_state(story_path)
+    if not up_to_date(state, scenes):
+        catch_up_in_background(story_path, summarize)
+    older = max(0, scenes - recent_scenes)
+    return summary_text(state, older, max_tokens), recent
+
+def main():
+    story = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "story", "story_recent.txt")
+    if not os.path.exists(story):
+        print(f"Error: {story} not found")
+        return
+    start = time.perf_counter()
+    state, requests = update(story)
+    elapsed = time.perf_counter() - start
+    text = summary_text(state, len(state['levels'][0]))
+    print(text or "(nothing summarized yet)")
+    sizes = " / ".join(str(len(level)) for level in state['levels'])
+    print(f"\n[{sizes} nodes per level, {requests} summary requests in {elapsed:.1f}s, ~{count_tokens(text)} tokens]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import pytest
+import backup_utils
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """backups/ is created in the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def write(path, data, mode="wb"):
+    """Write a file and move its mtime on, so a same-size rewrite never looks unchanged"""
+    existed = os.path.exists(path)
+    before = os.stat(path).st_mtime_ns if existed else 0
+    with open(path, mode) as f:
+        f.write(data)
+    st = os.stat(path)
+    if existed and st.st_mtime_ns <= before:
+        os.utime(path, ns=(st.st_atime_ns, before + 1_000_000))
+
+def restored(path):
+    history = backup_utils.file_versions(path)
+    return [backup_utils.rebuild_version(version, history) for version in history]
+
+def blob_count():
+    objects = os.path.join(backup_utils.BACKUP_FOLDER, backup_utils.OBJECTS_FOLDER)
+    return sum(len(files) for _, _, files in os.walk(objects))
+
+def test_identical_content_is_stored_once(workdir):
+    write("a.txt", b"same words\n" * 100)
+    write("b.txt", b"same words\n" * 100)
+
+    backup_utils.backup_file("a.txt")
+    backup_utils.backup_file("b.txt")
+
+    assert blob_count() == 1
+    assert restored("b.txt") == [b"same words\n" * 100]
+
+def test_unchanged_file_adds_no_version(workdir):
+    write("a.txt", b"nothing new\n")
+    backup_utils.backup_file("a.txt")
+    backup_utils.backup_file("a.txt")
+
+    assert len(backup_utils.file_versions("a.txt")) == 1
+
+def test_restore_writes_the_recorded_bytes(workdir):
+    write("a.txt", b"first draft\n")
+    backup_utils.backup_file("a.txt")
+    write("a.txt", b"second draft, longer\n")
+    backup_utils.backup_file("a.txt")
+
+    first = backup_utils.file_versions("a.txt")[0]
+    backup_utils.restore_version(first, "a.txt")
+
+    with open("a.txt", "rb") as f:
+        assert f.read() == b"first draft\n"
+
+def test_append_is_stored_as_a_delta(workdir):
+    story = b"".join(b"Scene %d. The road went on.\n\n" % n for n in range(5000))
+    write("story.txt", story)
+    backup_utils.backup_file("story.txt")
+    write("story.txt", b"A new scene.\n\n", "ab")
+    backup_utils.backup_file("story.txt")
+
+    versions = backup_utils.file_versions("story.txt")
+    assert [v["kind"] for v in versions] == ["full", "delta"]
+    assert restored("story.txt") == [story, story + b"A new scene.\n\n"]
+
+def test_middle_edit_followed_by_growth_restores_the_same_bytes(workdir, monkeypatch):
+    monkeypatch.setattr(backup_utils, "CHECK_BYTES", 64)
+    original = b"".join(b"line %04d of the story\n" % n for n in range(400))
+    write("story.txt", original)
+    backup_utils.backup_file("story.txt")
+
+    middle = len(original) // 2
+    edited = original[:middle] + b"a sentence added by hand\n" + original[middle:] + b"and then a new scene\n"
+    write("story.txt", edited)
+    backup_utils.backup_file("story.txt")
+    write("story.txt", b"one more scene\n", "ab")
+    backup_utils.backup_file("story.txt")
+
+    versions = backup_utils.file_versions("story.txt")
+    assert [v["kind"] for v in versions] == ["full", "full", "delta"]
+    assert restored("story.txt") == [original, edited, edited + b"one more scene\n"]
+
+def test_same_length_edit_near_the_end_is_caught(workdir, monkeypatch):
+    monkeypatch.setattr(backup_utils, "CHECK_BYTES", 64)
+    original = b"".join(b"line %04d of the story\n" % n for n in range(400))
+    write("story.txt", original)
+    backup_utils.backup_file("story.txt")
+
+    edited = original[:-10] + b"X" * 10 + b"more\n"
+    write("story.txt", edited)
+    backup_utils.backup_file("story.txt")
+
+    assert backup_utils.file_versions("story.txt")[-1]["kind"] == "full"
+    assert restored("story.txt")[-1] == edited
+
+def test_damaged_delta_is_refused(workdir):
+    write("story.txt", b"opening scene\n")
+    backup_utils.backup_file("story.txt")
+    write("story.txt", b"second scene\n", "ab")
+    backup_utils.backup_file("story.txt")
+
+    delta = backup_utils.file_versions("story.txt")[-1]
+    path, codec = backup_utils.find_blob(delta["hash"])
+    packed, _ = backup_utils.compress(b"something else\n")
+    with open(path, "wb") as f:
+        f.write(packed)
+
+    with pytest.raises(ValueError):
+        restored("story.txt")
+
+def test_retention_runs_once_per_delta_chain(workdir, monkeypatch):
+    monkeypatch.setattr(backup_utils, "KEEP_LAST", 3)
+    monkeypatch.setattr(backup_utils, "KEEP_HOURLY", 1)
+    monkeypatch.setattr(backup_utils, "KEEP_DAILY", 1)
+    monkeypatch.setattr(backup_utils, "MAX_DELTA_CHAIN", 4)
+    rewrites = []
+    write_manifest = backup_utils.write_manifest
+    monkeypatch.setattr(backup_utils, "write_manifest", lambda versions: (rewrites.append(len(versions)),
+                                                                          write_manifest(versions)))
+    write("log.txt", b"start\n")
+    for n in range(30):
+        write("log.txt", b"entry %d\n" % n, "ab")
+        backup_utils.backup_file("log.txt")
+
+    versions = backup_utils.file_versions("log.txt")
+    assert len(rewrites) < 10
+    assert versions[-1]["size"] == os.path.getsize("log.txt")
+    assert all(restored("log.txt"))
+    assert blob_count() == len({v["hash"] for v in versions})
+    assert not os.path.exists(os.path.join(backup_utils.BACKUP_FOLDER, backup_utils.LOCK_NAME))
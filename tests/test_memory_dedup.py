@@ -0,0 +1,44 @@
+import os
+import memory_store
+import memory_dedup
+
+SHORTTERM = memory_store.SHORTTERM
+
+FERRY = "Cass paid the old ferryman two silver coins to cross the flooded river before dawn."
+FERRY_AGAIN = "Cass paid the old ferryman two silver coins to cross the flooded river at dawn."
+LETTER = "A letter from her brother warned that the northern gate would close at midsummer."
+
+def test_reworded_memory_is_a_duplicate(tmp_path):
+    folder = str(tmp_path)
+    memory_store.add_entry(folder, "cass", FERRY)
+    memory_store.add_entry(folder, "cass", LETTER)
+
+    matches = memory_dedup.find_duplicates(folder, "cass", FERRY_AGAIN)
+    assert [text for _, _, _, text in matches] == [FERRY]
+    assert memory_dedup.find_duplicates(folder, "cass", "The tavern burned down in the night.") == []
+
+def test_hand_edited_entry_is_checked_in_its_new_wording(tmp_path):
+    folder = str(tmp_path)
+    memory_store.add_entry(folder, "cass", LETTER)
+    path = memory_store.memory_path(folder, "cass", SHORTTERM)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    st = os.stat(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace(LETTER, FERRY))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert [text for _, _, _, text in memory_dedup.find_duplicates(folder, "cass", FERRY_AGAIN)] == [FERRY]
+    assert memory_dedup.find_duplicates(folder, "cass", LETTER) == []
+
+def test_dedupe_keeps_the_earliest_copy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # backups/ is written to the working directory
+    folder = str(tmp_path / "characters")
+    os.makedirs(folder)
+    for memory in (FERRY, LETTER, FERRY_AGAIN):
+        memory_store.add_entry(folder, "cass", memory)
+
+    assert memory_dedup.dedupe_character(folder, "cass", SHORTTERM) == 1
+    with open(memory_store.memory_path(folder, "cass", SHORTTERM), "r", encoding="utf-8") as f:
+        texts = [body for _, body in memory_store.parse_entries(f.read())]
+    assert texts == [FERRY, LETTER]
@@ -0,0 +1,68 @@
+import os
+import memory_store
+
+SHORTTERM = memory_store.SHORTTERM
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def edit(path, old, new):
+    """Change a memory file by hand, making sure its stamp moves even on a coarse clock"""
+    st = os.stat(path)
+    text = read(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace(old, new) if old else text + new)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+def texts(folder, key):
+    return [text for _, _, text in reversed(memory_store.recent_entries(folder, key, SHORTTERM, limit=-1))]
+
+def test_hand_edit_is_imported(tmp_path):
+    folder = str(tmp_path)
+    for memory in ("Met the ferryman.", "Lost the map.", "Slept by the river."):
+        memory_store.add_entry(folder, "cass", memory)
+    created = {text: ts for _, ts, text in memory_store.recent_entries(folder, "cass", SHORTTERM, limit=-1)}
+    path = memory_store.memory_path(folder, "cass", SHORTTERM)
+
+    edit(path, "Lost the map.", "Burned the map.")
+    edit(path, "\n[" + created["Slept by the river."] + "]\nSlept by the river.\n---\n", "")
+
+    assert texts(folder, "cass") == ["Met the ferryman.", "Burned the map."]
+    entries = {text: ts for _, ts, text in memory_store.recent_entries(folder, "cass", SHORTTERM, limit=-1)}
+    assert entries["Met the ferryman."] == created["Met the ferryman."]
+
+def test_entry_added_by_hand_is_imported(tmp_path):
+    folder = str(tmp_path)
+    memory_store.add_entry(folder, "cass", "Met the ferryman.")
+    path = memory_store.memory_path(folder, "cass", SHORTTERM)
+
+    edit(path, "", "\n[2025-03-01 09:30]\nFound a letter from her brother.\n---\n")
+
+    assert texts(folder, "cass") == ["Met the ferryman.", "Found a letter from her brother."]
+    assert memory_store.count_entries(folder, "cass") == 2
+
+def test_hand_edit_survives_later_writes(tmp_path):
+    folder = str(tmp_path)
+    memory_store.add_entry(folder, "cass", "Met the ferryman.")
+    path = memory_store.memory_path(folder, "cass", SHORTTERM)
+
+    edit(path, "Met the ferryman.", "Paid the ferryman twice.")
+    memory_store.add_entry(folder, "cass", "Crossed the river.")
+    memory_store.export_character(folder, "cass")
+
+    text = read(path)
+    assert "Paid the ferryman twice." in text
+    assert "Met the ferryman." not in text
+    assert texts(folder, "cass") == ["Paid the ferryman twice.", "Crossed the river."]
+
+def test_missing_file_is_recreated_from_the_database(tmp_path):
+    folder = str(tmp_path)
+    memory_store.add_entry(folder, "cass", "Met the ferryman.")
+    path = memory_store.memory_path(folder, "cass", SHORTTERM)
+    os.remove(path)
+
+    memory_store.add_entry(folder, "cass", "Crossed the river.")
+
+    assert texts(folder, "cass") == ["Met the ferryman.", "Crossed the river."]
+    assert memory_store.parse_entries(read(path))[-1][1] == "Crossed the river."
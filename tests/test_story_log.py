@@ -0,0 +1,56 @@
+import story_log
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def test_legacy_story_is_split_at_scene_breaks(tmp_path):
+    story = str(tmp_path / "story_recent.txt")
+    write(story, "The gate opened.\n\nCass stepped through.\n\n***\n\nMorning came.\n\n---\n\nThe road north.")
+
+    assert story_log.scene_count(story) == 3
+    assert story_log.last_scenes(story, 1) == ["The road north."]
+    assert story_log.last_scenes(story, 3)[0] == "The gate opened.\n\nCass stepped through."
+
+def test_legacy_story_without_breaks_is_split_by_size(tmp_path):
+    story = str(tmp_path / "story_recent.txt")
+    paragraphs = [f"Paragraph {i}." + " word" * 200 for i in range(30)]
+    write(story, "\n\n".join(paragraphs))
+
+    records = story_log.scene_records(story)
+    assert len(records) > 1
+    assert all(length <= story_log.MAX_SCENE_BYTES for _, length in records)
+    scenes = story_log.last_scenes(story, len(records))
+    assert "\n\n".join(scenes).split("\n\n") == paragraphs
+    assert story_log.recent_text(story, 1) == scenes[-1]
+
+def test_text_added_by_hand_becomes_new_scenes(tmp_path):
+    story = str(tmp_path / "story_recent.txt")
+    story_log.append_scene(story, "Scene one.")
+    story_log.append_scene(story, "Scene two.")
+    with open(story, "a", encoding="utf-8") as f:
+        f.write("\n\nWritten by hand.\n\n###\n\nAlso by hand.")
+
+    assert story_log.scene_count(story) == 4
+    assert story_log.last_scenes(story, 3) == ["Scene two.", "Written by hand.", "Also by hand."]
+
+    story_log.append_scene(story, "Scene five.")
+    assert story_log.last_scenes(story, 2) == ["Also by hand.", "Scene five."]
+
+def test_index_is_rebuilt_when_the_story_shrinks(tmp_path):
+    story = str(tmp_path / "story_recent.txt")
+    for n in range(3):
+        story_log.append_scene(story, f"Scene {n} " + "text " * 50)
+    write(story, "Rewritten opening.\n\n***\n\nRewritten ending.")
+
+    assert story_log.last_scenes(story, 5) == ["Rewritten opening.", "Rewritten ending."]
+
+def test_scenes_since_returns_only_newer_scenes(tmp_path):
+    story = str(tmp_path / "story_recent.txt")
+    story_log.append_scene(story, "First.")
+    scenes, end = story_log.scenes_since(story, 0)
+    assert scenes == ["First."]
+
+    story_log.append_scene(story, "Second.")
+    scenes, _ = story_log.scenes_since(story, end)
+    assert scenes == ["Second."]